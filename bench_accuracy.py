@@ -0,0 +1,260 @@
+# bench_accuracy.py
+"""Per-class precision, recall and mAP of the browser's detection pipeline.
+
+Each pipeline variant is run over a labelled local image set and scored
+next to its latency, so a speed change can be weighed against what it
+misses in one command. Every image goes through the same path as a
+browser frame:
+- FrameCapture scales and letterboxes it to ``max_side``;
+- in tiled variants, the engine's tile grid and stitching are applied;
+- YoloWorker detect_batch() runs with its confidence floor, max_det and
+  per-class thresholds.
+The boxes are mapped back to image pixels before matching.
+
+Labels are YOLO txt files named after the images. They are looked up in
+``--labels``, then in a ``labels`` folder next to the images, then beside
+the images. The repo's sample images have no labels. ``--write-labels``
+saves the first variant's output as labels, freezing today's pipeline as
+the reference that later changes are measured against.
+
+Precision and recall are taken at the pipeline's operating point, IoU 0.5.
+AP is the area under the precision/recall curve of the detections the
+pipeline outputs, so it scores what the browser acts on rather than the
+raw model. mAP averages over the classes that have labels.
+"""
+import argparse
+import os
+import time
+
+import cv2
+import numpy as np
+from PyQt5.QtGui import QImage
+
+from bench_common import SAMPLE_IMAGES, write_report
+from bench_quantization import load_labels
+from bench_replay import parse_configs
+from capture import FrameCapture, FrameTransform
+from detections import Detections
+from detector_backends import list_images
+from metrics import PerfStats
+from tiling import TileCache
+from tracker import iou_matrix
+from yolo_worker import YoloWorker
+
+IOU_THRESHOLDS = np.linspace(0.5, 0.95, 10)
+
+
+def find_labels(image_paths, labels_dir=None):
+    """Folder holding the YOLO labels for these images, or None"""
+    folder = os.path.dirname(os.path.abspath(image_paths[0]))
+    for candidate in (labels_dir, os.path.join(folder, "labels"), folder):
+        if candidate and any(
+                os.path.exists(os.path.join(candidate, os.path.splitext(os.path.basename(p))[0] + ".txt"))
+                for p in image_paths):
+            return candidate
+    return labels_dir
+
+
+class Pipeline:
+    """One variant of the browser's frame path, from image to image-pixel boxes"""
+
+    def __init__(self, backend="onnx", model_path="best.pt", max_side=640, smooth=False,
+                 tiled=False, tile_size=640, tile_overlap=96, threads=None):
+        self.worker = YoloWorker(model_path, backend=backend, num_threads=threads)
+        if self.worker.backend.name != backend:
+            # A silent fallback would score one model under another's name
+            raise SystemExit(f"Backend {backend} unavailable, got {self.worker.backend.name}; see the log above")
+        self.capture = FrameCapture(max_side=max_side or None, smooth=smooth)
+        self.tiled = tiled
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.stats = PerfStats(window=100000)
+
+    @property
+    def names(self):
+        return self.worker.backend.names
+
+    def __call__(self, img):
+        start = time.perf_counter()
+        # As grabbed from the widget: through a QImage, scaled and letterboxed
+        rgb = np.ascontiguousarray(cv2.cvtColor(img, cv2.COLOR_BGR2RGB))
+        qimg = QImage(rgb.data, rgb.shape[1], rgb.shape[0], rgb.strides[0], QImage.Format_RGB888)
+        frame, scale, pad_x, pad_y = self.capture.convert(qimg)
+        self.stats.record("convert", 1000 * (time.perf_counter() - start))
+
+        if self.tiled:
+            # A fresh cache per image: every tile is analysed, then stitched
+            cache = TileCache(self.tile_size, self.tile_overlap)
+            dirty = cache.dirty_tiles(frame)
+            crops = [(frame[y1:y2, x1:x2], x1, y1) for _, (x1, y1, x2, y2), _ in dirty]
+            stitched = cache.update(dirty, self.worker.detect_batch(crops))
+            detections = Detections.from_dicts(stitched, self.names)
+        else:
+            detections = self.worker.detect(frame)
+        for stage, ms in self.worker.last_timings.items():
+            self.stats.record(stage, ms)
+
+        self.stats.record("total", 1000 * (time.perf_counter() - start))
+        return detections.frame_to_page(FrameTransform(scale, pad_x, pad_y))
+
+    def close(self):
+        self.worker.cleanup()
+
+
+def match(truth, detections, iou_threshold):
+    """True-positive flag per detection, matched greedily by confidence within each class"""
+    tp = np.zeros(len(detections), bool)
+    if not len(truth) or not len(detections):
+        return tp
+    truth_boxes = np.array([t[0] for t in truth], np.float32)
+    truth_classes = np.array([t[2] for t in truth], object)
+    iou = iou_matrix(detections.xyxy, truth_boxes)
+    iou[np.array(detections.classes, object)[:, None] != truth_classes[None, :]] = 0
+    taken = np.zeros(len(truth), bool)
+    for d in np.argsort(-detections.confs, kind="stable"):
+        candidates = np.where(taken, 0, iou[d])
+        t = int(candidates.argmax())
+        if candidates[t] >= iou_threshold:
+            taken[t] = tp[d] = True
+    return tp
+
+
+def average_precision(confs, tp, positives):
+    """All-point interpolated area under the precision/recall curve"""
+    if not positives:
+        return None
+    if not len(confs):
+        return 0.0
+    order = np.argsort(-np.asarray(confs), kind="stable")
+    hits = np.asarray(tp, bool)[order]
+    tp_cum = np.cumsum(hits)
+    recall = tp_cum / positives
+    precision = tp_cum / np.arange(1, len(hits) + 1)
+    # Precision envelope, then sum it over the recall steps
+    precision = np.maximum.accumulate(precision[::-1])[::-1]
+    recall = np.concatenate([[0.0], recall])
+    return float(np.sum((recall[1:] - recall[:-1]) * precision))
+
+
+def score(truths, outputs, names):
+    """Per-class precision, recall, AP50 and AP50-95, plus their means"""
+    classes = list(names.values())
+    per_class = {}
+    for name in classes:
+        positives = sum(sum(1 for t in truth if t[2] == name) for truth in truths)
+        confs = []
+        flags = {iou: [] for iou in IOU_THRESHOLDS}
+        for truth, detections in zip(truths, outputs):
+            keep = np.array([c == name for c in detections.classes], bool)
+            subset = detections[keep]
+            confs.extend(subset.confs.tolist())
+            class_truth = [t for t in truth if t[2] == name]
+            for iou in IOU_THRESHOLDS:
+                flags[iou].extend(match(class_truth, subset, iou).tolist())
+        hits = int(np.sum(flags[IOU_THRESHOLDS[0]]))
+        if not positives and not confs:
+            continue
+        aps = [average_precision(confs, flags[iou], positives) for iou in IOU_THRESHOLDS]
+        per_class[name] = {
+            'labels': positives,
+            'true_positives': hits,
+            'detections': len(confs),
+            'precision': round(hits / len(confs), 3) if confs else None,
+            'recall': round(hits / positives, 3) if positives else None,
+            'ap50': None if aps[0] is None else round(aps[0], 3),
+            'ap50_95': None if aps[0] is None else round(float(np.mean(aps)), 3),
+        }
+
+    labelled = [c for c in per_class.values() if c['labels']]
+    total_hits = sum(c['true_positives'] for c in labelled)
+    total_dets = sum(c['detections'] for c in per_class.values())
+    total_labels = sum(c['labels'] for c in labelled)
+    return {
+        'precision': round(total_hits / total_dets, 3) if total_dets else None,
+        'recall': round(total_hits / total_labels, 3) if total_labels else None,
+        'map50': round(float(np.mean([c['ap50'] for c in labelled])), 3) if labelled else None,
+        'map50_95': round(float(np.mean([c['ap50_95'] for c in labelled])), 3) if labelled else None,
+        'per_class': per_class,
+    }
+
+
+def write_labels(directory, image_paths, images, outputs, names):
+    """Save detections as YOLO txt labels, one file per image"""
+    os.makedirs(directory, exist_ok=True)
+    ids = {name: class_id for class_id, name in names.items()}
+    for path, img, detections in zip(image_paths, images, outputs):
+        h, w = img.shape[:2]
+        stem = os.path.splitext(os.path.basename(path))[0]
+        with open(os.path.join(directory, stem + ".txt"), "w", encoding="utf-8") as f:
+            clipped = detections.clipped(0, 0, w, h)
+            for (x1, y1, x2, y2), name in zip(clipped.xyxy.tolist(), clipped.classes):
+                f.write(f"{ids[name]} {(x1 + x2) / 2 / w:.6f} {(y1 + y2) / 2 / h:.6f} "
+                        f"{(x2 - x1) / w:.6f} {(y2 - y1) / h:.6f}\n")
+
+
+def run(configs, model_path="best.pt", images_dir=None, labels_dir=None, max_images=None,
+        threads=None, write_labels_dir=None, output=None):
+    image_paths = list_images(images_dir, max_images) if images_dir else list(SAMPLE_IMAGES)
+    loaded = [(p, cv2.imread(p)) for p in image_paths]
+    loaded = [(p, img) for p, img in loaded if img is not None]
+    if not loaded:
+        raise SystemExit(f"No images to evaluate in {images_dir or 'the samples'}")
+    image_paths = [p for p, _ in loaded]
+    images = [img for _, img in loaded]
+    labels_dir = find_labels(image_paths, labels_dir)
+
+    report = {'model': model_path, 'images': len(images), 'labels': labels_dir, 'variants': []}
+    for index, config in enumerate(configs):
+        pipeline = Pipeline(model_path=model_path, threads=threads, **config['engine'])
+        pipeline(images[0])  # warm-up, kept out of the timings
+        pipeline.stats = PerfStats(window=100000)
+        outputs = [pipeline(img) for img in images]
+        names = pipeline.names
+        pipeline.close()
+
+        if index == 0 and write_labels_dir:
+            write_labels(write_labels_dir, image_paths, images, outputs, names)
+            labels_dir = labels_dir or write_labels_dir
+            report['labels'] = labels_dir
+
+        variant = {'variant': config['name'], 'options': config['engine']}
+        stages = pipeline.stats.snapshot()['stages']
+        variant['latency_ms'] = stages.pop("total")
+        variant['stages'] = stages
+        if labels_dir:
+            truths = [load_labels(labels_dir, p, names, img.shape[1], img.shape[0])
+                      for p, img in zip(image_paths, images)]
+            variant.update(score(truths, outputs, names))
+        else:
+            variant['detections'] = sum(len(d) for d in outputs)
+        report['variants'].append(variant)
+
+    # Every variant against the first one
+    reference = report['variants'][0]
+    for variant in report['variants'][1:]:
+        variant['speedup'] = round(reference['latency_ms']['mean'] / max(1e-6, variant['latency_ms']['mean']), 2)
+        for key in ("recall", "map50", "map50_95"):
+            if variant.get(key) is not None and reference.get(key) is not None:
+                variant[f'{key}_delta'] = round(variant[key] - reference[key], 3)
+
+    write_report(report, output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--variants", nargs="+", default=["onnx"],
+                        help="pipeline variants as name[:key=value,...] with backend, max_side, smooth, "
+                             "tiled, tile_size and tile_overlap, e.g. "
+                             "onnx onnx-int8 onnx-small:max_side=480 onnx-tiled:tiled=true,max_side=0")
+    parser.add_argument("--model", default="best.pt", help="torch checkpoint; exports are derived from it")
+    parser.add_argument("--images", help="folder of images to evaluate (defaults to the repo's samples)")
+    parser.add_argument("--labels", help="folder of YOLO txt labels named after the images")
+    parser.add_argument("--max-images", type=int, help="evaluate at most this many images")
+    parser.add_argument("--threads", type=int, help="intra-op threads per variant")
+    parser.add_argument("--write-labels", metavar="DIR",
+                        help="save the first variant's detections as labels to score the others against")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    run(parse_configs(args.variants), args.model, args.images, args.labels, args.max_images,
+        args.threads, args.write_labels, args.output)
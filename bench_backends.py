@@ -0,0 +1,123 @@
+# bench_backends.py
+"""Parity check and CPU latency comparison of the detector backends.
+
+Runs the sample images (or the ones given) through every requested backend,
+matches each backend's detections against the torch reference by class and
+IoU, and reports per-image latency. Exits with status 1 if any backend
+misses or adds detections, or shifts a matched box's confidence beyond the
+tolerance.
+"""
+import argparse
+import sys
+import time
+
+import cv2
+
+from bench_common import SAMPLE_IMAGES, write_report
+from detector_backends import create_backend
+from tiling import _box_overlap
+
+
+def box_iou(a, b):
+    return _box_overlap(a, b)[0]
+
+
+def compare(reference, candidate, min_iou, max_conf_delta):
+    """Greedily pair detections by class and IoU.
+
+    Returns (matched, conf_mismatched, missing, extra, worst conf delta). A
+    pair whose confidences differ by more than ``max_conf_delta`` counts once,
+    as conf_mismatched, rather than as both a miss and an extra box.
+    """
+    unmatched = list(candidate)
+    matched = conf_mismatched = missing = 0
+    worst_delta = 0.0
+    for xyxy, conf, name in reference:
+        best = max((c for c in unmatched if c[2] == name),
+                   key=lambda c: box_iou(xyxy, c[0]), default=None)
+        if best is None or box_iou(xyxy, best[0]) < min_iou:
+            missing += 1
+            continue
+        unmatched.remove(best)
+        delta = abs(best[1] - conf)
+        worst_delta = max(worst_delta, delta)
+        if delta > max_conf_delta:
+            conf_mismatched += 1
+        else:
+            matched += 1
+    return matched, conf_mismatched, missing, len(unmatched), worst_delta
+
+
+def time_backend(backend, images, repeats, conf):
+    backend.predict(images[:1], conf=conf)  # warm-up
+    start = time.perf_counter()
+    for _ in range(repeats):
+        outputs = [backend.predict([img], conf=conf)[0] for img in images]
+    elapsed = time.perf_counter() - start
+    return outputs, 1000 * elapsed / (repeats * len(images))
+
+
+def run(backends, model_path="best.pt", image_paths=None, threads=None, inter_threads=None,
+        repeats=5, conf=0.25, min_iou=0.9, max_conf_delta=0.05, output=None):
+    images = [cv2.imread(path) for path in image_paths or SAMPLE_IMAGES]
+    if any(img is None for img in images):
+        raise SystemExit("Could not read every input image")
+
+    report = {'model': model_path, 'images': len(images), 'backends': []}
+    reference_backend = create_backend("torch", model_path, threads)
+    reference, reference_ms = time_backend(reference_backend, images, repeats, conf)
+    reference_backend.close()
+    report['backends'].append({'backend': 'torch', 'latency_ms': round(reference_ms, 1)})
+
+    passed = True
+    for name in backends:
+        if name == "torch":
+            continue
+        backend = create_backend(name, model_path, threads, inter_threads)
+        if backend.name != name:
+            report['backends'].append({'backend': name, 'error': 'runtime not installed'})
+            passed = False
+            continue
+        outputs, latency_ms = time_backend(backend, images, repeats, conf)
+        backend.close()
+
+        totals = [0, 0, 0, 0]
+        worst_delta = 0.0
+        for ref, out in zip(reference, outputs):
+            *counts, delta = compare(ref, out, min_iou, max_conf_delta)
+            totals = [t + c for t, c in zip(totals, counts)]
+            worst_delta = max(worst_delta, delta)
+        ok = totals[1] == totals[2] == totals[3] == 0
+        passed = passed and ok
+        report['backends'].append({
+            'backend': name,
+            'latency_ms': round(latency_ms, 1),
+            'speedup': round(reference_ms / max(1e-6, latency_ms), 2),
+            'matched': totals[0],
+            'conf_mismatched': totals[1],
+            'missing': totals[2],
+            'extra': totals[3],
+            'max_conf_delta': round(worst_delta, 4),
+            'parity': ok,
+        })
+
+    write_report(report, output)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backends", nargs="+", default=["onnx"], help="backends to check against torch")
+    parser.add_argument("--model", default="best.pt", help="torch checkpoint; exports are derived from it")
+    parser.add_argument("--images", nargs="+", help="images to run (defaults to the repo's samples)")
+    parser.add_argument("--threads", type=int, help="intra-op threads per backend")
+    parser.add_argument("--inter-threads", type=int, help="inter-op threads for exported backends")
+    parser.add_argument("--repeats", type=int, default=5, help="timed passes over the images")
+    parser.add_argument("--conf", type=float, default=0.25, help="confidence threshold for both sides")
+    parser.add_argument("--min-iou", type=float, default=0.9, help="IoU for two boxes to count as the same")
+    parser.add_argument("--max-conf-delta", type=float, default=0.05, help="allowed confidence difference")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    ok = run(args.backends, args.model, args.images, args.threads, args.inter_threads,
+             args.repeats, args.conf, args.min_iou, args.max_conf_delta, args.output)
+    sys.exit(0 if ok else 1)
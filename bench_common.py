@@ -0,0 +1,35 @@
+# bench_common.py
+"""Helpers shared by the bench_*.py scripts"""
+import json
+import statistics
+import time
+
+# The repo's own images, used when a bench is given none
+SAMPLE_IMAGES = ["image1.jpeg", "image2.jpg", "image3.jpg", "image4.jpeg"]
+
+
+def time_ms(fn, repeats):
+    """Milliseconds taken by each of ``repeats`` calls to ``fn``"""
+    samples = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        samples.append(1000 * (time.perf_counter() - start))
+    return samples
+
+
+def summary(samples):
+    """Median and 95th percentile of millisecond samples"""
+    ordered = sorted(samples)
+    return {
+        'median_ms': round(statistics.median(ordered), 3),
+        'p95_ms': round(ordered[int(0.95 * (len(ordered) - 1))], 3),
+    }
+
+
+def write_report(report, output=None):
+    """Print a bench's JSON report and also write it to ``output`` if given"""
+    print(json.dumps(report, indent=2))
+    if output:
+        with open(output, "w", encoding="utf-8") as f:
+            json.dump(report, f, indent=2)
@@ -0,0 +1,109 @@
+# bench_detections.py
+"""Post-processing cost of per-box dicts versus columnar Detections.
+
+Replays what happens to one frame's boxes between the model and the
+overlay: per-class thresholds, the scroll offset, frame to page mapping
+and the visibility filter. The dict path is the per-box Python loop the
+worker and ContentMonitor used to run; the columnar path is the same chain
+on Detections arrays. Both must keep the same boxes, which is checked
+before anything is timed.
+"""
+import argparse
+import statistics
+import sys
+
+import numpy as np
+
+from bench_common import time_ms, write_report
+from capture import FrameTransform
+from detections import Detections, threshold_vector
+from yolo_worker import DEFAULT_CLASS_THRESHOLDS
+
+NAMES = dict(enumerate(DEFAULT_CLASS_THRESHOLDS))
+
+
+def synthetic_boxes(count, size=640, seed=0):
+    """Random (xyxy, conf, class name) tuples in frame pixels"""
+    rng = np.random.default_rng(seed)
+    xy = rng.uniform(0, size - 40, (count, 2))
+    wh = rng.uniform(10, 200, (count, 2))
+    xyxy = np.concatenate([xy, np.minimum(xy + wh, size)], axis=1)
+    confs = rng.uniform(0.2, 1.0, count)
+    classes = rng.integers(0, len(NAMES), count)
+    return [(box.tolist(), float(conf), NAMES[int(c)]) for box, conf, c in zip(xyxy, confs, classes)]
+
+
+def dict_pipeline(boxes, thresholds, transform, visible, scroll_x=0, scroll_y=0):
+    detections = []
+    for (bx1, by1, bx2, by2), conf, cls_name in boxes:
+        if conf > thresholds.get(cls_name, 0.25):
+            detections.append({
+                'xyxy': [bx1 + scroll_x, by1 + scroll_y, bx2 + scroll_x, by2 + scroll_y],
+                'class': cls_name,
+                'conf': conf
+            })
+    detections = [
+        {'xyxy': transform.frame_to_page(det['xyxy']), 'class': det['class'], 'conf': det['conf']}
+        for det in detections
+    ]
+    vx1, vy1, vx2, vy2 = visible
+    result = []
+    for det in detections:
+        x1, y1, x2, y2 = det['xyxy']
+        if not (x2 < vx1 or y2 < vy1 or x1 > vx2 or y1 > vy2):
+            result.append(det)
+    return result
+
+
+def columnar_pipeline(detections, thresholds, transform, visible, scroll_x=0, scroll_y=0):
+    detections = detections.above(thresholds).shifted(scroll_x, scroll_y).frame_to_page(transform)
+    return detections[detections.touching(visible)]
+
+
+def run(box_counts=(100, 300, 1000), repeats=200, output=None):
+    thresholds = dict(DEFAULT_CLASS_THRESHOLDS)
+    vector = threshold_vector(NAMES, thresholds)
+    # A 1280x800 view captured at 640 px with some scroll and letterbox
+    transform = FrameTransform(scale=0.5, pad_x=0, pad_y=60, zoom=1.0, scroll_x=0, scroll_y=1200)
+    visible = (0, 1300, 1280, 1900)
+
+    report = {'repeats': repeats, 'runs': []}
+    passed = True
+    for count in box_counts:
+        boxes = synthetic_boxes(count)
+        columns = Detections([b[0] for b in boxes], [list(NAMES.values()).index(b[2]) for b in boxes],
+                             [b[1] for b in boxes], NAMES)
+
+        expected = dict_pipeline(boxes, thresholds, transform, visible)
+        got = columnar_pipeline(columns, vector, transform, visible)
+        same = (len(expected) == len(got) and
+                all(e['class'] == g['class'] and np.allclose(e['xyxy'], g['xyxy'], atol=1e-2)
+                    for e, g in zip(expected, got)))
+        passed &= same
+
+        dict_ms = statistics.median(
+            time_ms(lambda: dict_pipeline(boxes, thresholds, transform, visible), repeats))
+        columnar_ms = statistics.median(
+            time_ms(lambda: columnar_pipeline(columns, vector, transform, visible), repeats))
+        report['runs'].append({
+            'boxes': count,
+            'kept': len(got),
+            'identical': same,
+            'dicts_ms': round(dict_ms, 4),
+            'columnar_ms': round(columnar_ms, 4),
+            'speedup': round(dict_ms / max(1e-9, columnar_ms), 2),
+        })
+    report['passed'] = passed
+
+    write_report(report, output)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[100, 300, 1000], help="boxes per frame to measure")
+    parser.add_argument("--repeats", type=int, default=200, help="timed runs per measurement")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    ok = run(args.boxes, args.repeats, args.output)
+    sys.exit(0 if ok else 1)
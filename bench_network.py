@@ -0,0 +1,122 @@
+# bench_network.py
+"""Offline benchmark for the network-layer image pre-scan.
+
+Serves a generated page full of the repo's sample images from a local HTTP
+server, loads it twice in a headless QWebEngineView and reports how long
+images waited for a verdict, plus verdict cache hits on the revisit.
+"""
+import argparse
+import functools
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+from bench_common import SAMPLE_IMAGES, write_report
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+def build_site(site_dir, copies):
+    """Write index.html referencing every sample image ``copies`` times"""
+    project_root = os.path.dirname(os.path.abspath(__file__))
+    tags = []
+    for name in SAMPLE_IMAGES:
+        shutil.copy(os.path.join(project_root, name), site_dir)
+        # Distinct URLs with identical pixels exercise the content-hash path
+        tags.extend(f'<img src="{name}?copy={i}" width="320">' for i in range(copies))
+    with open(os.path.join(site_dir, "index.html"), "w", encoding="utf-8") as f:
+        f.write("<html><body>\n" + "\n".join(tags) + "\n</body></html>\n")
+    return len(tags)
+
+
+def serve(site_dir):
+    """Start a local HTTP server in the background and return it"""
+    handler = functools.partial(QuietHandler, directory=site_dir)
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def percentile(values, q):
+    if not values:
+        return None
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(round(q / 100 * (len(ordered) - 1))))]
+
+
+def run(copies=5, timeout=60.0, output=None):
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    from PyQt5.QtCore import QUrl
+    from PyQt5.QtWidgets import QApplication
+    from PyQt5.QtWebEngineWidgets import QWebEnginePage, QWebEngineProfile, QWebEngineView
+
+    from inference_engine import InferenceEngine
+    from network_filter import NetworkImageFilter
+    from verdict_cache import VerdictCache
+
+    site_dir = tempfile.mkdtemp(prefix="cpb-bench-")
+    expected = build_site(site_dir, copies)
+    server = serve(site_dir)
+    url = f"http://127.0.0.1:{server.server_address[1]}/index.html"
+
+    app = QApplication(sys.argv[:1])
+    engine = InferenceEngine.instance()
+    cache = VerdictCache(path=os.path.join(site_dir, "verdicts.sqlite"))
+    network_filter = NetworkImageFilter(engine, cache)
+    profile = QWebEngineProfile()  # Off-the-record, so the HTTP cache starts empty
+    network_filter.install(profile)
+
+    report = {'url': url, 'images': expected, 'passes': []}
+    for label in ("cold", "revisit"):
+        view = QWebEngineView()
+        view.setPage(QWebEnginePage(profile, view))
+        network_filter.attach(view.page())
+        verdicts = []
+        network_filter.verdictReady.connect(lambda u, v: verdicts.append(u))
+        network_filter.verdict_latency.clear()
+        hits, misses = cache.hits, cache.misses
+
+        start = time.time()
+        view.load(QUrl(url))
+        while len(set(verdicts)) < expected and time.time() - start < timeout:
+            app.processEvents()
+            time.sleep(0.005)
+        elapsed = time.time() - start
+        network_filter.verdictReady.disconnect()
+
+        latency = list(network_filter.verdict_latency)
+        report['passes'].append({
+            'pass': label,
+            'verdicts': len(set(verdicts)),
+            'wall_time_s': round(elapsed, 3),
+            'verdict_latency_p50_ms': round(1000 * (percentile(latency, 50) or 0), 1),
+            'verdict_latency_p95_ms': round(1000 * (percentile(latency, 95) or 0), 1),
+            'cache_hits': cache.hits - hits,
+            'cache_misses': cache.misses - misses,
+        })
+        view.deleteLater()
+
+    network_filter.cleanup()
+    engine.cleanup()
+    cache.close()
+    server.shutdown()
+    shutil.rmtree(site_dir, ignore_errors=True)
+
+    write_report(report, output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--copies", type=int, default=5, help="copies of each sample image on the page")
+    parser.add_argument("--timeout", type=float, default=60.0, help="seconds to wait per pass")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    run(args.copies, args.timeout, args.output)
@@ -0,0 +1,120 @@
+# bench_overlay_paint.py
+"""Paint cost of the detection overlay.
+
+Feeds synthetic page-space detections to a BrowserOverlay sitting on an
+empty stand-in for the browser view and renders it offscreen, so
+QtWebEngine isn't needed. Three numbers per box
+count: a full repaint from the cached mask paths, the same with the paths
+rebuilt before every paint (what the overlay used to do on each timer
+tick), and one scroll step, which repaints only the dirty union of the
+masks' old and new areas. The dirty fraction is the share of the viewport
+a scroll step repaints.
+"""
+import argparse
+import random
+import statistics
+import sys
+
+from PyQt5.QtCore import QObject, QPoint, QPointF, pyqtSignal
+from PyQt5.QtGui import QImage, QRegion
+from PyQt5.QtWidgets import QApplication, QWidget
+
+from bench_common import summary, time_ms, write_report
+from browser_overlay import BrowserOverlay
+
+
+class BlankPage(QObject):
+    """The parts of QWebEnginePage the overlay reads"""
+    scrollPositionChanged = pyqtSignal(QPointF)
+
+    def scrollPosition(self):
+        return QPointF(0, 0)
+
+    def zoomFactor(self):
+        return 1.0
+
+
+class BlankView(QWidget):
+    """Parent widget with a size and a page, standing in for QWebEngineView"""
+    loadStarted = pyqtSignal()
+
+    def __init__(self):
+        super().__init__()
+        self._page = BlankPage(self)
+
+    def page(self):
+        return self._page
+
+
+def synthetic_detections(count, width, height, seed=0):
+    """Boxes spread over three viewport heights of page"""
+    rng = random.Random(seed)
+    detections = []
+    for _ in range(count):
+        w, h = rng.uniform(40, 300), rng.uniform(40, 300)
+        x, y = rng.uniform(0, width - w), rng.uniform(0, 3 * height - h)
+        detections.append({'xyxy': [x, y, x + w, y + h], 'class': 'sample', 'conf': 0.9})
+    return detections
+
+
+def run(box_counts=(10, 50, 200), width=1280, height=800, repeats=200, scroll_step=4, output=None):
+    app = QApplication.instance() or QApplication(sys.argv)
+    view = BlankView()
+    view.resize(width, height)
+    overlay = BrowserOverlay(view)
+    overlay.update_position()
+    image = QImage(width, height, QImage.Format_ARGB32_Premultiplied)
+
+    report = {'viewport': [width, height], 'repeats': repeats, 'scroll_step_px': scroll_step, 'runs': []}
+    for count in box_counts:
+        overlay.cleanup()
+        overlay.set_detections({'detections': synthetic_detections(count, width, height), 'regions': None})
+        overlay.motion_timer.stop()
+        full = QRegion(overlay.rect())
+
+        cached = time_ms(lambda: overlay.render(image, QPoint(), full), repeats)
+
+        def rebuild_and_paint():
+            overlay.rebuild_masks()
+            overlay.render(image, QPoint(), full)
+        rebuilt = time_ms(rebuild_and_paint, repeats)
+
+        # Scroll down one viewport at a time, wrapping back to the top
+        position = [0]
+        dirty_fractions = []
+
+        def scroll_and_paint():
+            position[0] = (position[0] + scroll_step) % height
+            overlay.on_scroll(QPointF(0, position[0]))
+            dirty = overlay.last_dirty
+            dirty_fractions.append(sum(r.width() * r.height() for r in dirty.rects()) / (width * height))
+            overlay.render(image, QPoint(), dirty)
+        scrolled = time_ms(scroll_and_paint, repeats)
+
+        report['runs'].append({
+            'boxes': count,
+            'full_repaint_cached': summary(cached),
+            'full_repaint_rebuilt': summary(rebuilt),
+            'scroll_step_partial': summary(scrolled),
+            'dirty_fraction': round(statistics.mean(dirty_fractions), 3),
+        })
+        overlay.on_scroll(QPointF(0, 0))
+
+    overlay.cleanup()
+    view.deleteLater()
+    app.processEvents()
+
+    write_report(report, output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--boxes", type=int, nargs="+", default=[10, 50, 200], help="box counts to measure")
+    parser.add_argument("--width", type=int, default=1280, help="viewport width in logical pixels")
+    parser.add_argument("--height", type=int, default=800, help="viewport height in logical pixels")
+    parser.add_argument("--repeats", type=int, default=200, help="timed paints per measurement")
+    parser.add_argument("--scroll-step", type=int, default=4, help="pixels scrolled per frame")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    run(args.boxes, args.width, args.height, args.repeats, args.scroll_step, args.output)
@@ -0,0 +1,154 @@
+# bench_quantization.py
+"""Accuracy and latency of the INT8 model against the FP32 ONNX model.
+
+Builds (or reuses) the INT8 variant calibrated on ``--calibration``, runs
+both models over a separate ``--images`` folder and reports per-class
+precision and recall next to the speedup. Detections go through
+YoloWorker's confidence floor, box cap and per-class thresholds, as in the
+browser. With ``--labels`` (YOLO txt files
+named after the images) both models are scored against ground truth;
+without labels the FP32 detections serve as the reference, so the FP32
+columns are 1.0 by definition and the deltas show what quantization loses.
+"""
+import argparse
+import os
+import time
+
+import cv2
+
+from bench_backends import box_iou
+from bench_common import write_report
+from detector_backends import CALIBRATION_DIR, EVALUATION_DIR, create_backend, list_images
+from yolo_worker import DEFAULT_CLASS_THRESHOLDS, MAX_DETECTIONS, MODEL_CONF
+
+
+def load_labels(labels_dir, image_path, names, width, height):
+    """YOLO-format boxes for an image as (xyxy, 1.0, class name)"""
+    stem = os.path.splitext(os.path.basename(image_path))[0]
+    path = os.path.join(labels_dir, stem + ".txt")
+    boxes = []
+    if not os.path.exists(path):
+        return boxes
+    with open(path, encoding="utf-8") as f:
+        for line in f:
+            parts = line.split()
+            if len(parts) < 5:
+                continue
+            cls, cx, cy, w, h = int(parts[0]), *map(float, parts[1:5])
+            boxes.append(([(cx - w / 2) * width, (cy - h / 2) * height,
+                           (cx + w / 2) * width, (cy + h / 2) * height],
+                          1.0, names.get(cls, str(cls))))
+    return boxes
+
+
+def count_matches(truth, detections, counts, iou_threshold):
+    """Add per-class true/false positives and misses for one image"""
+    unmatched = list(detections)
+    for xyxy, _, name in truth:
+        stats = counts.setdefault(name, [0, 0, 0])
+        best = max((d for d in unmatched if d[2] == name),
+                   key=lambda d: box_iou(xyxy, d[0]), default=None)
+        if best is not None and box_iou(xyxy, best[0]) >= iou_threshold:
+            unmatched.remove(best)
+            stats[0] += 1
+        else:
+            stats[2] += 1
+    for _, _, name in unmatched:
+        counts.setdefault(name, [0, 0, 0])[1] += 1
+
+
+def precision_recall(stats):
+    tp, fp, fn = stats
+    precision = tp / (tp + fp) if tp + fp else 1.0
+    recall = tp / (tp + fn) if tp + fn else 1.0
+    return precision, recall
+
+
+def run_backend(backend, images, thresholds):
+    """Per-image detections above the class thresholds, and mean latency in ms"""
+    backend.predict(images[:1])  # warm-up
+    outputs = []
+    start = time.perf_counter()
+    for img in images:
+        # The worker's model pass, then its per-class thresholds
+        boxes = backend.predict([img], conf=MODEL_CONF, max_det=MAX_DETECTIONS)[0]
+        outputs.append([b for b in boxes if b[1] > thresholds.get(b[2], 0.25)])
+    return outputs, 1000 * (time.perf_counter() - start) / len(images)
+
+
+def run(model_path="best.pt", images_dir=EVALUATION_DIR, calibration_dir=CALIBRATION_DIR,
+        labels_dir=None, max_images=500, threads=None, iou_threshold=0.5, output=None):
+    if os.path.abspath(images_dir) == os.path.abspath(calibration_dir):
+        raise SystemExit("Evaluating on the calibration images would flatter INT8; pass a separate --images")
+    loaded = [(p, cv2.imread(p)) for p in list_images(images_dir, max_images)]
+    loaded = [(p, img) for p, img in loaded if img is not None]
+    paths = [p for p, _ in loaded]
+    images = [img for _, img in loaded]
+    if not images:
+        raise SystemExit(f"No images to evaluate in {images_dir}")
+    thresholds = dict(DEFAULT_CLASS_THRESHOLDS)
+
+    fp32 = create_backend("onnx", model_path, threads)
+    try:
+        int8 = create_backend("onnx-int8", model_path, threads, calibration_dir=calibration_dir)
+    except FileNotFoundError as e:
+        raise SystemExit(str(e))
+    if int8.name != "onnx-int8":
+        raise SystemExit("INT8 model could not be built; see the log above")
+    fp32_out, fp32_ms = run_backend(fp32, images, thresholds)
+    int8_out, int8_ms = run_backend(int8, images, thresholds)
+
+    fp32_counts, int8_counts = {}, {}
+    for path, img, ref, out in zip(paths, images, fp32_out, int8_out):
+        if labels_dir:
+            truth = load_labels(labels_dir, path, fp32.names, img.shape[1], img.shape[0])
+            count_matches(truth, ref, fp32_counts, iou_threshold)
+        else:
+            truth = ref
+        count_matches(truth, out, int8_counts, iou_threshold)
+
+    per_class = {}
+    for name in thresholds:
+        p32, r32 = precision_recall(fp32_counts.get(name, [0, 0, 0]))
+        if not labels_dir:
+            p32 = r32 = 1.0
+        p8, r8 = precision_recall(int8_counts.get(name, [0, 0, 0]))
+        per_class[name] = {
+            'threshold': thresholds[name],
+            'precision_fp32': round(p32, 3),
+            'precision_int8': round(p8, 3),
+            'precision_delta': round(p8 - p32, 3),
+            'recall_fp32': round(r32, 3),
+            'recall_int8': round(r8, 3),
+            'recall_delta': round(r8 - r32, 3),
+        }
+
+    report = {
+        'model': model_path,
+        'images': len(images),
+        'reference': 'labels' if labels_dir else 'fp32',
+        'latency_fp32_ms': round(fp32_ms, 1),
+        'latency_int8_ms': round(int8_ms, 1),
+        'speedup': round(fp32_ms / max(1e-6, int8_ms), 2),
+        'per_class': per_class,
+    }
+    fp32.close()
+    int8.close()
+
+    write_report(report, output)
+    return report
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--model", default="best.pt", help="torch checkpoint; exports are derived from it")
+    parser.add_argument("--images", default=EVALUATION_DIR, help="folder of images to evaluate on, apart from the calibration set")
+    parser.add_argument("--calibration", default=CALIBRATION_DIR, help="folder of page screenshots to calibrate INT8 on")
+    parser.add_argument("--labels", help="folder of YOLO txt labels; defaults to FP32 as the reference")
+    parser.add_argument("--max-images", type=int, default=500, help="evaluate at most this many images")
+    parser.add_argument("--threads", type=int, help="intra-op threads for both models")
+    parser.add_argument("--iou", type=float, default=0.5, help="IoU for a detection to count as a match")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    run(args.model, args.images, args.calibration, args.labels, args.max_images,
+        args.threads, args.iou, args.output)
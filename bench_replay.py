@@ -0,0 +1,461 @@
+# bench_replay.py
+"""Offline replay of recorded browsing sessions through the real pipeline.
+
+A session is a directory with a ``session.json``. Screenshot sessions hold
+a full-page image that a stand-in view shows at the recorded scroll
+positions, with DOM changes painted in as image patches:
+
+    {"kind": "frames", "viewport": [1280, 800], "page": "page.png",
+     "events": [{"t": 0.5, "type": "scroll", "x": 0, "y": 400},
+                {"t": 2.0, "type": "dom", "image": "ad.png", "x": 40, "y": 900}]}
+
+HTML sessions serve saved pages from the session directory over a local
+HTTP server into a QWebEngineView, and run the events as JavaScript:
+
+    {"kind": "html", "viewport": [1280, 800], "url": "index.html",
+     "events": [{"t": 0.5, "type": "scroll", "x": 0, "y": 400},
+                {"t": 2.0, "type": "dom", "js": "document.body.append(...)"}]}
+
+DOM events also deliver a mutation summary the way DOM_WATCH_JS would.
+The events are replayed in real time, optionally sped up. They drive a
+ContentMonitor and BrowserOverlay on the offscreen Qt platform, with the
+shared InferenceEngine behind them, just as a browser tab would.
+
+Every configuration runs each session in a fresh process. The report covers:
+- frames analysed per second;
+- the per-stage latency percentiles from PerfStats, including end-to-end exposure;
+- CPU seconds and peak RSS.
+
+With ``--baseline``, results are compared against an earlier report. The
+exit status is 1 if any of them regressed by more than ``--tolerance``.
+Run without sessions, a session is synthesised from the sample images.
+"""
+import argparse
+import importlib
+import json
+import multiprocessing
+import os
+import sys
+import tempfile
+import time
+
+from bench_common import SAMPLE_IMAGES, write_report
+
+# Lower is better unless listed in HIGHER_IS_BETTER
+COMPARED = ("throughput_fps", "cpu_s", "peak_rss_mb",
+            "exposure_p95_ms", "inference_p95_ms", "queue_p95_ms")
+HIGHER_IS_BETTER = ("throughput_fps",)
+
+
+def make_session(path, viewport=(1280, 800), page_height=4800, seed=0):
+    """Write a screenshot session built from the sample images to ``path``.
+
+    The page alternates text-like bars and the sample pictures. The
+    timeline scrolls down in wheel-sized steps, swaps one picture while
+    idle, jumps back up and flicks through the page once more.
+    """
+    import cv2
+    import numpy as np
+
+    rng = np.random.default_rng(seed)
+    width = viewport[0]
+    page = np.full((page_height, width, 3), 255, np.uint8)
+    y = 40
+    placed = []
+    while y < page_height - 300:
+        if rng.random() < 0.45:
+            img = cv2.imread(SAMPLE_IMAGES[len(placed) % len(SAMPLE_IMAGES)])
+            scale = min(420 / img.shape[1], 360 / img.shape[0])
+            img = cv2.resize(img, None, fx=scale, fy=scale, interpolation=cv2.INTER_AREA)
+            x = int(rng.integers(40, width - img.shape[1] - 40))
+            page[y:y + img.shape[0], x:x + img.shape[1]] = img
+            placed.append((x, y, img.shape[1], img.shape[0]))
+            y += img.shape[0] + 40
+        else:
+            for _ in range(int(rng.integers(3, 8))):
+                bar = int(rng.integers(width // 3, width - 120))
+                page[y:y + 10, 60:60 + bar] = 90
+                y += 22
+            y += 30
+
+    os.makedirs(path, exist_ok=True)
+    cv2.imwrite(os.path.join(path, "page.png"), page)
+    patch = cv2.imread(SAMPLE_IMAGES[-1])
+    cv2.imwrite(os.path.join(path, "patch.png"), patch)
+
+    events = []
+    t = 0.5
+    max_scroll = page_height - viewport[1]
+    # Wheel scrolling: 100 px notches at 60 Hz bursts, with short reading pauses
+    position = 0
+    while position < max_scroll // 2:
+        for _ in range(6):
+            position = min(max_scroll, position + 100)
+            events.append({'t': round(t, 3), 'type': 'scroll', 'x': 0, 'y': position})
+            t += 1 / 60
+        t += 0.6
+    # A picture in view is replaced while the page is idle
+    in_view = [p for p in placed if position <= p[1] < position + viewport[1] - 100]
+    x, y, w, h = in_view[0] if in_view else (40, position + 100, 400, 300)
+    events.append({'t': round(t + 0.5, 3), 'type': 'dom', 'image': "patch.png",
+                   'x': x, 'y': y, 'w': w, 'h': h})
+    t += 1.5
+    # Jump back to the top, then flick through to the bottom
+    events.append({'t': round(t, 3), 'type': 'scroll', 'x': 0, 'y': 0})
+    t += 1.0
+    for position in range(0, max_scroll + 1, 240):
+        events.append({'t': round(t, 3), 'type': 'scroll', 'x': 0, 'y': position})
+        t += 1 / 30
+
+    session = {'name': "synthetic-scroll", 'kind': "frames", 'viewport': list(viewport),
+               'page': "page.png", 'events': events}
+    with open(os.path.join(path, "session.json"), "w", encoding="utf-8") as f:
+        json.dump(session, f, indent=2)
+    return path
+
+
+def peak_rss_mb():
+    """Peak resident set size of this process in MB, or None if unknown"""
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Kilobytes on Linux, bytes on macOS
+        return round(peak / (2 ** 20 if sys.platform == "darwin" else 2 ** 10), 1)
+    except ImportError:
+        pass
+    try:
+        import psutil
+        info = psutil.Process().memory_info()
+        return round(getattr(info, 'peak_wset', info.rss) / 2 ** 20, 1)
+    except ImportError:
+        return None
+
+
+def load_session(path):
+    with open(os.path.join(path, "session.json"), encoding="utf-8") as f:
+        session = json.load(f)
+    session.setdefault('name', os.path.basename(os.path.normpath(path)))
+    session.setdefault('kind', "frames")
+    session.setdefault('viewport', [1280, 800])
+    session['events'] = sorted(session.get('events', []), key=lambda e: e['t'])
+    return session
+
+
+def _frames_view(session, path):
+    """QWidget standing in for QWebEngineView, showing a page screenshot"""
+    from PyQt5.QtCore import QObject, QPointF, QRect, QSizeF, pyqtSignal
+    from PyQt5.QtGui import QImage, QPainter, QColor
+    from PyQt5.QtWidgets import QWidget
+
+    class ReplayPage(QObject):
+        scrollPositionChanged = pyqtSignal(QPointF)
+        contentsSizeChanged = pyqtSignal(QSizeF)
+
+        def __init__(self, view, image):
+            super().__init__(view)
+            self.view = view
+            self.image = image
+            self.position = QPointF(0, 0)
+
+        def scrollPosition(self):
+            return QPointF(self.position)
+
+        def zoomFactor(self):
+            return 1.0
+
+        def runJavaScript(self, script, callback=None):
+            # Only MEDIA_PROBE_JS is run on a screenshot page; it has no media
+            if callback is not None:
+                callback(False)
+
+        def scroll_to(self, x, y):
+            x = max(0, min(x, self.image.width() - self.view.width()))
+            y = max(0, min(y, self.image.height() - self.view.height()))
+            if (x, y) == (self.position.x(), self.position.y()):
+                return
+            self.position = QPointF(x, y)
+            self.view.update()
+            self.scrollPositionChanged.emit(QPointF(self.position))
+
+        def patch(self, image, x, y, w=None, h=None):
+            painter = QPainter(self.image)
+            painter.drawImage(QRect(x, y, w or image.width(), h or image.height()), image)
+            painter.end()
+            self.view.update()
+
+    class ReplayView(QWidget):
+        loadStarted = pyqtSignal()
+        loadProgress = pyqtSignal(int)
+        loadFinished = pyqtSignal(bool)
+
+        def __init__(self):
+            super().__init__()
+            image = QImage(os.path.join(path, session['page']))
+            if image.isNull():
+                raise SystemExit(f"Could not read {session['page']} in {path}")
+            self._page = ReplayPage(self, image.convertToFormat(QImage.Format_RGB32))
+
+        def page(self):
+            return self._page
+
+        def paintEvent(self, event):
+            painter = QPainter(self)
+            painter.fillRect(self.rect(), QColor(255, 255, 255))
+            position = self._page.position
+            painter.drawImage(0, 0, self._page.image, int(position.x()), int(position.y()),
+                              self.width(), self.height())
+            painter.end()
+
+        def run_event(self, event):
+            if event['type'] == "scroll":
+                self._page.scroll_to(event.get('x', 0), event.get('y', 0))
+                return False
+            if event['type'] == "dom":
+                if event.get('image'):
+                    image = QImage(os.path.join(path, event['image']))
+                    self._page.patch(image, event.get('x', 0), event.get('y', 0),
+                                     event.get('w'), event.get('h'))
+                return True
+            return False
+
+    return ReplayView()
+
+
+def _html_view(session, path):
+    """QWebEngineView on the session's saved page, served from localhost"""
+    import functools
+    import threading
+    from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+    from PyQt5.QtCore import QUrl
+    from PyQt5.QtWebEngineWidgets import QWebEngineView
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=path))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    class ReplayWebView(QWebEngineView):
+        def run_event(self, event):
+            if event['type'] == "scroll":
+                self.page().runJavaScript(f"window.scrollTo({event.get('x', 0)}, {event.get('y', 0)});")
+                return False
+            if event['type'] == "dom":
+                self.page().runJavaScript(event.get('js', ""))
+                return True
+            return False
+
+    view = ReplayWebView()
+    view.server = server
+    host, port = server.server_address[:2]
+    view.load(QUrl(f"http://{host}:{port}/{session.get('url', 'index.html')}"))
+    return view
+
+
+def replay(config, path, speed=1.0, drain=3.0, load_timeout=120.0):
+    """Replay one session under one engine configuration in this process"""
+    os.environ.setdefault("QT_QPA_PLATFORM", "offscreen")
+    session = load_session(path)
+    if session['kind'] == "html":
+        # QtWebEngine must be imported before the QApplication exists; only
+        # the import's side effect is needed
+        importlib.import_module("PyQt5.QtWebEngineWidgets")
+    from PyQt5.QtCore import QTimer
+    from PyQt5.QtWidgets import QApplication
+
+    from bridge import JSBridge
+    from browser_overlay import BrowserOverlay
+    from content_monitor import ContentMonitor
+    from inference_engine import InferenceEngine
+
+    app = QApplication.instance() or QApplication([])
+    engine = InferenceEngine.instance(**config.get('engine', {}))
+    result = {'config': config['name'], 'session': session['name'], 'events': len(session['events'])}
+
+    start = time.perf_counter()
+    while not engine.is_ready and engine.load_error is None and time.perf_counter() - start < load_timeout:
+        app.processEvents()
+        time.sleep(0.01)
+    if not engine.is_ready:
+        result['error'] = engine.load_error or "model load timed out"
+        engine.cleanup()
+        return result
+    result['model_load_s'] = round(engine.load_time, 2)
+
+    view = _html_view(session, path) if session['kind'] == "html" else _frames_view(session, path)
+    view.resize(*session['viewport'])
+    view.show()
+    bridge = JSBridge()
+    overlay = BrowserOverlay(view)
+    overlay.hide()
+    monitor = ContentMonitor(view, bridge)
+    monitor.detection_signal.connect(lambda data, pixmap: overlay.set_detections(data))
+    overlay.stats = monitor.stats
+    engine.set_current_source(monitor.source_id)
+
+    analysed = []
+    engine.result_ready.connect(
+        lambda source_id, frame_id, detections:
+        analysed.append(len(detections)) if source_id == monitor.source_id else None)
+
+    if session['kind'] == "html":
+        loaded = []
+        view.loadFinished.connect(loaded.append)
+        deadline = time.perf_counter() + 30
+        while not loaded and time.perf_counter() < deadline:
+            app.processEvents()
+            time.sleep(0.01)
+    else:
+        view.loadFinished.emit(True)
+
+    # Only the replay itself is measured, not the model load
+    cpu_start = time.process_time()
+    timeline_start = time.perf_counter()
+    finished = []
+
+    def fire(event):
+        if view.run_event(event):
+            bridge.mutationsReported.emit(event.get('summary', {'added': 1, 'removed': 0, 'changed': 1}))
+
+    for event in session['events']:
+        QTimer.singleShot(int(1000 * event['t'] / speed), lambda event=event: fire(event))
+
+    last = session['events'][-1]['t'] / speed if session['events'] else 0.0
+    drain_deadline = last + drain
+
+    def check_done():
+        elapsed = time.perf_counter() - timeline_start
+        if elapsed < last:
+            return
+        idle = not monitor.pending_regions and not monitor.scheduler.timer.isActive()
+        if idle or elapsed >= drain_deadline:
+            finished.append(elapsed)
+            app.quit()
+
+    poll = QTimer()
+    poll.timeout.connect(check_done)
+    poll.start(50)
+    app.exec_()
+    poll.stop()
+
+    wall = finished[0] if finished else time.perf_counter() - timeline_start
+    cpu = time.process_time() - cpu_start
+    snapshot = monitor.stats.snapshot()
+    counters = snapshot['counters']
+    result.update({
+        'wall_s': round(wall, 3),
+        'captures': monitor.scheduler.captures,
+        'frames_submitted': counters.get('frames', 0),
+        'frames_analysed': len(analysed),
+        'frames_skipped': counters.get('skipped', 0),
+        'frames_dropped': counters.get('dropped', 0),
+        'frames_cancelled': counters.get('cancelled', 0),
+        'detections': sum(analysed),
+        'throughput_fps': round(len(analysed) / max(1e-6, wall), 2),
+        'cpu_s': round(cpu, 3),
+        'cpu_utilisation': round(cpu / max(1e-6, wall), 2),
+        'peak_rss_mb': peak_rss_mb(),
+        'stages': snapshot['stages'],
+    })
+    for stage in ("exposure", "inference", "queue"):
+        summary = snapshot['stages'].get(stage, {})
+        if 'p95' in summary:
+            result[f'{stage}_p95_ms'] = summary['p95']
+
+    monitor.close()
+    engine.cleanup()
+    return result
+
+
+def compare(results, baseline, tolerance):
+    """Metrics that got worse than the baseline run of the same config and session"""
+    previous = {(r['config'], r['session']): r for r in baseline.get('runs', [])}
+    regressions = []
+    for run in results:
+        before = previous.get((run['config'], run['session']))
+        if before is None or 'error' in run or 'error' in before:
+            continue
+        for metric in COMPARED:
+            old, new = before.get(metric), run.get(metric)
+            if not old or new is None:
+                continue
+            change = (new - old) / old
+            worse = -change if metric in HIGHER_IS_BETTER else change
+            if worse > tolerance:
+                regressions.append({
+                    'config': run['config'],
+                    'session': run['session'],
+                    'metric': metric,
+                    'baseline': old,
+                    'current': new,
+                    'change': round(change, 3),
+                })
+    return regressions
+
+
+def run(sessions=None, configs=None, speed=1.0, drain=3.0, baseline=None, tolerance=0.15, output=None):
+    if not sessions:
+        sessions = [make_session(os.path.join(tempfile.mkdtemp(prefix="replay-"), "synthetic"))]
+    configs = configs or [{'name': "onnx", 'engine': {'backend': "onnx"}}]
+
+    context = multiprocessing.get_context("spawn")
+    report = {'speed': speed, 'sessions': [os.path.abspath(s) for s in sessions], 'runs': []}
+    for config in configs:
+        for path in sessions:
+            # A fresh process per run: the engine is a singleton, and CPU
+            # time and peak RSS must not carry over between runs
+            with context.Pool(1) as pool:
+                report['runs'].append(pool.apply(replay, (config, path, speed, drain)))
+
+    passed = not any('error' in r for r in report['runs'])
+    if baseline:
+        with open(baseline, encoding="utf-8") as f:
+            report['regressions'] = compare(report['runs'], json.load(f), tolerance)
+        passed = passed and not report['regressions']
+    report['passed'] = passed
+
+    write_report(report, output)
+    return passed
+
+
+def parse_configs(specs):
+    """'name:key=value,...' specs -> engine configurations.
+
+    The backend is the longest known backend name the name starts with,
+    unless given as an option: "onnx-int8-small:max_side=480" runs the
+    INT8 model, "onnx-tiled:tiled=true" the ONNX one in tiled mode.
+    """
+    from detector_backends import BACKENDS
+
+    configs = []
+    for spec in specs:
+        name, _, options = spec.partition(":")
+        known = [b for b in BACKENDS if name == b or name.startswith(b + "-")]
+        engine = {'backend': max(known, key=len) if known else name.split("-")[0]}
+        for option in filter(None, options.split(",")):
+            key, _, value = option.partition("=")
+            engine[key] = json.loads(value) if value else True
+        configs.append({'name': name, 'engine': engine})
+    return configs
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("sessions", nargs="*", help="session directories (default: a synthetic session)")
+    parser.add_argument("--configs", nargs="+", default=["onnx"],
+                        help="engine configurations as name[:key=value,...], e.g. "
+                             "onnx torch onnx-tiled:tiled=true,batch_size=1")
+    parser.add_argument("--speed", type=float, default=1.0, help="replay speed multiplier")
+    parser.add_argument("--drain", type=float, default=3.0, help="seconds to wait for results after the last event")
+    parser.add_argument("--make-session", metavar="DIR", help="write the synthetic session to DIR and exit")
+    parser.add_argument("--baseline", help="earlier JSON report to check for regressions")
+    parser.add_argument("--tolerance", type=float, default=0.15, help="allowed relative regression")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    if args.make_session:
+        print(make_session(args.make_session))
+        sys.exit(0)
+    ok = run(args.sessions, parse_configs(args.configs), args.speed, args.drain,
+             args.baseline, args.tolerance, args.output)
+    sys.exit(0 if ok else 1)
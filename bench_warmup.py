@@ -0,0 +1,81 @@
+# bench_warmup.py
+"""First-frame versus steady-state detector latency, with and without warm-up.
+
+Each variant runs in a fresh process so no kernel or allocator state carries
+over. A replica is loaded, optionally warmed up the way InferenceEngine does
+it, and then times consecutive detect() calls on the sample images. The
+check passes when the warmed replica's first frame is within ``--tolerance``
+of its steady-state median.
+"""
+import argparse
+import multiprocessing
+import statistics
+import sys
+import time
+
+from bench_common import SAMPLE_IMAGES, write_report
+
+
+def measure(backend, model_path, warmup_runs, batch_size, frames):
+    """Latency in ms of ``frames`` consecutive detect() calls in this process"""
+    import cv2
+    from yolo_worker import YoloWorker
+
+    # Frames at the size the capture hands the engine
+    images = []
+    for path in SAMPLE_IMAGES:
+        img = cv2.imread(path)
+        scale = 640 / max(img.shape[:2])
+        images.append(cv2.resize(img, None, fx=scale, fy=scale))
+
+    worker = YoloWorker(model_path, backend=backend)
+    warmup_time = worker.warmup(range(1, batch_size + 1), warmup_runs) if warmup_runs else 0.0
+    latencies = []
+    for i in range(frames):
+        start = time.perf_counter()
+        worker.detect(images[i % len(images)])
+        latencies.append(1000 * (time.perf_counter() - start))
+    worker.cleanup()
+    return warmup_time, latencies
+
+
+def run(backend="onnx", model_path="best.pt", warmup_runs=2, batch_size=4, frames=30,
+        tolerance=1.2, output=None):
+    context = multiprocessing.get_context("spawn")
+    report = {'backend': backend, 'model': model_path, 'variants': []}
+    passed = True
+    for label, runs in (("cold", 0), ("warm", warmup_runs)):
+        with context.Pool(1) as pool:
+            warmup_time, latencies = pool.apply(
+                measure, (backend, model_path, runs, batch_size, frames))
+        steady = statistics.median(latencies[len(latencies) // 2:])
+        ratio = latencies[0] / max(1e-6, steady)
+        report['variants'].append({
+            'variant': label,
+            'warmup_s': round(warmup_time, 2),
+            'first_frame_ms': round(latencies[0], 1),
+            'first_5_ms': [round(v, 1) for v in latencies[:5]],
+            'steady_state_ms': round(steady, 1),
+            'first_to_steady': round(ratio, 2),
+        })
+        if label == "warm":
+            passed = ratio <= tolerance
+    report['passed'] = passed
+
+    write_report(report, output)
+    return passed
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--backend", default="onnx", help="detector backend to measure")
+    parser.add_argument("--model", default="best.pt", help="torch checkpoint; exports are derived from it")
+    parser.add_argument("--warmup-runs", type=int, default=2, help="dummy passes per batch size")
+    parser.add_argument("--batch-size", type=int, default=4, help="largest batch size to warm up")
+    parser.add_argument("--frames", type=int, default=30, help="timed frames per variant")
+    parser.add_argument("--tolerance", type=float, default=1.2, help="allowed first-frame / steady-state ratio")
+    parser.add_argument("--output", help="also write the JSON report to this file")
+    args = parser.parse_args()
+    ok = run(args.backend, args.model, args.warmup_runs, args.batch_size, args.frames,
+             args.tolerance, args.output)
+    sys.exit(0 if ok else 1)
@@ -1,10 +1,137 @@
 # bridge.py
+import json
+
 from PyQt5.QtCore import QObject, pyqtSlot, pyqtSignal
 
+from logs import get_logger
+
+log = get_logger("bridge")
+
+# Watches the DOM and reports what changed, at most once per interval.
+# Mutation records are only tallied as they arrive; the summary (counts plus
+# the visible media that was added or re-pointed, in the same shape as
+# image_scanner's reports) is built when the page is idle and sent as one
+# message, so busy pages such as infinite scrolls don't flood the channel.
+DOM_WATCH_JS = r"""
+(function() {
+    if (window.channelInjected) return;  // prevent duplicate injection
+    window.channelInjected = true;
+    new QWebChannel(qt.webChannelTransport, function(channel) {
+        window.pyObj = channel.objects.pyObj;
+        const minInterval = %(min_interval)d;
+        const maxMedia = 50;
+        const mediaSelector = 'img, video, picture, [style*="background"]';
+        let added = 0, removed = 0, changed = 0, text = 0;
+        let media = new Set();
+        let scheduled = false;
+        let lastSent = 0;
+
+        function collect(node) {
+            if (node.nodeType !== 1) return;
+            if (node.matches(mediaSelector)) media.add(node);
+            if (media.size < maxMedia * 4) {
+                for (const el of node.querySelectorAll(mediaSelector)) media.add(el);
+            }
+        }
+
+        function describe(el) {
+            const r = el.getBoundingClientRect();
+            if (r.width < 1 || r.height < 1) return null;
+            if (r.bottom <= 0 || r.right <= 0 || r.top >= window.innerHeight || r.left >= window.innerWidth) return null;
+            let src = el.currentSrc || el.src || el.poster || '';
+            if (!src) {
+                const bg = getComputedStyle(el).backgroundImage;
+                if (!bg || !bg.startsWith('url(')) return null;
+                src = bg.slice(4, -1).replace(/["']/g, '');
+            }
+            return {src: src, kind: el.tagName.toLowerCase(), x: r.left, y: r.top, w: r.width, h: r.height};
+        }
+
+        function flush() {
+            scheduled = false;
+            const wait = lastSent + minInterval - Date.now();
+            if (wait > 0) { schedule(wait); return; }
+            lastSent = Date.now();
+
+            const images = [];
+            for (const el of media) {
+                if (images.length >= maxMedia) break;
+                const entry = el.isConnected && describe(el);
+                if (entry) images.push(entry);
+            }
+            const summary = {
+                added: added, removed: removed, changed: changed, text: text,
+                truncated: media.size > maxMedia,
+                scrollX: window.scrollX, scrollY: window.scrollY,
+                images: images
+            };
+            added = removed = changed = text = 0;
+            media = new Set();
+            window.pyObj.reportMutations(JSON.stringify(summary));
+        }
+
+        function schedule(delay) {
+            if (scheduled) return;
+            scheduled = true;
+            setTimeout(function() {
+                if (window.requestIdleCallback) requestIdleCallback(flush, {timeout: minInterval});
+                else flush();
+            }, delay);
+        }
+
+        const observer = new MutationObserver(function(records) {
+            for (const record of records) {
+                if (record.type === 'childList') {
+                    added += record.addedNodes.length;
+                    removed += record.removedNodes.length;
+                    record.addedNodes.forEach(collect);
+                    for (const node of record.addedNodes) {
+                        if (/\S/.test(node.nodeType === 1 || node.nodeType === 3 ? node.textContent : '')) text++;
+                    }
+                } else {
+                    changed++;
+                    collect(record.target);
+                }
+            }
+            schedule(0);
+        });
+        observer.observe(document.documentElement, {
+            childList: true, subtree: true,
+            attributes: true, attributeFilter: ['src', 'srcset', 'poster']
+        });
+
+        // Video playback changes pixels without touching the DOM
+        document.addEventListener('play', function(e) { media.add(e.target); schedule(0); }, true);
+    });
+})();
+"""
+
 class JSBridge(QObject):
     domChanged = pyqtSignal()  # Signal to notify Python
+    mutationsReported = pyqtSignal(dict)  # Coalesced DOM change summary from DOM_WATCH_JS
+    imagesReported = pyqtSignal(dict)  # Page images enumerated by image_scanner's script
 
     @pyqtSlot()
     def notifyDomChanged(self):
-        print("[JSBridge] DOM changed detected!")
         self.domChanged.emit()
+
+    @pyqtSlot(str)
+    def reportMutations(self, payload):
+        """Receive one interval's worth of DOM changes from the page"""
+        try:
+            summary = json.loads(payload)
+        except ValueError as e:
+            log.warning("Bad mutation report: %s", e)
+            return
+        self.mutationsReported.emit(summary)
+        self.domChanged.emit()
+
+    @pyqtSlot(str)
+    def reportImages(self, payload):
+        """Receive the JSON list of visible image elements from the page"""
+        try:
+            report = json.loads(payload)
+        except ValueError as e:
+            log.warning("Bad image report: %s", e)
+            return
+        self.imagesReported.emit(report)
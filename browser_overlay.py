@@ -1,228 +1,266 @@
 import time
 from PyQt5.QtWidgets import QWidget
-from PyQt5.QtCore import Qt, QRect, QTimer, QEvent, QRectF, QPoint, QDateTime
-from PyQt5.QtGui import QPainter, QColor, QPen, QPainterPath, QRegion
-from PyQt5.QtWebEngineWidgets import QWebEnginePage
+from PyQt5.QtCore import Qt, QRect, QTimer, QEvent, QRectF, QPointF
+from PyQt5.QtGui import QPainter, QColor, QPen, QPainterPath, QRegion, QFont, QFontMetrics
+
+from tracker import DetectionTracker
+
+from logs import get_logger
+
+log = get_logger("overlay")
 
 class BrowserOverlay(QWidget):
     def __init__(self, parent):
         super().__init__(parent)
-        self.detections = []  # Stores all active detections
-        self.last_activity_time = time.time()
-        self.inactivity_threshold = 2.0  # 2 seconds
-        
-        # Initialize scroll position tracking
-        self.last_scroll_position = QPoint(0, 0)
-        self.scroll_threshold = 10  # pixels
-        
-        # Detection matching thresholds
-        self.position_threshold = 30  # pixels
-        self.size_threshold = 0.3  # 30% size difference
-        
+        self.tracker = DetectionTracker()  # Page-space tracks that outlive single frames
+        self.initializing = False  # Covers the whole page until the detector is ready
+
+        # Mask geometry is cached in zoomed page pixels (CSS pixels * zoom), so
+        # scrolling only moves the painter and never rebuilds a path
+        self.masks = []  # (QRectF, QPainterPath, label)
+        self.zoom = 1.0
+        self.offset = QPointF(0, 0)  # scroll position in widget pixels
+        self.painted = QRegion()  # widget area the masks cover right now
+        self.last_dirty = QRegion()  # area handed to the last update()
+        self.dpr = None
+        self.max_dirty_rects = 16  # beyond this, repaint the boxes' bounding rect
+
+        # Masks follow every scroll step; vetted content needs no new inference
+        parent.page().scrollPositionChanged.connect(self.on_scroll)
+        # Tracks are in page coordinates and mean nothing on the next page
+        parent.loadStarted.connect(self.reset)
+        parent.installEventFilter(self)
+
         # Visual settings
         self.fill_color = QColor(0, 0, 0, 250)  # Semi-transparent red
         self.border_color = QColor(0, 0, 0, 250)
-        
-        # Setup timers
-        self.activity_timer = QTimer(self)
-        self.activity_timer.timeout.connect(self.check_activity)
-        self.activity_timer.start(200)
-        
-        self.update_timer = QTimer(self)
-        self.update_timer.timeout.connect(self.update_position)
-        self.update_timer.start(100)
-        
+        self.border_width = 2
+
+        # Performance HUD over the page, fed from the tab's PerfStats
+        self.stats = None
+        self.hud_enabled = False
+        self.hud_rect = QRect()
+        self.hud_lines = []
+        self.hud_font = QFont("Monospace", 8)
+        self.hud_font.setStyleHint(QFont.TypeWriter)
+        self.hud_timer = QTimer(self)
+        self.hud_timer.setInterval(500)
+        self.hud_timer.timeout.connect(self.refresh_hud)
+        self.pending_exposure = None  # when content now being masked reached the screen
+
+        # Only runs while some track is predicted to be moving
+        self.motion_timer = QTimer(self)
+        self.motion_timer.setInterval(33)
+        self.motion_timer.timeout.connect(self.rebuild_masks)
+
         self.update_position()
         self.setAttribute(Qt.WA_TransparentForMouseEvents, True)
         self.setWindowFlags(Qt.FramelessWindowHint | Qt.WindowDoesNotAcceptFocus)
         self.setAttribute(Qt.WA_TranslucentBackground)
 
-    def is_same_detection(self, det1, det2):
-        """Check if two detections are the same object with tolerance"""
-        if det1['class'] != det2['class']:
-            return False
-            
-        x1, y1, x2, y2 = det1['xyxy']
-        x1_new, y1_new, x2_new, y2_new = det2['xyxy']
-        
-        # Center point comparison
-        cx = (x1 + x2) / 2
-        cy = (y1 + y2) / 2
-        cx_new = (x1_new + x2_new) / 2
-        cy_new = (y1_new + y2_new) / 2
-        
-        # Position check
-        distance = ((cx_new - cx)**2 + (cy_new - cy)**2)**0.5
-        if distance > self.position_threshold:
-            return False
-            
-        # Size check
-        area = (x2 - x1) * (y2 - y1)
-        area_new = (x2_new - x1_new) * (y2_new - y1_new)
-        size_diff = abs(area_new - area) / max(area, area_new)
-        if size_diff > self.size_threshold:
-            return False
-            
-        return True
-
-    def check_activity(self):
-        """Clear detections on user activity"""
-        current_time = time.time()
-        if current_time - self.last_activity_time < self.inactivity_threshold:
-            if self.detections:
-                self.detections = []
-                self.hide()
-                self.update()
-                # Force content re-check
-                if hasattr(self.parent(), 'page'):
-                    self.parent().page().triggerAction(QWebEnginePage.Reload)
-
-    def use_stable_detections(self):
-        """Use the most consistent detections during inactivity"""
-        if self.stable_detections and not self.detections:
-            self.detections = self.stable_detections.copy()
-            self.update()
-
-    def use_live_detections(self):
-        """Use real-time detections when active"""
-        if self.detections:
-            self.stable_detections = self.detections.copy()
+    def eventFilter(self, obj, event):
+        if obj is self.parent() and event.type() == QEvent.Resize:
+            self.update_position()
+        return False
 
     def update_position(self):
-        """Standard position update with scroll detection"""
+        """Match the browser's geometry; needed on resize and DPR changes only"""
         if not self.parent():
             return
-            
-        dpr = self.parent().devicePixelRatioF()
+
         viewport = self.parent().visibleRegion().boundingRect()
-        
+
         if not viewport.isValid():
             viewport = self.parent().rect()
-        
-        # Get current scroll position
-        current_scroll = self.parent().page().scrollPosition()
-        
-        # Clear detections if scroll position changed significantly
-        if (abs(current_scroll.x() - self.last_scroll_position.x()) > self.scroll_threshold or 
-            abs(current_scroll.y() - self.last_scroll_position.y()) > self.scroll_threshold):
-            self.detections = []
-            self.update()
-        
-        self.last_scroll_position = current_scroll
-        self.setGeometry(0, 0, int(viewport.width() * dpr), int(viewport.height() * dpr))
-        self.update()
+
+        # Geometry is in logical pixels; Qt applies the device pixel ratio itself
+        self.dpr = self.devicePixelRatioF()
+        self.setGeometry(0, 0, viewport.width(), viewport.height())
+        self.repaint_masks(full=True)
+
+    def on_scroll(self, position):
+        """Move the masks with the page; only the boxes' old and new areas repaint"""
+        if self.devicePixelRatioF() != self.dpr:
+            self.update_position()
+        zoom = self.parent().page().zoomFactor()
+        self.offset = QPointF(position.x() * zoom, position.y() * zoom)
+        if zoom != self.zoom:
+            self.zoom = zoom
+            self.rebuild_masks()
+        else:
+            self.repaint_masks()
+
+    def rebuild_masks(self):
+        """Rebuild the cached mask paths from the tracks; only needed when they change"""
+        z = self.zoom
+        rects = []
+        for track in self.tracker.detections():
+            x1, y1, x2, y2 = track['xyxy']
+            if x2 <= x1 or y2 <= y1:
+                continue
+            rects.append((QRectF(x1 * z, y1 * z, (x2 - x1) * z, (y2 - y1) * z),
+                          f"{track['class']} ({track['conf']:.2f})"))
+
+        if self.tracker.is_moving():
+            if not self.motion_timer.isActive():
+                self.motion_timer.start()
+        else:
+            self.motion_timer.stop()
+
+        # Sub-pixel motion changes nothing on screen
+        if ([(r.toAlignedRect(), label) for r, label in rects] ==
+                [(r.toAlignedRect(), label) for r, _, label in self.masks]):
+            return
+        masks = []
+        for rect, label in rects:
+            path = QPainterPath()
+            path.addRoundedRect(rect, 4, 4)
+            masks.append((rect, path, label))
+        self.masks = masks
+        self.repaint_masks()
+
+    def repaint_masks(self, full=False):
+        """Schedule a repaint of the union of the old and new mask areas"""
+        margin = self.border_width
+        view = QRectF(self.rect()).translated(self.offset)
+        rects = [
+            rect.translated(-self.offset).toAlignedRect().adjusted(-margin, -margin, margin, margin)
+            for rect, _, _ in self.masks if rect.intersects(view)
+        ]
+        if len(rects) > self.max_dirty_rects:
+            # Many boxes: one bounding rect is cheaper than a complex region
+            bounds = QRect()
+            for rect in rects:
+                bounds = bounds.united(rect)
+            region = QRegion(bounds)
+        else:
+            region = QRegion()
+            for rect in rects:
+                region += rect
+        region &= QRegion(self.rect())
+        dirty = QRegion(self.rect()) if full else region.united(self.painted)
+        self.painted = region
+        self.last_dirty = dirty
+
+        self.setVisible(not region.isEmpty() or self.initializing or self.hud_enabled)
+        if not dirty.isEmpty():
+            self.update(dirty)
 
     def set_detections(self, detection_data):
-        """Update detections while preserving previous ones (without aging)"""
-        if not detection_data or not detection_data.get('detections'):
-            self.update()
+        """Fold one round of page-space results into the tracker"""
+        if not detection_data:
             return
-        
+
         try:
-            viewport_w = self.parent().width()
-            viewport_h = self.parent().height()
-            new_detections = []
-            
-            # Process new detections
-            for detection in detection_data['detections']:
-                try:
-                    x1 = max(0, min(viewport_w, detection['xyxy'][0]))
-                    y1 = max(0, min(viewport_h, detection['xyxy'][1]))
-                    x2 = max(0, min(viewport_w, detection['xyxy'][2]))
-                    y2 = max(0, min(viewport_h, detection['xyxy'][3]))
-                    
-                    if x2 > x1 and y2 > y1:
-                        new_detections.append({
-                            'xyxy': [x1, y1, x2, y2],
-                            'class': detection['class'],
-                            'conf': detection['conf']
-                        })
-                except Exception as e:
-                    print(f"Invalid detection coordinates: {str(e)}")
-            
-            # Combine new and existing detections
-            combined = []
-            matched_indices = set()
-            
-            # First match existing detections
-            for existing in self.detections:
-                matched = False
-                for i, new_det in enumerate(new_detections):
-                    if i not in matched_indices and self.is_same_detection(existing, new_det):
-                        # Update position/confidence
-                        combined.append({
-                            'xyxy': new_det['xyxy'],
-                            'class': new_det['class'],
-                            'conf': max(existing['conf'], new_det['conf'])
-                        })
-                        matched_indices.add(i)
-                        matched = True
-                        break
-                
-                if not matched:
-                    combined.append(existing)  # Keep existing detection
-            
-            # Add remaining new detections
-            for i, new_det in enumerate(new_detections):
-                if i not in matched_indices:
-                    combined.append(new_det)
-            
-            self.detections = combined
+            added = self.tracker.update(detection_data.get('detections', []), detection_data.get('regions'))
+            if added and detection_data.get('exposed_at') is not None:
+                # Measured at the paint that shows the new masks
+                self.pending_exposure = detection_data['exposed_at']
+            page = self.parent().page()
+            scroll = page.scrollPosition()
+            self.zoom = page.zoomFactor()
+            self.offset = QPointF(scroll.x() * self.zoom, scroll.y() * self.zoom)
+            self.rebuild_masks()
+        except Exception as e:
+            log.exception("Overlay update failed: %s", e)
+            self.hide()
+
+    def set_initializing(self, initializing):
+        """Hold the page behind an opaque shield while the model loads"""
+        self.initializing = initializing
+        if initializing:
             self.update_position()
             self.show()
-            self.update()
-        except Exception as e:
-            print(f"Overlay update failed: {str(e)}")
+            self.raise_()
+        elif self.painted.isEmpty():
             self.hide()
+        self.update()
 
-    def age_detections(self):
-        """Increment age of all detections and remove old ones"""
-        self.all_detections = [
-            d for d in self.all_detections 
-            if d['age'] < self.max_age
-        ]
-        for d in self.all_detections:
-            d['age'] += 1
+    def set_hud(self, enabled):
+        """Show or hide the latency HUD"""
+        self.hud_enabled = enabled
+        if enabled:
+            self.hud_timer.start()
+            self.refresh_hud()
+        else:
+            self.hud_timer.stop()
+            self.update(self.hud_rect)
+            self.hud_rect = QRect()
+        self.repaint_masks()
+
+    def refresh_hud(self):
+        if not self.stats:
+            return
+        self.hud_lines = self.stats.format_lines()
+        metrics = QFontMetrics(self.hud_font)
+        width = max(metrics.horizontalAdvance(line) for line in self.hud_lines) + 12
+        height = metrics.lineSpacing() * len(self.hud_lines) + 8
+        rect = QRect(self.width() - width - 8, 8, width, height)
+        self.update(self.hud_rect.united(rect))
+        self.hud_rect = rect
+
+    def draw_hud(self, painter):
+        painter.resetTransform()
+        painter.setRenderHint(QPainter.Antialiasing, False)
+        painter.fillRect(self.hud_rect, QColor(0, 0, 0, 180))
+        painter.setPen(QPen(QColor(120, 255, 120), 1))
+        painter.setFont(self.hud_font)
+        painter.drawText(self.hud_rect.adjusted(6, 4, -6, -4), Qt.AlignLeft | Qt.AlignTop,
+                         "\n".join(self.hud_lines))
 
     def paintEvent(self, event):
+        start = time.perf_counter()
         painter = QPainter(self)
+
+        if self.initializing:
+            painter.fillRect(self.rect(), QColor(30, 30, 30))
+            painter.setPen(QPen(Qt.white, 1))
+            painter.drawText(self.rect(), Qt.AlignCenter, "Protection initializing…")
+            painter.end()
+            return
+
         painter.setRenderHint(QPainter.Antialiasing, True)
-        
-        for detection in self.detections:
-            self.draw_detection(painter, detection)
-        
+        painter.translate(-self.offset)
+        # Only masks that touch the dirty area need drawing
+        clip = QRectF(event.rect()).translated(self.offset)
+        for mask in self.masks:
+            if mask[0].intersects(clip):
+                self.draw_detection(painter, mask)
+
+        if self.hud_enabled and self.hud_rect.intersects(event.rect()):
+            self.draw_hud(painter)
         painter.end()
 
-    def draw_detection(self, painter, detection):
-        """Draw a detection box"""
+        if self.stats:
+            self.stats.record("paint", 1000 * (time.perf_counter() - start))
+            if self.pending_exposure is not None:
+                self.stats.record("exposure", 1000 * (time.monotonic() - self.pending_exposure))
+        self.pending_exposure = None
+
+    def draw_detection(self, painter, mask):
+        """Draw a detection box from its cached path"""
         try:
-            x1, y1, x2, y2 = detection['xyxy']
-            rect = QRectF(x1, y1, x2-x1, y2-y1)
-            
-            path = QPainterPath()
-            path.addRoundedRect(rect, 4, 4)
-            
+            rect, path, label = mask
             painter.fillPath(path, self.fill_color)
-            painter.setPen(QPen(self.border_color, 2))
+            painter.setPen(QPen(self.border_color, self.border_width))
             painter.drawPath(path)
-            
+
             painter.setPen(QPen(Qt.white, 1))
-            painter.drawText(QPoint(x1 + 5, y1 + 15), 
-                           f"{detection['class']} ({detection['conf']:.2f})")
+            painter.drawText(rect.adjusted(5, 2, -2, -2), Qt.AlignLeft | Qt.AlignTop, label)
         except Exception as e:
-            print(f"Drawing error: {str(e)}")
-
-    def event(self, event):
-        """Track user activity"""
-        if event.type() in (QEvent.MouseMove, QEvent.MouseButtonPress, QEvent.Wheel):
-            self.last_activity_time = time.time()
-            # Clear detections immediately on any mouse interaction
-            if self.detections:
-                self.detections = []
-                self.hide()
-                self.update()
-        return super().event(event)
+            log.exception("Drawing error: %s", e)
+
+    def reset(self):
+        """Drop every track and mask, e.g. on navigation"""
+        self.motion_timer.stop()
+        self.tracker.clear()
+        self.masks = []
+        self.pending_exposure = None
+        self.repaint_masks()
 
     def cleanup(self):
-        self.update_timer.stop()
-        self.detections.clear()
\ No newline at end of file
+        self.motion_timer.stop()
+        self.hud_timer.stop()
+        self.tracker.clear()
+        self.masks = []
+        self.painted = QRegion()
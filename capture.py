@@ -0,0 +1,172 @@
+# capture.py
+import time
+
+import numpy as np
+from PyQt5.QtCore import Qt
+from PyQt5.QtGui import QImage
+
+# Qt >= 5.14 can hand us BGR directly, which is what the model expects
+_BGR_FORMAT = getattr(QImage, 'Format_BGR888', None)
+
+# Same grey the Ultralytics letterbox pads with
+PAD_VALUE = 114
+
+
+class FrameTransform:
+    """Exact mapping between one captured frame and the page it shows.
+
+    Frame pixels relate to widget (logical) pixels by ``scale`` after
+    removing the letterbox padding; widget pixels relate to page (CSS)
+    pixels by the page ``zoom`` and the ``scroll`` position at capture
+    time. ``dpr`` records the device pixel ratio the grab was taken at.
+    """
+
+    def __init__(self, scale=1.0, pad_x=0, pad_y=0, dpr=1.0, zoom=1.0, scroll_x=0, scroll_y=0):
+        self.scale = scale  # frame pixels per widget pixel
+        self.pad_x = pad_x
+        self.pad_y = pad_y
+        self.dpr = dpr
+        self.zoom = zoom  # widget pixels per CSS pixel
+        self.scroll_x = scroll_x
+        self.scroll_y = scroll_y
+
+    @property
+    def scroll_scale(self):
+        """Frame pixels per CSS pixel of scrolling"""
+        return self.scale * self.zoom
+
+    def frame_to_page(self, xyxy):
+        x1, y1, x2, y2 = xyxy
+        k = self.scroll_scale
+        return [
+            (x1 - self.pad_x) / k + self.scroll_x,
+            (y1 - self.pad_y) / k + self.scroll_y,
+            (x2 - self.pad_x) / k + self.scroll_x,
+            (y2 - self.pad_y) / k + self.scroll_y,
+        ]
+
+    def page_to_frame(self, xyxy):
+        x1, y1, x2, y2 = xyxy
+        k = self.scroll_scale
+        return [
+            (x1 - self.scroll_x) * k + self.pad_x,
+            (y1 - self.scroll_y) * k + self.pad_y,
+            (x2 - self.scroll_x) * k + self.pad_x,
+            (y2 - self.scroll_y) * k + self.pad_y,
+        ]
+
+    def page_to_widget(self, xyxy):
+        x1, y1, x2, y2 = xyxy
+        return [
+            (x1 - self.scroll_x) * self.zoom,
+            (y1 - self.scroll_y) * self.zoom,
+            (x2 - self.scroll_x) * self.zoom,
+            (y2 - self.scroll_y) * self.zoom,
+        ]
+
+    def with_scroll(self, scroll_x, scroll_y):
+        """Same capture geometry at another scroll position"""
+        return FrameTransform(self.scale, self.pad_x, self.pad_y, self.dpr,
+                              self.zoom, scroll_x, scroll_y)
+
+
+class FrameCapture:
+    """Grabs a widget straight into reusable BGR buffers for the detector.
+
+    The grab is scaled down to ``max_side`` (the model's input size) while
+    it is still a QImage, converted once to packed 24-bit BGR and copied
+    with a single memcpy into a preallocated contiguous array, letterboxed
+    to a multiple of ``stride`` so the model needs no further resizing.
+    Every frame comes with the FrameTransform that maps it back. Frames live
+    in a small ring of buffers because the engine may still hold the
+    previous ones while the next is captured; a buffer is only reallocated
+    when the frame size changes.
+    """
+
+    def __init__(self, max_side=640, stride=32, ring_size=4, smooth=False):
+        self.max_side = max_side  # None keeps the native resolution
+        self.stride = stride  # None or 1 disables letterbox padding
+        self.ring_size = ring_size
+        self.transform_mode = Qt.SmoothTransformation if smooth else Qt.FastTransformation
+        self.buffers = [None] * ring_size
+        self._next = 0
+
+        # Counters to make per-frame cost visible
+        self.frames = 0
+        self.allocations = 0
+        self.bytes_copied = 0
+        self.last_timings = {}  # 'grab' / 'convert' -> ms of the last grab()
+
+    def _target_size(self, width, height):
+        if not self.max_side or max(width, height) <= self.max_side:
+            return width, height
+        ratio = self.max_side / max(width, height)
+        return max(1, round(width * ratio)), max(1, round(height * ratio))
+
+    def _padded_size(self, width, height):
+        if not self.stride or self.stride <= 1:
+            return width, height
+        return (-(-width // self.stride) * self.stride,
+                -(-height // self.stride) * self.stride)
+
+    def _buffer(self, height, width):
+        index = self._next
+        self._next = (self._next + 1) % self.ring_size
+        buf = self.buffers[index]
+        if buf is None or buf.shape[:2] != (height, width):
+            buf = np.full((height, width, 3), PAD_VALUE, np.uint8)
+            self.buffers[index] = buf
+            self.allocations += 1
+        return buf
+
+    def convert(self, qimg):
+        """Scale and convert a QImage into the next ring buffer.
+
+        Returns (frame, scale, pad_x, pad_y); ``scale`` is frame pixels per
+        source image pixel and the pads are the letterbox offsets.
+        """
+        w, h = self._target_size(qimg.width(), qimg.height())
+        scale = w / max(1, qimg.width())
+        padded_w, padded_h = self._padded_size(w, h)
+        pad_x, pad_y = (padded_w - w) // 2, (padded_h - h) // 2
+        if (w, h) != (qimg.width(), qimg.height()):
+            qimg = qimg.scaled(w, h, Qt.IgnoreAspectRatio, self.transform_mode)
+
+        if _BGR_FORMAT is not None:
+            qimg = qimg.convertToFormat(_BGR_FORMAT)
+            swap = False
+        else:
+            qimg = qimg.convertToFormat(QImage.Format_RGB888)
+            swap = True
+
+        # Rows are padded to 4 bytes, so view with the real stride
+        ptr = qimg.constBits()
+        ptr.setsize(qimg.byteCount())
+        rows = np.frombuffer(ptr, np.uint8).reshape((h, qimg.bytesPerLine()))
+        view = rows[:, :w * 3].reshape((h, w, 3))
+
+        # The padding of a reused buffer is still grey; only the image area is written
+        frame = self._buffer(padded_h, padded_w)
+        target = frame[pad_y:pad_y + h, pad_x:pad_x + w]
+        if swap:
+            np.copyto(target, view[:, :, ::-1])
+        else:
+            np.copyto(target, view)
+        self.frames += 1
+        self.bytes_copied += target.nbytes
+        return frame, scale, pad_x, pad_y
+
+    def grab(self, widget, scroll_x=0, scroll_y=0, zoom=1.0):
+        """Grab a widget; returns (pixmap, frame, FrameTransform)"""
+        start = time.perf_counter()
+        pixmap = widget.grab()
+        grabbed = time.perf_counter()
+        frame, scale, pad_x, pad_y = self.convert(pixmap.toImage())
+        self.last_timings = {
+            'grab': 1000 * (grabbed - start),
+            'convert': 1000 * (time.perf_counter() - grabbed),
+        }
+        # The pixmap is in device pixels; express scale against logical ones
+        dpr = pixmap.devicePixelRatioF()
+        transform = FrameTransform(scale * dpr, pad_x, pad_y, dpr, zoom, scroll_x, scroll_y)
+        return pixmap, frame, transform
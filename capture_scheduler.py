@@ -0,0 +1,94 @@
+# capture_scheduler.py
+import time
+
+from PyQt5.QtCore import QObject, QTimer, pyqtSignal
+
+# Whether the page shows content that changes without DOM events: playing
+# video, canvases or (likely animated) GIFs.
+MEDIA_PROBE_JS = """
+(function() {
+    for (const v of document.querySelectorAll('video')) {
+        if (!v.paused && !v.ended) return true;
+    }
+    if (document.querySelector('canvas')) return true;
+    for (const img of document.images) {
+        if (/\\.gif($|[?#])/i.test(img.currentSrc || img.src)) return true;
+    }
+    return false;
+})();
+"""
+
+
+class CaptureScheduler(QObject):
+    """Turns page events into capture requests.
+
+    Every ``request()`` (scroll, DOM change, load progress...) schedules one
+    ``capture`` emission. Bursts are coalesced: the capture waits until no
+    new request arrived for ``debounce_ms``, but never longer than
+    ``max_latency_ms`` after the first request of the burst, and never
+    sooner than ``min_interval_ms`` after the previous capture. Pages with
+    media that changes on its own also get a slow heartbeat; everything
+    else costs nothing while idle.
+    """
+    capture = pyqtSignal()
+
+    def __init__(self, debounce_ms=60, max_latency_ms=250, min_interval_ms=100, heartbeat_ms=1000):
+        super().__init__()
+        self.debounce_ms = debounce_ms
+        self.max_latency_ms = max_latency_ms
+        self.min_interval_ms = min_interval_ms
+        self.heartbeat_ms = heartbeat_ms
+
+        self.active = True
+        self.first_request = None  # time of the oldest request not yet served
+        self.burst_start = None  # that time for the capture last emitted
+        self.last_capture = 0.0
+        self.requests = 0
+        self.captures = 0
+
+        self.timer = QTimer(self)
+        self.timer.setSingleShot(True)
+        self.timer.timeout.connect(self._fire)
+
+        self.heartbeat = QTimer(self)
+        self.heartbeat.timeout.connect(self.request)
+
+    def request(self, delay_ms=0):
+        """Ask for a capture, at the earliest ``delay_ms`` from now"""
+        if not self.active:
+            return
+        self.requests += 1
+        now = time.monotonic()
+        if self.first_request is None:
+            self.first_request = now
+        # Let the burst settle, but not beyond the latency bound
+        wait = min(max(self.debounce_ms, delay_ms),
+                   (self.first_request - now) * 1000 + self.max_latency_ms)
+        # ...and keep to the capture rate
+        wait = max(wait, delay_ms, (self.last_capture - now) * 1000 + self.min_interval_ms, 0)
+        self.timer.start(int(wait))
+
+    def set_media_active(self, active):
+        """Run the heartbeat only while the page has self-changing media"""
+        if active and self.active and self.heartbeat_ms:
+            if not self.heartbeat.isActive():
+                self.heartbeat.start(self.heartbeat_ms)
+        else:
+            self.heartbeat.stop()
+
+    def start(self):
+        self.active = True
+        self.request()
+
+    def stop(self):
+        self.active = False
+        self.first_request = None
+        self.timer.stop()
+        self.heartbeat.stop()
+
+    def _fire(self):
+        self.last_capture = time.monotonic()
+        self.burst_start = self.first_request or self.last_capture
+        self.first_request = None
+        self.captures += 1
+        self.capture.emit()
@@ -1,18 +1,28 @@
-from PyQt5.QtCore import QObject, pyqtSignal, QTimer, QMutex, QMutexLocker, QMetaObject, Qt, QThread, Q_ARG
-from PyQt5.QtGui import QImage, QPixmap
-import numpy as np
+from PyQt5.QtCore import QObject, pyqtSignal, QMutex, QMutexLocker
+from PyQt5.QtGui import QPixmap
 import os
 import time
-import cv2
-from datetime import datetime
-import threading
 
-from yolo_worker import YoloWorker
+from inference_engine import InferenceEngine
+from capture import FrameCapture, FrameTransform
+from detections import Detections
+from frame_diff import FrameChangeDetector, UNCHANGED, SCROLLED
+from image_scanner import ImageScanner
+from capture_scheduler import CaptureScheduler, MEDIA_PROBE_JS
+
+from logs import get_logger
+
+log = get_logger("monitor")
+
+# Scan tiers, see ContentMonitor.set_tier
+FOREGROUND = "foreground"  # current tab, adaptive full rate
+RECENT = "recent"  # visible or recently used tab, low steady rate
+HIDDEN = "hidden"  # scanned once after each load or DOM change
 
 class ContentMonitor(QObject):
     detection_signal = pyqtSignal(dict, QPixmap)
     
-    def __init__(self, browser_window):
+    def __init__(self, browser_window, bridge=None, pipeline="viewport", prefetch=False):
         super().__init__()
         self.class_thresholds = {
             'violence': 0.85,
@@ -27,149 +37,351 @@ class ContentMonitor(QObject):
         self.active = True
         self.last_detection_time = 0
         self.adaptive_interval = 100  # Start with 100ms (10fps)
+        self.background_interval = 1000  # Non-foreground tabs scan at 1fps unless given a budget
+        self.tier = FOREGROUND
+        self.foreground = True
         self.last_process_time = 0
         self.current_pixmap = None
         self.pending_detection = False
 
+        # Skip inference when the viewport hasn't changed since the last frame sent
+        self.change_detector = FrameChangeDetector()
+        self.last_detections = Detections()  # page coordinates
+        # frame id -> (page region covered or None, FrameTransform, changed page rects or None,
+        #              monotonic time of the page event behind the capture)
+        self.pending_regions = {}
+        self.last_transform = FrameTransform()
+        self.observed_transform = FrameTransform()  # capture behind the latest results
+
+        self.skipped_frames = 0
+
         # Debug directories
         self.debug_dir = "browser_captures"
         self.detection_dir = "detection_results"
         os.makedirs(self.debug_dir, exist_ok=True)
         os.makedirs(self.detection_dir, exist_ok=True)
 
-        # Set up YOLO worker in another thread
-        self.worker_thread = QThread()
-        self.yolo_worker = YoloWorker(class_thresholds=self.class_thresholds)
-        self.yolo_worker.moveToThread(self.worker_thread)
-        self.yolo_worker.result_ready.connect(self.handle_results)
-        self.worker_thread.start()
+        # Submit frames to the shared inference engine
+        self.engine = InferenceEngine.instance()
+        self.source_id = self.engine.register_source()
+        self.stats = self.engine.stats_for(self.source_id)
+        self.engine.result_ready.connect(self.on_engine_result)
 
-        # Set up monitoring timer
-        self.timer = QTimer()
-        self.timer.timeout.connect(self.adaptive_check_content)
-        self.timer.start(self.adaptive_interval)
+        # Grabs arrive as BGR in reused buffers, at model resolution; a tiled
+        # engine cuts its own model-sized tiles, so it gets the native grab
+        self.capture = FrameCapture(max_side=None if self.engine.tiled else 640)
+
+        # "viewport" analyses screen grabs; "images" classifies page images
+        # one by one through the verdict cache and needs the tab's JSBridge
+        self.pipeline = pipeline if bridge is not None else "viewport"
+        self.image_scanner = None
+        if self.pipeline == "images":
+            self.image_scanner = ImageScanner(self.browser, bridge, self.engine)
+            self.image_scanner.detections_ready.connect(self.on_image_detections)
+
+        # Optionally classify the page above and below the viewport ahead of scrolling
+        self.prefetch = None
+        if prefetch and self.pipeline == "viewport":
+            # Pulls in QtWebEngineWidgets, so only loaded when opted in
+            from prefetch import PrefetchScanner
+            self.prefetch = PrefetchScanner(self.browser, self.engine)
+            self.prefetch.detections_ready.connect(lambda: self.handle_results(self.last_detections))
+
+        # Captures are triggered by page events rather than a polling timer
+        self.settle_ms = 300  # Follow-up after a change, for paints that lag their event
+        self.last_media_probe = 0
+        self.heartbeat_ms = 1000  # Capture rate for playing video and other self-changing media
+        self.scheduler = CaptureScheduler(min_interval_ms=self.adaptive_interval,
+                                          heartbeat_ms=self.heartbeat_ms)
+        self.scheduler.capture.connect(self.adaptive_check_content)
+        page = self.browser.page()
+        page.scrollPositionChanged.connect(lambda _: self.scheduler.request())
+        page.contentsSizeChanged.connect(lambda _: self.scheduler.request())
+        self.browser.loadProgress.connect(lambda _: self.scheduler.request())
+        self.browser.loadStarted.connect(self.on_load_started)
+        self.browser.loadFinished.connect(self.on_load_finished)
+        if bridge is not None:
+            bridge.mutationsReported.connect(self.on_mutations)
+        self.scheduler.request()
 
         self.last_activity_time = time.time()
         self.activity_timeout = 2.0  # 2 second
 
     def start(self):
         self.active = True
-        self.timer.start()
+        self.scheduler.start()
     
+    def set_tier(self, tier, fps=None):
+        """Move the tab to a scan tier; ``fps`` caps the rate outside the foreground.
+
+        Tiers only pace tabs whose view is visible; hidden views are not
+        grabbed at all, and a tab coming to the front is rescanned at once.
+        """
+        self.tier = tier
+        self.foreground = tier == FOREGROUND
+        if self.foreground:
+            self.scheduler.min_interval_ms = self.adaptive_interval
+        elif fps:
+            self.scheduler.min_interval_ms = int(1000 / fps)
+        else:
+            self.scheduler.min_interval_ms = self.background_interval
+        # Self-changing media only needs watching where it can be seen soon
+        self.scheduler.heartbeat_ms = 0 if tier == HIDDEN else self.heartbeat_ms
+        if tier == HIDDEN:
+            self.scheduler.set_media_active(False)
+        else:
+            self.probe_media()
+
+        if not self.active:
+            self.start()
+        elif self.foreground:
+            # Show the verdict already held for this page, then refresh it
+            self.handle_results(self.last_detections)
+            self.scheduler.request()
+
+    def on_load_started(self):
+        """A new page: nothing held for the old one applies any more"""
+        self.engine.cancel(self.source_id)
+        self.pending_regions.clear()
+        self.last_detections = Detections()
+        self.change_detector.reset()
+
+    def on_load_finished(self, ok):
+        self.scheduler.request()
+        self.probe_media()
+
+    def on_mutations(self, summary):
+        """Coalesced DOM changes reported by the page"""
+        self.probe_media(min_interval=1.0)
+        if (self.image_scanner and summary.get('images') and not summary.get('truncated')
+                and not summary.get('removed')):
+            # Only the listed media is new; no need to rescan the page
+            self.image_scanner.classify_images(summary)
+            return
+        self.scheduler.request()
+
+    def probe_media(self, min_interval=0):
+        """Ask the page whether it needs the media heartbeat"""
+        now = time.time()
+        if now - self.last_media_probe < min_interval:
+            return
+        self.last_media_probe = now
+        self.browser.page().runJavaScript(
+            MEDIA_PROBE_JS, lambda active: self.scheduler.set_media_active(bool(active)))
+
     def stop_monitoring(self):
         self.active = False
-        self.timer.stop()
+        self.scheduler.stop()
         
         if self.processing_lock.tryLock():
             self.processing_lock.unlock()
         
-        if hasattr(self, 'worker_thread') and self.worker_thread.isRunning():
-            self.yolo_worker.cleanup()
-            self.worker_thread.quit()
-            self.worker_thread.wait(1000)
-            if self.worker_thread.isRunning():
-                self.worker_thread.terminate()
+        # Don't let stale frames of this tab hold up the shared engine
+        self.engine.cancel(self.source_id)
+        self.pending_regions.clear()
+        self.change_detector.reset()
+
+    def close(self):
+        """Stop monitoring and release this tab's slot in the engine"""
+        self.stop_monitoring()
+        self.engine.result_ready.disconnect(self.on_engine_result)
+        self.engine.unregister_source(self.source_id)
+        if self.image_scanner:
+            self.image_scanner.close()
+        if self.prefetch:
+            self.prefetch.close()
 
     def adaptive_check_content(self):
-        if not self.active or not self.browser.isVisible():
+        if not self.active:
+            return
+        # Chromium stops compositing hidden views, so a grab would only
+        # return stale pixels; the tab is scanned as soon as it is shown
+        if not self.browser.isVisible():
+            self.stats.count("hidden")
             return
 
+        # The scheduler keeps captures to the current rate
         now = time.time()
-        if now - self.last_process_time < self.adaptive_interval/1000:
+        if self.image_scanner:
+            self.last_process_time = now
+            if not self.image_scanner.request_scan():
+                self.scheduler.request(int(self.image_scanner.min_interval * 1000))
             return
-            
+
         if not self.processing_lock.tryLock():
+            self.scheduler.request()
             return
             
         try:
-            # Capture the visible portion
-            self.current_pixmap = self.browser.grab()
-            
             # Get viewport information
             viewport_size = self.browser.size()
-            scroll_pos = self.browser.page().scrollPosition()
-            
-            # Convert to numpy array
-            qimg = self.current_pixmap.toImage()
-            ptr = qimg.bits()
-            ptr.setsize(qimg.byteCount())
-            arr = np.frombuffer(ptr, np.uint8).reshape((qimg.height(), qimg.width(), 4))[:,:,:3]
-            
-            # Submit for detection
-            self.yolo_worker.detect_from_image(
-                cv2.cvtColor(arr, cv2.COLOR_RGB2BGR),
+            page = self.browser.page()
+            scroll_pos = page.scrollPosition()
+            sx, sy = scroll_pos.x(), scroll_pos.y()
+
+            # Capture the visible portion, already at model resolution
+            self.current_pixmap, frame, transform = self.capture.grab(
+                self.browser, sx, sy, page.zoomFactor())
+            self.last_transform = transform
+            for stage, ms in self.capture.last_timings.items():
+                self.stats.record(stage, ms)
+
+            change = self.change_detector.compare(frame, transform)
+
+            if change.kind == UNCHANGED:
+                # Nothing new on screen, the last verdict still holds
+                self.skipped_frames += 1
+                self.stats.count("skipped")
+                self.last_process_time = now
+                self.handle_results(self.last_detections)
+                if self.prefetch and self.foreground:
+                    self.prefetch.schedule()
+                return
+
+            region = None
+            offset_x = offset_y = 0
+            if change.kind == SCROLLED:
+                dirty = [transform.frame_to_page(change.exposed)]
+            elif change.changed is not None:
+                dirty = [transform.frame_to_page(box) for box in change.changed]
+            else:
+                dirty = None
+            # A strip still waiting could be superseded, so then resend everything
+            if change.kind == SCROLLED and not self.pending_regions:
+                # Only the newly exposed strip needs a model pass
+                x1, y1, x2, y2 = change.exposed
+                frame = frame[y1:y2, x1:x2]
+                offset_x, offset_y = x1, y1
+                region = transform.frame_to_page((x1, y1, x2, y2))
+
+            # Submit for detection; boxes come back in full-frame pixels
+            frame_id = self.engine.submit(
+                self.source_id,
+                frame,
                 viewport_size.width(),
                 viewport_size.height(),
-                scroll_pos.x(),
-                scroll_pos.y()
+                offset_x,
+                offset_y
             )
+            if frame_id is not None:
+                self.pending_regions[frame_id] = (region, transform, dirty, self.scheduler.burst_start)
+                self.change_detector.accept(sx, sy)
+            # Look again shortly; this stops by itself once the view settles.
+            # Hidden tabs get one look per event.
+            if self.tier != HIDDEN:
+                self.scheduler.request(self.settle_ms)
+            if self.prefetch and self.foreground:
+                self.prefetch.schedule()
             
             self.last_process_time = now
             
             # Dynamically adjust interval based on worker performance
-            if hasattr(self.yolo_worker, 'avg_process_time'):
+            if self.foreground and hasattr(self.engine, 'avg_process_time'):
                 target_fps = 10  # Our goal
-                current_fps = 1/max(0.001, self.yolo_worker.avg_process_time)
+                current_fps = 1/max(0.001, self.engine.avg_process_time)
                 
                 if current_fps < target_fps * 0.8:  # If we're falling behind
                     self.adaptive_interval = min(200, self.adaptive_interval + 10)
                 elif current_fps > target_fps * 1.2 and self.adaptive_interval > 50:  # If we can go faster
                     self.adaptive_interval = max(50, self.adaptive_interval - 10)
                     
-                self.timer.setInterval(self.adaptive_interval)
+                self.scheduler.min_interval_ms = self.adaptive_interval
                 
         except Exception as e:
-            print(f"Capture error: {str(e)}")
+            log.exception("Capture error: %s", e)
         finally:
             self.processing_lock.unlock()
 
-    def handle_results(self, detections):
-        """Process and emit detection results"""
+    def on_image_detections(self, detections):
+        """Page-space detections from the image pipeline"""
+        self.current_pixmap = self.image_scanner.pixmap
+        detections = Detections.from_dicts(detections)
+        self.last_detections = detections
+        self.observed_transform = self.last_transform
+        self.handle_results(detections, None)
+
+    def on_engine_result(self, source_id, frame_id, detections):
+        """Pick this tab's results out of the shared engine's stream"""
+        if source_id != self.source_id or frame_id not in self.pending_regions:
+            return
+        self.stats.mark_delivered(frame_id)
+        region, transform, dirty, exposed_at = self.pending_regions.pop(frame_id)
+        # Older frames were superseded and will never report back; what
+        # changed in them still counts, and has been on screen for longer
+        for stale_id in [f for f in self.pending_regions if f < frame_id]:
+            _, _, stale_dirty, stale_exposed = self.pending_regions.pop(stale_id)
+            dirty = None if dirty is None or stale_dirty is None else dirty + stale_dirty
+            if stale_exposed is not None:
+                exposed_at = stale_exposed if exposed_at is None else min(exposed_at, stale_exposed)
+
+        # Frame pixels -> page coordinates with the frame's own transform
+        detections = detections.frame_to_page(transform)
+
+        if region is not None:
+            # Strip result: replace cached detections centred inside the strip
+            kept = self.last_detections[~self.last_detections.centred_in(region)]
+            detections = Detections.concat([kept, detections])
+        self.last_detections = detections
+        self.observed_transform = transform
+        self.handle_results(detections, dirty, exposed_at)
+
+    def handle_results(self, detections, dirty=(), exposed_at=None):
+        """Process and emit detection results.
+
+        ``dirty`` lists the page rects whose content changed since the last
+        results (None: the whole area looked at); the overlay only drops
+        boxes there. Re-emitting a held verdict passes nothing.
+        ``exposed_at`` is when the analysed content reached the screen.
+        """
         if not self.active or not self.current_pixmap:
             return
 
-        scroll_pos = self.browser.page().scrollPosition()
+        page = self.browser.page()
+        scroll_pos = page.scrollPosition()
         viewport_size = self.browser.size()
+        # Maps page coordinates to the widget as it is scrolled right now
+        transform = self.last_transform.with_scroll(scroll_pos.x(), scroll_pos.y())
+        transform.zoom = page.zoomFactor()
+        view_w = viewport_size.width() / transform.zoom
+        view_h = viewport_size.height() / transform.zoom
+
+        # Page area the results were looked for in
+        observed = self.observed_transform
+        covered = (observed.scroll_x, observed.scroll_y,
+                   observed.scroll_x + view_w, observed.scroll_y + view_h)
+        if self.prefetch:
+            # Prefetched bands fill in wherever the on-screen scan hasn't looked
+            detections = Detections.concat([detections, self.prefetch.detections(exclude=covered)])
         
-        viewport_detections = []
-        if detections:  # Only process if we have detections
-            for det in detections:
-                try:
-                    x1 = det['xyxy'][0] - scroll_pos.x()
-                    y1 = det['xyxy'][1] - scroll_pos.y()
-                    x2 = det['xyxy'][2] - scroll_pos.x()
-                    y2 = det['xyxy'][3] - scroll_pos.y()
-                    
-                    if not (x2 < 0 or y2 < 0 or x1 > viewport_size.width() or y1 > viewport_size.height()):
-                        viewport_detections.append({
-                            'xyxy': [x1, y1, x2, y2],
-                            'class': det['class'],
-                            'conf': det['conf']
-                        })
-                except Exception as e:
-                    print(f"Detection processing error: {str(e)}")
-                    continue
+        # Keep page-space detections that touch the visible part of the page
+        visible = (scroll_pos.x(), scroll_pos.y(), scroll_pos.x() + view_w, scroll_pos.y() + view_h)
+        viewport_detections = detections[detections.touching(visible)]
         
-        # Package detection data
+        # Changed areas, limited to what the visible detections can speak for
+        regions = []
+        for x1, y1, x2, y2 in ([covered] if dirty is None else dirty):
+            x1, y1 = max(x1, scroll_pos.x()), max(y1, scroll_pos.y())
+            x2, y2 = min(x2, scroll_pos.x() + view_w), min(y2, scroll_pos.y() + view_h)
+            if x2 > x1 and y2 > y1:
+                regions.append((x1, y1, x2, y2))
+        # Package detection data; boxes stay in page coordinates and the
+        # overlay maps them with the transform
         detection_data = {
             'detections': viewport_detections,
+            'transform': transform,
+            'regions': regions,
+            'exposed_at': exposed_at,
             'scroll_x': scroll_pos.x(),
             'scroll_y': scroll_pos.y(),
             'viewport_width': viewport_size.width(),
             'viewport_height': viewport_size.height()
         }
         
-        print(f"[Detection] Found {len(detections)} raw, {len(viewport_detections)} visible")
+        log.debug("Found %d raw, %d visible", len(detections), len(viewport_detections))
         self.detection_signal.emit(detection_data, self.current_pixmap)
 
     def update_threshold(self, class_name, threshold):
         """Thread-safe threshold update"""
         with QMutexLocker(self.processing_lock):
             self.class_thresholds[class_name] = threshold
-            QMetaObject.invokeMethod(
-                self.yolo_worker,
-                "update_threshold",
-                Qt.QueuedConnection,
-                Q_ARG(str, class_name),
-                Q_ARG(float, threshold)
-            )
\ No newline at end of file
+            self.engine.update_threshold(class_name, threshold)
\ No newline at end of file
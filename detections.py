@@ -0,0 +1,135 @@
+# detections.py
+import numpy as np
+
+
+def threshold_vector(names, thresholds, default=0.25):
+    """Per-class confidence thresholds as an array indexed by class id"""
+    size = max(names) + 1 if names else 0
+    vector = np.full(size, default, np.float32)
+    for class_id, name in names.items():
+        vector[class_id] = thresholds.get(name, default)
+    return vector
+
+
+class Detections:
+    """Columnar detections: one row per box.
+
+    ``xyxy`` is an (N, 4) float32 array, ``class_ids`` and ``confs`` are
+    (N,) arrays and ``names`` maps class ids to class names (the model's
+    own mapping, shared rather than copied). Thresholding, offsetting,
+    clipping and visibility filtering are array operations. Iterating
+    still yields the ``{'xyxy', 'class', 'conf'}`` dicts used elsewhere,
+    so code that only reads detections needs no change.
+    """
+    __slots__ = ('xyxy', 'class_ids', 'confs', 'names')
+
+    def __init__(self, xyxy=None, class_ids=None, confs=None, names=None):
+        self.xyxy = np.zeros((0, 4), np.float32) if xyxy is None else np.asarray(xyxy, np.float32).reshape(-1, 4)
+        self.class_ids = np.zeros(0, np.int32) if class_ids is None else np.asarray(class_ids, np.int32)
+        self.confs = np.zeros(0, np.float32) if confs is None else np.asarray(confs, np.float32)
+        self.names = {} if names is None else names
+
+    @classmethod
+    def from_dicts(cls, detections, names=None):
+        """Build from a list of detection dicts, adding unknown class names"""
+        if isinstance(detections, Detections):
+            return detections
+        names = dict(names or {})
+        ids = {name: class_id for class_id, name in names.items()}
+        class_ids = []
+        for det in detections:
+            name = det['class']
+            if name not in ids:
+                ids[name] = max(names, default=-1) + 1
+                names[ids[name]] = name
+            class_ids.append(ids[name])
+        return cls([det['xyxy'] for det in detections], class_ids,
+                   [det['conf'] for det in detections], names)
+
+    @classmethod
+    def concat(cls, items):
+        """Join several Detections (or dict lists) into one"""
+        items = [cls.from_dicts(item) for item in items]
+        items = [item for item in items if len(item)] or items[:1]
+        if not items:
+            return cls()
+        names = items[0].names
+        if any(item.names != names for item in items[1:]):
+            # Different class id spaces; go through the names
+            return cls.from_dicts([det for item in items for det in item], names)
+        return cls(np.concatenate([item.xyxy for item in items]),
+                   np.concatenate([item.class_ids for item in items]),
+                   np.concatenate([item.confs for item in items]), names)
+
+    def __len__(self):
+        return len(self.confs)
+
+    def __iter__(self):
+        return iter(self.to_dicts())
+
+    def __getitem__(self, key):
+        if isinstance(key, (int, np.integer)):
+            return self.to_dicts()[key]
+        return Detections(self.xyxy[key], self.class_ids[key], self.confs[key], self.names)
+
+    def __repr__(self):
+        return f"Detections({len(self)} boxes)"
+
+    @property
+    def classes(self):
+        """Class names, one per box"""
+        return [self.names.get(int(c), str(int(c))) for c in self.class_ids]
+
+    def to_dicts(self):
+        return [
+            {'xyxy': box, 'class': name, 'conf': conf}
+            for box, name, conf in zip(self.xyxy.tolist(), self.classes, self.confs.tolist())
+        ]
+
+    def tuples(self):
+        """(xyxy, conf, class name) per box, as the backends used to return"""
+        return list(zip(self.xyxy.tolist(), self.confs.tolist(), self.classes))
+
+    def above(self, thresholds):
+        """Boxes whose confidence beats their class threshold (see threshold_vector)"""
+        limits = np.full(len(self), 0.25, np.float32)
+        known = self.class_ids < len(thresholds)
+        limits[known] = thresholds[self.class_ids[known]]
+        return self[self.confs > limits]
+
+    def shifted(self, dx, dy):
+        """Boxes moved by (dx, dy)"""
+        return self.affine(1.0, dx, dy)
+
+    def affine(self, scale, dx, dy):
+        """Boxes mapped by x * scale + dx, y * scale + dy"""
+        xyxy = self.xyxy * scale if scale != 1.0 else self.xyxy.copy()
+        xyxy += np.array([dx, dy, dx, dy], np.float32)
+        return Detections(xyxy, self.class_ids, self.confs, self.names)
+
+    def frame_to_page(self, transform):
+        """All boxes through FrameTransform.frame_to_page at once"""
+        k = transform.scroll_scale
+        return self.affine(1.0 / k, transform.scroll_x - transform.pad_x / k,
+                           transform.scroll_y - transform.pad_y / k)
+
+    def clipped(self, x1, y1, x2, y2):
+        """Boxes clipped to a rect; those left empty are dropped"""
+        xyxy = self.xyxy.copy()
+        np.clip(xyxy[:, 0::2], x1, x2, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], y1, y2, out=xyxy[:, 1::2])
+        keep = (xyxy[:, 2] > xyxy[:, 0]) & (xyxy[:, 3] > xyxy[:, 1])
+        return Detections(xyxy[keep], self.class_ids[keep], self.confs[keep], self.names)
+
+    def touching(self, rect):
+        """Mask of boxes that touch the rect (x1, y1, x2, y2)"""
+        x1, y1, x2, y2 = rect
+        b = self.xyxy
+        return ~((b[:, 2] < x1) | (b[:, 3] < y1) | (b[:, 0] > x2) | (b[:, 1] > y2))
+
+    def centred_in(self, rect):
+        """Mask of boxes whose centre lies inside the rect (x1, y1, x2, y2)"""
+        x1, y1, x2, y2 = rect
+        cx = (self.xyxy[:, 0] + self.xyxy[:, 2]) / 2
+        cy = (self.xyxy[:, 1] + self.xyxy[:, 3]) / 2
+        return (cx >= x1) & (cx <= x2) & (cy >= y1) & (cy <= y2)
@@ -0,0 +1,408 @@
+# detector_backends.py
+import abc
+import ast
+import os
+import re
+import time
+
+import cv2
+import numpy as np
+
+from detections import Detections
+
+from logs import get_logger
+
+log = get_logger("backend")
+
+# Same grey the Ultralytics letterbox pads with
+PAD_VALUE = 114
+
+BACKENDS = ("torch", "onnx", "onnx-int8", "openvino")
+
+# INT8 calibration images, real page screenshots; bench_quantization.py
+# evaluates on a separate set so the model isn't scored on what tuned it
+CALIBRATION_DIR = os.path.join("datasets", "calibration")
+EVALUATION_DIR = os.path.join("datasets", "evaluation")
+IMAGE_EXTENSIONS = (".jpg", ".jpeg", ".png", ".bmp", ".webp")
+
+
+def export_model(model_path, fmt, imgsz=640):
+    """Convert a .pt checkpoint to ``fmt`` once and return the artifact path.
+
+    The export lands next to the checkpoint and is reused for as long as it
+    is newer than the checkpoint, so torch is only needed the first time.
+    """
+    stem = os.path.splitext(model_path)[0]
+    if fmt == "onnx":
+        artifact = stem + ".onnx"
+    elif fmt == "openvino":
+        artifact = os.path.join(stem + "_openvino_model", os.path.basename(stem) + ".xml")
+    else:
+        raise ValueError(f"Unknown export format: {fmt}")
+
+    if os.path.exists(artifact) and (
+            not os.path.exists(model_path) or
+            os.path.getmtime(artifact) >= os.path.getmtime(model_path)):
+        return artifact
+
+    log.info("Exporting %s to %s...", model_path, fmt)
+    from ultralytics import YOLO
+    # Dynamic axes let the engine's micro-batches through in one call
+    YOLO(model_path).export(format=fmt, imgsz=imgsz, dynamic=True)
+    if not os.path.exists(artifact):
+        raise RuntimeError(f"Export to {fmt} did not produce {artifact}")
+    return artifact
+
+
+def list_images(directory, limit=None):
+    """Sorted image files in a directory, at most ``limit`` of them"""
+    if not os.path.isdir(directory):
+        return []
+    paths = sorted(os.path.join(directory, name) for name in os.listdir(directory)
+                   if name.lower().endswith(IMAGE_EXTENSIONS))
+    return paths[:limit] if limit else paths
+
+
+def quantize_model(model_path, calibration_dir=CALIBRATION_DIR, max_images=200, imgsz=640):
+    """Statically quantize the ONNX export to INT8 and return its path.
+
+    Activation ranges are calibrated on the images in ``calibration_dir``,
+    preprocessed exactly as at inference time. Weights are quantized per
+    channel; the detection head stays in float because box regression is
+    the part most sensitive to INT8 rounding. Like exports, the result is
+    cached and rebuilt only when the FP32 graph is newer.
+    """
+    fp32_path = export_model(model_path, "onnx", imgsz)
+    artifact = os.path.splitext(fp32_path)[0] + ".int8.onnx"
+    if os.path.exists(artifact) and os.path.getmtime(artifact) >= os.path.getmtime(fp32_path):
+        return artifact
+
+    paths = list_images(calibration_dir, max_images)
+    if not paths:
+        raise FileNotFoundError(
+            f"No calibration images in {os.path.abspath(calibration_dir)}; "
+            f"add page screenshots there or pick the onnx backend")
+
+    import onnx
+    from onnxruntime.quantization import (CalibrationDataReader, CalibrationMethod,
+                                          QuantFormat, QuantType, quantize_static)
+
+    # Calibrate on inputs exactly as the exported backends feed them
+    letterbox = Letterbox()
+    graph = onnx.load(fp32_path, load_external_data=False).graph
+    input_name = graph.input[0].name
+
+    class CaptureReader(CalibrationDataReader):
+        def __init__(self):
+            self.paths = iter(paths)
+
+        def get_next(self):
+            for path in self.paths:
+                img = cv2.imread(path)
+                if img is not None:
+                    return {input_name: letterbox([img], imgsz)[0].copy()}
+            return None
+
+    # The last numbered module of a YOLOv8 graph is the Detect head
+    layers = [int(m.group(1)) for node in graph.node
+              for m in [re.match(r"/model\.(\d+)/", node.name)] if m]
+    head = f"/model.{max(layers)}/" if layers else None
+    exclude = [node.name for node in graph.node if head and node.name.startswith(head)]
+
+    log.info("Quantizing %s on %d calibration images...", fp32_path, len(paths))
+    quantize_static(
+        fp32_path, artifact, CaptureReader(),
+        quant_format=QuantFormat.QDQ,
+        per_channel=True,
+        activation_type=QuantType.QUInt8,
+        weight_type=QuantType.QInt8,
+        calibrate_method=CalibrationMethod.MinMax,
+        nodes_to_exclude=exclude,
+    )
+    return artifact
+
+
+def create_backend(name, model_path="best.pt", num_threads=None, inter_threads=None,
+                   calibration_dir=CALIBRATION_DIR):
+    """Instantiate the named detector backend.
+
+    Falls back to the torch backend when the requested runtime isn't
+    installed, so a missing optional dependency never disables detection.
+    The INT8 variant falls back to the FP32 graph only when the quantizer
+    isn't installed; a missing calibration set raises, since quantizing on
+    nothing would quietly hand back a different model than was asked for.
+    """
+    if name == "onnx-int8":
+        try:
+            backend = OnnxBackend(quantize_model(model_path, calibration_dir), num_threads, inter_threads)
+            backend.name = name
+            return backend
+        except ImportError as e:
+            log.warning("INT8 quantizer unavailable (%s), using FP32 ONNX", e)
+            name = "onnx"
+    if name == "onnx":
+        try:
+            return OnnxBackend(export_model(model_path, "onnx"), num_threads, inter_threads)
+        except ImportError as e:
+            log.warning("ONNX Runtime unavailable (%s), using torch", e)
+    elif name == "openvino":
+        try:
+            return OpenVinoBackend(export_model(model_path, "openvino"), num_threads, inter_threads)
+        except ImportError as e:
+            log.warning("OpenVINO unavailable (%s), using torch", e)
+    elif name != "torch":
+        raise ValueError(f"Unknown detector backend: {name}")
+    return TorchBackend(model_path, num_threads)
+
+
+class TorchBackend:
+    """The original Ultralytics/PyTorch path"""
+    name = "torch"
+
+    def __init__(self, model_path, num_threads=None):
+        import torch
+        from ultralytics import YOLO
+
+        self.torch = torch
+        if num_threads:
+            # Intra-op threads are process-wide in torch
+            torch.set_num_threads(num_threads)
+        self.cuda = torch.cuda.is_available()
+        self.model = YOLO(model_path)
+        self.model.fuse()
+        self.model.eval()
+        if self.cuda:
+            self.model.half()
+        self.names = self.model.names
+        self.last_timings = {}  # stage -> ms of the last detect() call
+
+    def predict(self, images, conf=0.4, max_det=8, imgsz=640):
+        """Returns, per image, a list of (xyxy, conf, class name)"""
+        return [dets.tuples() for dets in self.detect(images, conf, max_det, imgsz)]
+
+    def detect(self, images, conf=0.4, max_det=8, imgsz=640):
+        """Returns one Detections per image"""
+        results = self.model.predict(
+            images,
+            imgsz=imgsz,
+            conf=conf,
+            device='0' if self.cuda else 'cpu',
+            half=self.cuda,
+            max_det=max_det,
+            verbose=False,
+            augment=False
+        )
+        # Whole tensors at once rather than box by box
+        detections = [
+            Detections(result.boxes.xyxy.cpu().numpy(), result.boxes.cls.cpu().numpy(),
+                       result.boxes.conf.cpu().numpy(), self.names)
+            for result in results
+        ]
+        # Ultralytics reports per-image averages; the batch took n times that
+        if results:
+            self.last_timings = {stage: ms * len(results) for stage, ms in results[0].speed.items()}
+        return detections
+
+    def close(self):
+        if hasattr(self.model, 'close'):
+            self.model.close()
+        if self.cuda:
+            self.torch.cuda.empty_cache()
+
+
+class Letterbox:
+    """Ultralytics' letterbox into a reused NCHW float batch.
+
+    Centred letterbox to ``imgsz``, padded with PAD_VALUE, BGR to RGB and
+    scaled to [0, 1]. The canvas and the batch are allocated once and grow
+    only when a larger batch arrives, so the steady state allocates nothing
+    per frame.
+    """
+
+    def __init__(self):
+        self._canvas = None  # uint8 imgsz x imgsz x 3
+        self._batch = None  # float32 capacity x 3 x imgsz x imgsz
+
+    def _fit(self, img, imgsz):
+        h, w = img.shape[:2]
+        r = min(imgsz / h, imgsz / w)
+        new_w, new_h = int(round(w * r)), int(round(h * r))
+        if (new_w, new_h) != (w, h):
+            img = cv2.resize(img, (new_w, new_h), interpolation=cv2.INTER_LINEAR)
+        if (new_w, new_h) == (imgsz, imgsz):
+            return img, r, 0, 0
+        dw, dh = (imgsz - new_w) / 2, (imgsz - new_h) / 2
+        left, top = int(round(dw - 0.1)), int(round(dh - 0.1))
+        if self._canvas is None or self._canvas.shape[0] != imgsz:
+            self._canvas = np.empty((imgsz, imgsz, 3), np.uint8)
+        canvas = self._canvas
+        canvas.fill(PAD_VALUE)
+        canvas[top:top + new_h, left:left + new_w] = img
+        return canvas, r, left, top
+
+    def __call__(self, images, imgsz=640):
+        """Letterbox BGR images into an NCHW float batch; returns (batch, geometry).
+
+        The batch is a view of the reused input buffer, only valid until
+        the next call.
+        """
+        n = len(images)
+        if (self._batch is None or self._batch.shape[0] < n or
+                self._batch.shape[2] != imgsz):
+            self._batch = np.empty((n, 3, imgsz, imgsz), np.float32)
+        batch = self._batch[:n]
+        geometry = []
+        for i, img in enumerate(images):
+            canvas, r, left, top = self._fit(img, imgsz)
+            # BGR HWC uint8 -> RGB CHW float
+            np.copyto(batch[i], canvas[:, :, ::-1].transpose(2, 0, 1))
+            geometry.append((r, left, top, img.shape[1], img.shape[0]))
+        np.multiply(batch, 1 / 255.0, out=batch)
+        return batch, geometry
+
+
+class ExportedBackend(abc.ABC):
+    """Shared letterbox/NMS for runtimes fed an exported YOLOv8 graph.
+
+    Mirrors Ultralytics' own pre- and post-processing so detections match
+    the torch backend: centred letterbox to ``imgsz``, RGB float input,
+    per-class NMS at IoU 0.7 and boxes scaled back to the input image.
+    """
+    name = None
+    iou_threshold = 0.7
+
+    def __init__(self):
+        self.names = {}
+        self.fixed_batch = False
+        self.last_timings = {}  # stage -> ms of the last detect() call
+        self._letterbox = Letterbox()
+
+    @abc.abstractmethod
+    def _run(self, batch):
+        """Run the graph on an NCHW float32 batch; returns (N, 4 + classes, anchors)"""
+
+    def preprocess(self, images, imgsz=640):
+        """Letterbox BGR images into an NCHW float batch; see Letterbox"""
+        return self._letterbox(images, imgsz)
+
+    def predict(self, images, conf=0.4, max_det=8, imgsz=640):
+        """Returns, per image, a list of (xyxy, conf, class name)"""
+        return [dets.tuples() for dets in self.detect(images, conf, max_det, imgsz)]
+
+    def detect(self, images, conf=0.4, max_det=8, imgsz=640):
+        """Returns one Detections per image"""
+        start = time.perf_counter()
+        batch, geometry = self.preprocess(images, imgsz)
+        preprocessed = time.perf_counter()
+
+        if self.fixed_batch:
+            outputs = np.concatenate([self._run(batch[i:i + 1]) for i in range(len(images))])
+        else:
+            outputs = self._run(batch)
+        inferred = time.perf_counter()
+        detections = [self._postprocess(out, conf, max_det, *geo)
+                      for out, geo in zip(outputs, geometry)]
+        self.last_timings = {
+            'preprocess': 1000 * (preprocessed - start),
+            'inference': 1000 * (inferred - preprocessed),
+            'postprocess': 1000 * (time.perf_counter() - inferred),
+        }
+        return detections
+
+    def _postprocess(self, pred, conf, max_det, r, left, top, w, h):
+        pred = pred.T  # anchors x (cx, cy, w, h, class scores...)
+        scores = pred[:, 4:]
+        class_ids = scores.argmax(1)
+        confs = scores[np.arange(len(scores)), class_ids]
+        keep = confs > conf
+        if not keep.any():
+            return Detections(names=self.names)
+        pred, class_ids, confs = pred[keep], class_ids[keep], confs[keep]
+
+        xywh = pred[:, :4].copy()
+        xywh[:, :2] -= xywh[:, 2:] / 2  # centre -> top-left for NMSBoxes
+        indices = cv2.dnn.NMSBoxesBatched(
+            xywh.tolist(), confs.tolist(), class_ids.tolist(), conf, self.iou_threshold)
+        indices = np.array(indices, np.int64).flatten()
+        indices = indices[np.argsort(-confs[indices], kind='stable')][:max_det]
+
+        # Undo the letterbox for all kept boxes at once
+        xyxy = np.empty((len(indices), 4), np.float32)
+        xyxy[:, :2] = xywh[indices, :2]
+        xyxy[:, 2:] = xywh[indices, :2] + xywh[indices, 2:]
+        xyxy -= np.array([left, top, left, top], np.float32)
+        xyxy /= r
+        np.clip(xyxy[:, 0::2], 0, w, out=xyxy[:, 0::2])
+        np.clip(xyxy[:, 1::2], 0, h, out=xyxy[:, 1::2])
+        return Detections(xyxy, class_ids[indices], confs[indices], self.names)
+
+    def close(self):
+        pass
+
+
+class OnnxBackend(ExportedBackend):
+    """YOLOv8 ONNX graph on ONNX Runtime's CPU provider"""
+    name = "onnx"
+
+    def __init__(self, model_path, num_threads=None, inter_threads=None):
+        super().__init__()
+        import onnxruntime as ort
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        if inter_threads:
+            options.inter_op_num_threads = inter_threads
+            if inter_threads > 1:
+                options.execution_mode = ort.ExecutionMode.ORT_PARALLEL
+        self.session = ort.InferenceSession(
+            model_path, options, providers=["CPUExecutionProvider"])
+        model_input = self.session.get_inputs()[0]
+        self.input_name = model_input.name
+        self.fixed_batch = model_input.shape[0] == 1
+
+        # Ultralytics stores the class names in the model metadata
+        metadata = self.session.get_modelmeta().custom_metadata_map
+        if 'names' in metadata:
+            self.names = ast.literal_eval(metadata['names'])
+
+    def _run(self, batch):
+        return self.session.run(None, {self.input_name: batch})[0]
+
+    def close(self):
+        self.session = None
+
+
+class OpenVinoBackend(ExportedBackend):
+    """YOLOv8 OpenVINO IR on the OpenVINO CPU plugin"""
+    name = "openvino"
+
+    def __init__(self, model_path, num_threads=None, inter_threads=None):
+        super().__init__()
+        from openvino.runtime import Core
+
+        core = Core()
+        model = core.read_model(model_path)
+        config = {"PERFORMANCE_HINT": "LATENCY"}
+        if num_threads:
+            config["INFERENCE_NUM_THREADS"] = str(num_threads)
+        if inter_threads:
+            config["NUM_STREAMS"] = str(inter_threads)
+        self.compiled = core.compile_model(model, "CPU", config)
+        self.output = self.compiled.output(0)
+        batch_dim = model.input(0).get_partial_shape()[0]
+        self.fixed_batch = batch_dim.is_static and batch_dim.get_length() == 1
+
+        # Ultralytics writes the class names alongside the IR
+        metadata_path = os.path.join(os.path.dirname(model_path), "metadata.yaml")
+        if os.path.exists(metadata_path):
+            import yaml
+            with open(metadata_path, encoding="utf-8") as f:
+                self.names = (yaml.safe_load(f) or {}).get('names', {})
+
+    def _run(self, batch):
+        return self.compiled(batch)[self.output]
+
+    def close(self):
+        self.compiled = None
@@ -0,0 +1,142 @@
+# frame_diff.py
+import cv2
+import numpy as np
+
+# Kinds of change reported by FrameChangeDetector
+UNCHANGED = "unchanged"
+SCROLLED = "scrolled"
+CHANGED = "changed"
+
+
+def _shifted(box, dx, dy):
+    x1, y1, x2, y2 = box
+    return (x1 + dx, y1 + dy, x2 + dx, y2 + dy)
+
+
+class FrameChange:
+    """Outcome of comparing a frame with the last submitted one"""
+
+    def __init__(self, kind, exposed=None, changed=None):
+        self.kind = kind
+        # (x1, y1, x2, y2) in frame pixels that still need analysis after a pure scroll
+        self.exposed = exposed
+        # Frame-pixel boxes of the tiles that differ; None when everything may have
+        self.changed = changed
+
+    def __repr__(self):
+        return f"FrameChange({self.kind}, exposed={self.exposed}, changed={self.changed})"
+
+
+class FrameChangeDetector:
+    """Cheap change detector that sits in front of the inference engine.
+
+    Frames are reduced to small grayscale thumbnails and compared tile by
+    tile against the thumbnail of the last submitted frame. When the page
+    scrolled, the previous thumbnail is shifted by the scroll delta first,
+    so a pure scroll only reports the newly exposed strip.
+    """
+
+    def __init__(self, thumb_width=160, grid=(6, 8), tile_threshold=6.0, strip_margin=0.2):
+        self.thumb_width = thumb_width
+        self.grid = grid  # rows, cols
+        self.tile_threshold = tile_threshold  # mean abs difference per tile (0-255)
+        self.strip_margin = strip_margin  # context added around an exposed strip, as a fraction of frame size
+
+        self.previous = None
+        self.previous_scroll = (0, 0)
+        self._last_thumb = None
+
+    def reset(self):
+        """Forget the reference frame so the next one is analysed in full"""
+        self.previous = None
+
+    def _thumbnail(self, frame):
+        h, w = frame.shape[:2]
+        thumb_h = max(1, round(h * self.thumb_width / w))
+        small = cv2.resize(frame, (self.thumb_width, thumb_h), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _changed_tiles(self, current, previous):
+        """(x1, y1, x2, y2) thumbnail boxes of the grid tiles that differ by more than the threshold"""
+        diff = cv2.absdiff(current, previous)
+        h, w = diff.shape
+        rows = np.linspace(0, h, min(self.grid[0], h) + 1, dtype=int)
+        cols = np.linspace(0, w, min(self.grid[1], w) + 1, dtype=int)
+        changed = []
+        for y1, y2 in zip(rows[:-1], rows[1:]):
+            for x1, x2 in zip(cols[:-1], cols[1:]):
+                if diff[y1:y2, x1:x2].mean() > self.tile_threshold:
+                    changed.append((x1, y1, x2, y2))
+        return changed
+
+    def compare(self, frame, transform):
+        """Compare a BGR frame against the reference and return a FrameChange.
+
+        ``transform`` is the frame's FrameTransform. Only the content inside
+        its letterbox padding is compared, since the padding stays put while
+        the page scrolls underneath. Boxes are returned in frame pixels.
+        """
+        h, w = frame.shape[:2]
+        pad_x, pad_y = transform.pad_x, transform.pad_y
+        content = frame[pad_y:h - pad_y, pad_x:w - pad_x]
+        change = self._compare_content(content, transform.scroll_scale,
+                                       transform.scroll_x, transform.scroll_y)
+        if change.exposed is not None:
+            change.exposed = _shifted(change.exposed, pad_x, pad_y)
+        if change.changed is not None:
+            change.changed = [_shifted(box, pad_x, pad_y) for box in change.changed]
+        return change
+
+    def _compare_content(self, frame, scroll_scale, scroll_x, scroll_y):
+        current = self._last_thumb = self._thumbnail(frame)
+        previous = self.previous
+        if previous is None or previous.shape != current.shape:
+            return FrameChange(CHANGED)
+
+        th, tw = current.shape
+        thumb_scale = tw / frame.shape[1] * scroll_scale
+        dx = round((scroll_x - self.previous_scroll[0]) * thumb_scale)
+        dy = round((scroll_y - self.previous_scroll[1]) * thumb_scale)
+        # Diagonal scrolls expose an L-shape; just analyse everything
+        if abs(dx) >= tw or abs(dy) >= th or (dx and dy):
+            return FrameChange(CHANGED)
+
+        # Content at current[y] was at previous[y + dy] before the scroll
+        cur = current[max(0, -dy):th - max(0, dy), max(0, -dx):tw - max(0, dx)]
+        prev = previous[max(0, dy):th - max(0, -dy), max(0, dx):tw - max(0, -dx)]
+        tiles = self._changed_tiles(cur, prev)
+        if tiles:
+            # Back to frame pixels of the current frame
+            to_frame = frame.shape[1] / tw
+            ox, oy = max(0, -dx), max(0, -dy)
+            changed = [(int((x1 + ox) * to_frame), int((y1 + oy) * to_frame),
+                        int((x2 + ox) * to_frame), int((y2 + oy) * to_frame))
+                       for x1, y1, x2, y2 in tiles]
+            if dx or dy:
+                # The newly exposed edge is new content as well
+                changed.append(self._exposed_region(frame.shape, dx, dy, tw))
+            return FrameChange(CHANGED, changed=changed)
+        if dx == 0 and dy == 0:
+            return FrameChange(UNCHANGED)
+
+        return FrameChange(SCROLLED, self._exposed_region(frame.shape, dx, dy, tw))
+
+    def _exposed_region(self, frame_shape, dx, dy, thumb_width):
+        """Frame-pixel box covering the newly exposed edge plus some context"""
+        h, w = frame_shape[:2]
+        to_frame = w / thumb_width
+        x1, y1, x2, y2 = 0, 0, w, h
+        if dy > 0:
+            y1 = h - dy * to_frame - self.strip_margin * h
+        elif dy < 0:
+            y2 = -dy * to_frame + self.strip_margin * h
+        elif dx > 0:
+            x1 = w - dx * to_frame - self.strip_margin * w
+        else:
+            x2 = -dx * to_frame + self.strip_margin * w
+        return (int(max(0, x1)), int(max(0, y1)), int(min(w, x2)), int(min(h, y2)))
+
+    def accept(self, scroll_x, scroll_y):
+        """Make the frame last passed to compare() the reference"""
+        self.previous = self._last_thumb
+        self.previous_scroll = (scroll_x, scroll_y)
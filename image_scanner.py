@@ -0,0 +1,204 @@
+# image_scanner.py
+import time
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from capture import FrameCapture
+from verdict_cache import VerdictCache, content_hash
+
+# Enumerates visible <img>, <video poster> and CSS background images and
+# posts their viewport rects back through the JSBridge.
+SCAN_IMAGES_JS = """
+(function() {
+    if (!window.pyObj || !window.pyObj.reportImages) return;
+    const minSize = 48;
+    const maxElements = 3000;
+    const vw = window.innerWidth, vh = window.innerHeight;
+    const images = [];
+
+    function add(el, src, kind) {
+        const r = el.getBoundingClientRect();
+        if (r.width < minSize || r.height < minSize) return;
+        if (r.bottom <= 0 || r.right <= 0 || r.top >= vh || r.left >= vw) return;
+        images.push({src: src, kind: kind, x: r.left, y: r.top, w: r.width, h: r.height});
+    }
+
+    for (const img of document.images) {
+        if (img.complete && img.naturalWidth) add(img, img.currentSrc || img.src, 'img');
+    }
+    for (const video of document.querySelectorAll('video[poster]')) {
+        add(video, video.poster, 'poster');
+    }
+    const elements = document.querySelectorAll('body *');
+    for (let i = 0; i < elements.length && i < maxElements; i++) {
+        const bg = getComputedStyle(elements[i]).backgroundImage;
+        if (bg && bg.startsWith('url(')) {
+            add(elements[i], bg.slice(4, -1).replace(/["']/g, ''), 'background');
+        }
+    }
+
+    window.pyObj.reportImages(JSON.stringify({
+        scrollX: window.scrollX,
+        scrollY: window.scrollY,
+        images: images
+    }));
+})();
+"""
+
+
+class ImageScanner(QObject):
+    """Image-granular detection for one tab.
+
+    Page images are enumerated in JS, cropped out of a viewport grab and
+    hashed. Verdicts come from the shared VerdictCache whenever the same
+    pixels were seen before; only cache misses are sent to the engine.
+    Detections are kept in page coordinates.
+    """
+    detections_ready = pyqtSignal(list)
+
+    def __init__(self, browser, bridge, engine, cache=None, min_interval=0.5):
+        super().__init__()
+        self.browser = browser
+        self.engine = engine
+        self.cache = cache or VerdictCache.instance()
+        self.min_interval = min_interval
+
+        # Image crops queue up rather than replacing each other
+        self.source_id = engine.register_source(depth=32)
+        self.pending = {}  # frame id -> (content hash, cacheable, element rect, crop rect, crop size, submit time)
+        self.image_detections = {}  # page rect -> (content hash, page-space detections)
+        self.pixmap = None
+        # Native resolution: crops must keep enough detail to hash and classify
+        self.capture = FrameCapture(max_side=None, stride=None, ring_size=1)
+        self.last_scan_time = 0
+        self.scan_in_flight = False
+
+        bridge.imagesReported.connect(self.on_images_reported)
+        engine.result_ready.connect(self.on_engine_result)
+        browser.loadStarted.connect(self.reset)
+
+    def reset(self):
+        """Forget the current page's images, e.g. on navigation"""
+        self.engine.cancel(self.source_id)
+        self.pending.clear()
+        self.image_detections.clear()
+        self.scan_in_flight = False
+
+    def close(self):
+        self.reset()
+        self.engine.result_ready.disconnect(self.on_engine_result)
+        self.engine.unregister_source(self.source_id)
+
+    def request_scan(self):
+        """Ask the page for its visible images; results arrive asynchronously.
+
+        Returns False if the scan was refused because one ran too recently.
+        """
+        now = time.time()
+        if self.scan_in_flight and now - self.last_scan_time < 2.0:
+            return False
+        if now - self.last_scan_time < self.min_interval:
+            return False
+        self.last_scan_time = now
+        self.scan_in_flight = True
+        self.browser.page().runJavaScript(SCAN_IMAGES_JS)
+        return True
+
+    def on_images_reported(self, report):
+        self.scan_in_flight = False
+        self.classify_images(report)
+
+    def classify_images(self, report):
+        """Crop, hash and classify the images listed in a page report.
+
+        Takes full scans as well as the media summaries of DOM_WATCH_JS,
+        which list only images that were just added or changed.
+        """
+        scroll_pos = self.browser.page().scrollPosition()
+        scroll_x, scroll_y = report.get('scrollX', 0), report.get('scrollY', 0)
+        if abs(scroll_pos.x() - scroll_x) > 1 or abs(scroll_pos.y() - scroll_y) > 1:
+            return  # Page moved since the report; the next scan will catch up
+
+        # Requests pushed out of a full engine queue never report back
+        now = time.time()
+        for frame_id in [f for f, p in self.pending.items() if now - p[5] > 5.0]:
+            del self.pending[frame_id]
+        in_flight = {(p[0], p[2]) for p in self.pending.values()}
+
+        page = self.browser.page()
+        self.pixmap, frame, transform = self.capture.grab(
+            self.browser, scroll_x, scroll_y, page.zoomFactor())
+        frame_h, frame_w = frame.shape[:2]
+
+        for image in report.get('images', []):
+            page_rect = (
+                image['x'] + scroll_x,
+                image['y'] + scroll_y,
+                image['x'] + scroll_x + image['w'],
+                image['y'] + scroll_y + image['h']
+            )
+            fx1, fy1, fx2, fy2 = transform.page_to_frame(page_rect)
+            x1, y1 = int(max(0, fx1)), int(max(0, fy1))
+            x2, y2 = int(min(frame_w, fx2)), int(min(frame_h, fy2))
+            if x2 - x1 < 8 or y2 - y1 < 8:
+                continue
+            # The grab buffer is reused by the next scan; queued crops must own their pixels
+            crop = frame[y1:y2, x1:x2].copy()
+            key = content_hash(crop)
+            # Page rect of the visible part that was actually cropped
+            crop_rect = tuple(transform.frame_to_page((x1, y1, x2, y2)))
+
+            # Same pixels in the same place (or already on their way): nothing to do
+            known = self.image_detections.get(page_rect)
+            if (known and known[0] == key) or (key, page_rect) in in_flight:
+                continue
+
+            # Partially visible images are checked but not cached under their pixels
+            cacheable = abs((x2 - x1) - (fx2 - fx1)) <= 1 and abs((y2 - y1) - (fy2 - fy1)) <= 1
+            verdict = self.cache.get(key) if cacheable else None
+            if verdict is not None:
+                self.image_detections[page_rect] = (key, self._to_page(verdict, crop_rect))
+                continue
+
+            frame_id = self.engine.submit(self.source_id, crop, x2 - x1, y2 - y1, 0, 0)
+            if frame_id is not None:
+                self.pending[frame_id] = (key, cacheable, page_rect, crop_rect, (x2 - x1, y2 - y1), now)
+
+        self.detections_ready.emit(self.detections())
+
+    def on_engine_result(self, source_id, frame_id, detections):
+        if source_id != self.source_id or frame_id not in self.pending:
+            return
+        key, cacheable, page_rect, crop_rect, (crop_w, crop_h), _ = self.pending.pop(frame_id)
+
+        # Normalise to the image so the verdict fits wherever it's shown again
+        verdict = [
+            {
+                'xyxy': [det['xyxy'][0] / crop_w, det['xyxy'][1] / crop_h,
+                         det['xyxy'][2] / crop_w, det['xyxy'][3] / crop_h],
+                'class': det['class'],
+                'conf': det['conf']
+            }
+            for det in detections
+        ]
+        if cacheable:
+            self.cache.put(key, verdict)
+        self.image_detections[page_rect] = (key, self._to_page(verdict, crop_rect))
+        self.detections_ready.emit(self.detections())
+
+    def _to_page(self, verdict, page_rect):
+        x1, y1, x2, y2 = page_rect
+        w, h = x2 - x1, y2 - y1
+        return [
+            {
+                'xyxy': [x1 + det['xyxy'][0] * w, y1 + det['xyxy'][1] * h,
+                         x1 + det['xyxy'][2] * w, y1 + det['xyxy'][3] * h],
+                'class': det['class'],
+                'conf': det['conf']
+            }
+            for det in verdict
+        ]
+
+    def detections(self):
+        """All known image detections on the page, in page coordinates"""
+        return [det for _, dets in self.image_detections.values() for det in dets]
@@ -0,0 +1,426 @@
+# inference_engine.py
+import os
+import threading
+import time
+from collections import deque
+from itertools import count
+
+from PyQt5.QtCore import QObject, pyqtSignal
+
+from detections import Detections
+from logs import get_logger
+from metrics import PerfStats
+from yolo_worker import YoloWorker, DEFAULT_CLASS_THRESHOLDS
+from tiling import TileCache
+
+log = get_logger("engine")
+
+
+class InferenceEngine(QObject):
+    """Process-wide detector shared by every tab's ContentMonitor.
+
+    A fixed pool of worker threads, each owning one model replica, serves
+    frames submitted by the tabs. Every tab registers as a source and holds
+    a single latest-frame-wins slot: submitting a new frame replaces the
+    one still waiting. Sources that must not lose requests, such as
+    per-image scans, register with a deeper FIFO slot instead. Slots are served current tab first, then the other
+    tabs in round-robin order so no background tab starves.
+
+    Frames waiting in several slots are stacked into one predict() call of
+    up to ``batch_size`` frames; a worker holds a partial batch open for at
+    most ``max_batch_wait`` seconds while other tabs may still contribute.
+
+    In tiled mode each frame is split into overlapping tiles and only the
+    tiles whose pixels changed since that tab's previous frame are sent to
+    the model; cached detections fill in the rest.
+
+    Replicas run on the ``backend`` picked by name (see detector_backends);
+    ``threads_per_worker`` and ``inter_op_threads`` size each replica's
+    intra- and inter-op thread pools.
+
+    Each worker thread loads its own replica, so constructing the engine
+    returns immediately. Every replica is then warmed up with
+    ``warmup_runs`` dummy passes at each batch size it may be given, so the
+    first real frame runs at steady-state speed. Frames submitted meanwhile
+    wait in their slots and ``ready`` is emitted as soon as the first
+    replica can serve them.
+    """
+    result_ready = pyqtSignal(int, int, object)  # source id, frame id, Detections
+    ready = pyqtSignal()
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls, **kwargs):
+        """Return the application-wide engine, creating it on first use.
+
+        Keyword arguments configure the engine and only apply to that first call.
+        """
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls(**kwargs)
+            return cls._instance
+
+    def __init__(self, model_path="best.pt", class_thresholds=None,
+                 num_workers=1, threads_per_worker=None,
+                 backend="torch", inter_op_threads=None,
+                 batch_size=4, max_batch_wait=0.015, report_interval=10.0, warmup_runs=2,
+                 tiled=False, tile_size=640, tile_overlap=96):
+        super().__init__()
+        self.tiled = tiled
+        self.tile_size = tile_size
+        self.tile_overlap = tile_overlap
+        self.tile_caches = {}  # source id -> TileCache
+        self.batch_size = max(1, batch_size)
+        self.max_batch_wait = max_batch_wait
+        self.warmup_runs = warmup_runs
+        self.num_workers = max(1, num_workers)
+        if threads_per_worker is None:
+            # Split the cores evenly so workers don't oversubscribe the CPU
+            threads_per_worker = max(1, (os.cpu_count() or 1) // self.num_workers)
+        self.threads_per_worker = threads_per_worker
+        self.backend = backend
+
+        self.class_thresholds = class_thresholds or dict(DEFAULT_CLASS_THRESHOLDS)
+        self.workers = []  # replicas, appended by their threads as they finish loading
+        self.load_time = None  # seconds until the first replica was loaded
+        self.load_error = None
+
+        self.slots = {}  # source id -> deque of pending frames
+        self.latest_frame = {}  # source id -> id of the newest submitted frame
+        self.cancelled_upto = {}  # source id -> frames at or below this id are stale
+        self.emitted_upto = {}  # source id -> newest frame id delivered
+        self.stats = {}  # source id -> PerfStats
+        self.current_source = None
+        self._round_robin = deque()  # background service order
+        self._source_ids = count(1)
+
+        # Counters
+        self.dropped_frames = 0
+        self.cancelled_frames = 0
+        self.tiles_analysed = 0
+        self.tiles_reused = 0
+        self.class_counts = {}  # class name -> detections delivered
+
+        # Throughput reporting
+        self.report_interval = report_interval
+        self.throughput_fps = 0.0
+        self.avg_batch_size = 0.0
+        self._window_start = time.time()
+        self._window_frames = 0
+        self._window_batches = 0
+
+        self._cond = threading.Condition()
+        self._running = True
+        self._created = time.perf_counter()
+        self._threads = []
+        worker_args = (model_path, backend, inter_op_threads)
+        for index in range(self.num_workers):
+            thread = threading.Thread(target=self._worker_main, args=worker_args,
+                                      name=f"InferenceWorker-{index}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    @property
+    def is_ready(self):
+        return bool(self.workers)
+
+    @property
+    def avg_process_time(self):
+        workers = list(self.workers)
+        if not workers:
+            return 0.1
+        return sum(w.avg_process_time for w in workers) / len(workers)
+
+    def register_source(self, depth=1):
+        """Allocate a frame slot for a new source and return its id.
+
+        ``depth`` 1 is latest-frame-wins; deeper slots queue requests and
+        only drop the oldest once full.
+        """
+        with self._cond:
+            source_id = next(self._source_ids)
+            self.slots[source_id] = deque(maxlen=max(1, depth))
+            self.latest_frame[source_id] = 0
+            self.cancelled_upto[source_id] = 0
+            self.emitted_upto[source_id] = 0
+            self.stats[source_id] = PerfStats()
+            if depth == 1:
+                # Queued sources carry unrelated images; nothing to reuse between them
+                self.tile_caches[source_id] = TileCache(self.tile_size, self.tile_overlap)
+            self._round_robin.append(source_id)
+            return source_id
+
+    def unregister_source(self, source_id):
+        """Drop a tab's slot; in-flight results for it are discarded"""
+        with self._cond:
+            for table in (self.slots, self.latest_frame, self.cancelled_upto,
+                          self.emitted_upto, self.tile_caches, self.stats):
+                table.pop(source_id, None)
+            if source_id in self._round_robin:
+                self._round_robin.remove(source_id)
+            if self.current_source == source_id:
+                self.current_source = None
+
+    def stats_for(self, source_id):
+        """The source's stage timings and counters"""
+        with self._cond:
+            return self.stats.setdefault(source_id, PerfStats())
+
+    def metrics(self):
+        """Engine-wide and per-source counters for the metrics endpoint"""
+        with self._cond:
+            tiles = self.tiles_analysed + self.tiles_reused
+            snapshot = {
+                'ready': self.is_ready,
+                'workers': len(self.workers),
+                'throughput_fps': round(self.throughput_fps, 2),
+                'avg_batch_size': round(self.avg_batch_size, 2),
+                'queue_depth': sum(len(slot) for slot in self.slots.values()),
+                'dropped_frames': self.dropped_frames,
+                'cancelled_frames': self.cancelled_frames,
+                'tiles_analysed': self.tiles_analysed,
+                'tiles_reused': self.tiles_reused,
+                'tile_hit_rate': round(self.tiles_reused / tiles, 4) if tiles else 0.0,
+                'class_counts': dict(self.class_counts),
+                'sources': {source_id: len(slot) for source_id, slot in self.slots.items()},
+            }
+            stats = dict(self.stats)
+        snapshot['sources'] = {
+            source_id: dict(stats[source_id].snapshot(), queue_depth=depth)
+            for source_id, depth in snapshot['sources'].items() if source_id in stats
+        }
+        return snapshot
+
+    def set_current_source(self, source_id):
+        """Serve this source ahead of all others"""
+        with self._cond:
+            self.current_source = source_id
+            self._cond.notify()
+
+    def cancel(self, source_id):
+        """Drop the waiting frame and suppress results of frames in flight"""
+        with self._cond:
+            if source_id not in self.slots:
+                return
+            self.cancelled_frames += len(self.slots[source_id])
+            self.stats[source_id].count("cancelled", len(self.slots[source_id]))
+            self.slots[source_id].clear()
+            self.cancelled_upto[source_id] = self.latest_frame[source_id]
+
+    def submit(self, source_id, img, viewport_width, viewport_height, scroll_x, scroll_y):
+        """Put a frame in the source's slot and return its frame id.
+
+        A frame still waiting in the slot is replaced; returns None if the
+        source is not registered.
+        """
+        with self._cond:
+            if source_id not in self.slots:
+                return None
+            frame_id = self.latest_frame[source_id] + 1
+            self.latest_frame[source_id] = frame_id
+            slot = self.slots[source_id]
+            if len(slot) == slot.maxlen:
+                self.dropped_frames += 1
+                self.stats[source_id].count("dropped")
+            self.stats[source_id].count("frames")
+            slot.append((frame_id, img, viewport_width, viewport_height, scroll_x, scroll_y,
+                         time.perf_counter()))
+            self._cond.notify()
+            return frame_id
+
+    def update_threshold(self, class_name, threshold):
+        """Thread-safe threshold update"""
+        self.class_thresholds[class_name] = threshold
+
+    def _take_request(self, source_id):
+        return source_id, self.slots[source_id].popleft()
+
+    def _next_request(self):
+        """Pick the next frame: current tab first, then round-robin"""
+        if self.slots.get(self.current_source):
+            return self._take_request(self.current_source)
+
+        for _ in range(len(self._round_robin)):
+            source_id = self._round_robin[0]
+            self._round_robin.rotate(-1)
+            if self.slots.get(source_id):
+                return self._take_request(source_id)
+        return None
+
+    def _is_stale(self, source_id, frame_id):
+        if source_id not in self.slots:
+            return True
+        if frame_id <= self.cancelled_upto[source_id]:
+            return True
+        # Queued sources want every result; latest-wins ones only newer ones
+        return self.slots[source_id].maxlen == 1 and frame_id <= self.emitted_upto[source_id]
+
+    def _collect_batch(self):
+        """Block for a first frame, then top the batch up within the wait window"""
+        request = self._next_request()
+        while request is None and self._running:
+            self._cond.wait()
+            request = self._next_request()
+        if request is None:
+            return None
+
+        batch = [request]
+        deadline = time.monotonic() + self.max_batch_wait
+        while self._running and len(batch) < self.batch_size:
+            request = self._next_request()
+            if request is not None:
+                batch.append(request)
+                continue
+            # Only worth waiting while other sources could still fill the batch
+            remaining = deadline - time.monotonic()
+            if remaining <= 0 or len(batch) >= len(self.slots):
+                break
+            self._cond.wait(remaining)
+        return batch
+
+    def _record_throughput(self, frame_count):
+        self._window_frames += frame_count
+        self._window_batches += 1
+        elapsed = time.time() - self._window_start
+        if elapsed < self.report_interval:
+            return
+        self.throughput_fps = self._window_frames / elapsed
+        self.avg_batch_size = self._window_frames / self._window_batches
+        log.info("throughput", extra={
+            'fps': round(self.throughput_fps, 1),
+            'avg_batch': round(self.avg_batch_size, 1),
+            'dropped': self.dropped_frames,
+            'cancelled': self.cancelled_frames,
+            'tiles_analysed': self.tiles_analysed,
+            'tiles_reused': self.tiles_reused,
+        })
+        self._window_start = time.time()
+        self._window_frames = 0
+        self._window_batches = 0
+
+    def _detect_tiled(self, worker, batch):
+        """Run only the dirty tiles of every frame in the batch, in one predict() call"""
+        with self._cond:
+            caches = [self.tile_caches.get(source_id) or TileCache(self.tile_size, self.tile_overlap)
+                      for source_id, _ in batch]
+        # Always lock in the same order so concurrent workers can't deadlock
+        locked = sorted(set(caches), key=lambda c: id(c))
+        for cache in locked:
+            cache.lock.acquire()
+        try:
+            plans = []
+            crops = []
+            reused = 0
+            for cache, (_, (_, img, _, _, _, _, _)) in zip(caches, batch):
+                dirty = cache.dirty_tiles(img)
+                plans.append((len(crops), dirty))
+                # Tile offsets bring the boxes back into frame pixels
+                crops.extend((img[y1:y2, x1:x2], x1, y1) for _, (x1, y1, x2, y2), _ in dirty)
+                reused += len(cache.tiles) - len(dirty)
+            # Other workers count tiles too; metrics() reads under the same lock
+            with self._cond:
+                self.tiles_reused += reused
+                self.tiles_analysed += len(crops)
+
+            tile_detections = worker.detect_batch(crops) if crops else []
+
+            batch_detections = []
+            for cache, (start, dirty), (_, request) in zip(caches, plans, batch):
+                sx, sy = request[4], request[5]
+                frame_detections = cache.update(dirty, tile_detections[start:start + len(dirty)])
+                batch_detections.append(
+                    Detections.from_dicts(frame_detections, worker.backend.names).shifted(sx, sy))
+            return batch_detections
+        finally:
+            for cache in locked:
+                cache.lock.release()
+
+    def _worker_main(self, model_path, backend, inter_op_threads):
+        """Load this thread's replica off the GUI thread, then serve frames"""
+        try:
+            # Replicas share the thresholds dict so updates reach all of them
+            worker = YoloWorker(model_path, class_thresholds=self.class_thresholds,
+                                num_threads=self.threads_per_worker,
+                                backend=backend, inter_threads=inter_op_threads)
+            if self.warmup_runs:
+                elapsed = worker.warmup(range(1, self.batch_size + 1), self.warmup_runs)
+                log.info("Warm-up took %.2fs", elapsed)
+        except Exception as e:
+            # Pages stay shielded: better no browsing than unfiltered browsing
+            log.error("Model load failed: %s", e)
+            self.load_error = str(e)
+            return
+
+        with self._cond:
+            self.workers.append(worker)
+            first = len(self.workers) == 1
+            if first:
+                self.load_time = time.perf_counter() - self._created
+        if first:
+            log.info("Model ready in %.2fs", self.load_time)
+            self.ready.emit()
+        self._worker_loop(worker)
+
+    def _worker_loop(self, worker):
+        while True:
+            with self._cond:
+                batch = self._collect_batch()
+                if batch is None or not self._running:
+                    return
+            started = time.perf_counter()
+
+            try:
+                if self.tiled:
+                    batch_detections = self._detect_tiled(worker, batch)
+                else:
+                    frames = [(img, sx, sy) for _, (_, img, _, _, sx, sy, _) in batch]
+                    batch_detections = worker.detect_batch(frames)
+            except Exception as e:
+                log.exception("Detection error: %s", e)
+                batch_detections = [Detections() for _ in batch]
+
+            results = []
+            with self._cond:
+                self._record_throughput(len(batch))
+                for (source_id, request), detections in zip(batch, batch_detections):
+                    frame_id = request[0]
+                    stats = self.stats.get(source_id)
+                    if stats is not None:
+                        # Every frame in a batch waits for the whole batch
+                        stats.record("queue", 1000 * (started - request[6]))
+                        for stage, ms in worker.last_timings.items():
+                            stats.record(stage, ms)
+                    # Another worker may have finished a newer frame meanwhile
+                    if self._is_stale(source_id, frame_id):
+                        if source_id in self.slots:
+                            self.cancelled_frames += 1
+                            stats.count("cancelled")
+                        continue
+                    stats.mark_emitted(frame_id)
+                    self.emitted_upto[source_id] = max(frame_id, self.emitted_upto[source_id])
+                    results.append((source_id, frame_id, detections))
+                    for name in detections.classes:
+                        self.class_counts[name] = self.class_counts.get(name, 0) + 1
+
+            # Split the batch back out per tab
+            for source_id, frame_id, detections in results:
+                self.result_ready.emit(source_id, frame_id, detections)
+
+    def cleanup(self):
+        """Stop the worker pool and release the model replicas"""
+        with self._cond:
+            self._running = False
+            for slot in self.slots.values():
+                slot.clear()
+            self._cond.notify_all()
+        for thread in self._threads:
+            thread.join(2.0)
+        with self._cond:
+            workers = list(self.workers)
+        for worker in workers:
+            worker.cleanup()
+        with InferenceEngine._instance_lock:
+            if InferenceEngine._instance is self:
+                InferenceEngine._instance = None
@@ -0,0 +1,75 @@
+# logs.py
+import json
+import logging
+import os
+import sys
+import time
+
+ROOT_LOGGER = "browser"
+
+# Attributes every LogRecord has; anything else came in through ``extra``
+_RECORD_FIELDS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: time, level, logger, message and extra fields"""
+
+    def format(self, record):
+        entry = {
+            'ts': round(record.created, 3),
+            'level': record.levelname.lower(),
+            'logger': record.name,
+            'msg': record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_FIELDS and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry['exc'] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """Human-readable lines for a terminal, extra fields appended as key=value"""
+
+    def format(self, record):
+        extra = " ".join(f"{key}={value}" for key, value in vars(record).items()
+                         if key not in _RECORD_FIELDS and not key.startswith("_"))
+        line = (f"{time.strftime('%H:%M:%S', time.localtime(record.created))} "
+                f"{record.levelname:<7} {record.name}: {record.getMessage()}")
+        if extra:
+            line += " " + extra
+        if record.exc_info:
+            line += "\n" + self.formatException(record.exc_info)
+        return line
+
+
+def get_logger(name):
+    """Logger for a module, e.g. get_logger("engine") -> "browser.engine" """
+    return logging.getLogger(f"{ROOT_LOGGER}.{name}")
+
+
+def setup_logging(level="INFO", json_lines=True, path=None):
+    """Configure the application's loggers once, at startup.
+
+    ``BROWSER_LOG_LEVEL``, ``BROWSER_LOG_FORMAT`` ("json" or "text") and
+    ``BROWSER_LOG_FILE`` override the arguments, so a deployment can be
+    turned up without a code change. Hot paths log at DEBUG and cost a
+    level check while that is off.
+    """
+    level = os.environ.get("BROWSER_LOG_LEVEL", level).upper()
+    log_format = os.environ.get("BROWSER_LOG_FORMAT")
+    if log_format:
+        json_lines = log_format.lower() == "json"
+    path = os.environ.get("BROWSER_LOG_FILE", path)
+
+    handler = logging.FileHandler(path, encoding="utf-8") if path else logging.StreamHandler(sys.stdout)
+    handler.setFormatter(JsonFormatter() if json_lines else TextFormatter())
+
+    root = logging.getLogger(ROOT_LOGGER)
+    for old in list(root.handlers):
+        root.removeHandler(old)
+    root.addHandler(handler)
+    root.setLevel(getattr(logging, level, logging.INFO))
+    root.propagate = False
+    return root
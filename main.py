@@ -1,4 +1,7 @@
 # IMPORTS
+import time
+STARTUP_TIME = time.perf_counter()  # Taken before the heavy imports to report their cost
+
 import os
 import sys
 import numpy as np
@@ -8,15 +11,66 @@ from PyQt5.QtWidgets import *
 from PyQt5.QtGui import *
 from PyQt5.QtWebEngineWidgets import *
 from PyQt5.QtWebChannel import QWebChannel
-from ultralytics import YOLO
 
 # Custom modules
 from text_extractor import extract_text_from_page
 from browser_overlay import BrowserOverlay
-from content_monitor import ContentMonitor
-from bridge import JSBridge
-
-import time
+from content_monitor import ContentMonitor, FOREGROUND, RECENT, HIDDEN
+from inference_engine import InferenceEngine
+from verdict_cache import VerdictCache
+from network_filter import NetworkImageFilter
+from bridge import JSBridge, DOM_WATCH_JS
+from logs import setup_logging, get_logger
+from metrics import MetricsServer
+
+# Log level and format; BROWSER_LOG_LEVEL, BROWSER_LOG_FORMAT ("json" or "text")
+# and BROWSER_LOG_FILE override these without editing the file
+LOG_LEVEL = "INFO"
+LOG_JSON = True
+
+# Serve /metrics (Prometheus text) and /metrics.json on this localhost port;
+# None leaves the endpoint off
+METRICS_PORT = None
+
+setup_logging(LOG_LEVEL, LOG_JSON)
+log = get_logger("main")
+log.info("Imports took %.2fs", time.perf_counter() - STARTUP_TIME)
+
+# "viewport" runs the detector on screen grabs; "images" classifies page
+# images individually and reuses verdicts from the on-disk cache
+DETECTION_PIPELINE = "viewport"
+
+# Classify images from the network as they download, before first paint.
+# Fetches every image a second time without the tab's cookies, so opt-in.
+NETWORK_PRESCAN = False
+
+# "torch", "onnx", "onnx-int8" or "openvino"; exported models are cached next
+# to best.pt and missing runtimes fall back to torch. Check a backend against
+# torch with bench_backends.py before switching. "onnx-int8" calibrates on
+# datasets/calibration/ and refuses to start without images there (see
+# bench_quantization.py for its accuracy cost)
+DETECTOR_BACKEND = "torch"
+
+# Analyse native-resolution grabs as overlapping 640 px tiles and rerun only
+# the tiles that changed; finds small objects on large viewports
+TILED_INFERENCE = False
+
+# Also classify the page just above and below the viewport in an offscreen
+# copy of the tab, ahead of scrolling. Loads every page twice, so opt-in.
+PREFETCH_SCAN = False
+
+# Pages send at most one DOM change summary per this many ms
+DOM_REPORT_INTERVAL = 250
+
+# Page text is re-extracted at most this often, and only after new text appeared
+TEXT_EXTRACT_INTERVAL = 30.0
+
+# Besides the current tab, this many recently used tabs keep a steady low
+# scan rate; the rest are only scanned after loads and DOM changes. Budgets
+# are frames per second shared by all tabs of a tier. Only views that are
+# actually shown are grabbed; a tab is rescanned as soon as it comes to the front.
+RECENT_TABS = 2
+TIER_FPS = {RECENT: 2.0, HIDDEN: 0.5}
 
 # MAIN WINDOW
 class MainWindow(QMainWindow):
@@ -24,7 +78,7 @@ class MainWindow(QMainWindow):
         super(MainWindow, self).__init__(*args, **kwargs)
 
         # Initialize warning system
-        self.last_dom_change_time = {}
+        self.last_text_extract_time = {}  # browser -> time of the last extraction
         self.warning_label = QLabel()
         self.warning_label.setStyleSheet("""
             background-color: #000000; 
@@ -35,8 +89,16 @@ class MainWindow(QMainWindow):
         self.statusBar().addPermanentWidget(self.warning_label)
 
         # Initialize content monitoring system
-        self.monitors = {}  # To store monitors for each tab
-        self.overlays = {}  # To store overlays for each tab
+        self.monitors = {}  # browser -> ContentMonitor; tab indices shift on close
+        self.overlays = {}  # browser -> BrowserOverlay
+        self.tab_history = []  # Browsers, most recently current first
+
+        # The model loads in the background; pages stay shielded until it's ready
+        self.first_frame_reported = False
+        self.hud_enabled = False
+        engine = InferenceEngine.instance()
+        engine.ready.connect(self.on_engine_ready)
+        engine.result_ready.connect(self.on_engine_result)
 
         # Set up web browser tabs
         self.tabs = QTabWidget()
@@ -63,6 +125,7 @@ class MainWindow(QMainWindow):
         # Load default home page
         self.add_new_tab(QUrl('http://www.google.com'), 'Homepage')
         self.show()
+        log.info("Window shown %.2fs after launch", time.perf_counter() - STARTUP_TIME)
 
     def setup_navigation_toolbar(self):
         """Initialize the navigation toolbar with buttons"""
@@ -113,6 +176,14 @@ class MainWindow(QMainWindow):
         new_tab_action.triggered.connect(lambda _: self.add_new_tab())
         file_menu.addAction(new_tab_action)
 
+        # View menu
+        view_menu = self.menuBar().addMenu("&View")
+        hud_action = QAction("Performance HUD", self)
+        hud_action.setCheckable(True)
+        hud_action.setShortcut("Ctrl+Shift+H")
+        hud_action.toggled.connect(self.toggle_hud)
+        view_menu.addAction(hud_action)
+
         # Help menu
         help_menu = self.menuBar().addMenu("&Help")
         navigate_home_action = QAction(QIcon(os.path.join('icons', 'cil-exit-to-app.png')), "Homepage", self)
@@ -174,89 +245,70 @@ class MainWindow(QMainWindow):
             qurl = QUrl('http://www.google.com')
 
         browser = QWebEngineView()
+        if network_filter:
+            network_filter.attach(browser.page())
         browser.setUrl(qurl)
 
         # Connect text extraction to loadFinished signal
         browser.loadFinished.connect(lambda ok: self.handle_page_loaded(browser, ok))
 
-        # Connect scroll handler
-        browser.page().scrollPositionChanged.connect(
-            lambda: self.overlays[self.tabs.indexOf(browser)].update_position()
-        )
-
         # Enable hardware acceleration
         browser.settings().setAttribute(QWebEngineSettings.Accelerated2dCanvasEnabled, True)
         browser.settings().setAttribute(QWebEngineSettings.WebGLEnabled, True)
         browser.settings().setAttribute(QWebEngineSettings.Accelerated2dCanvasEnabled, True)
 
         # Bridge setup
-        bridge = JSBridge()
+        bridge = JSBridge(browser)  # Parented so Qt keeps it alive with the tab
 
         # Set up JS channel
-        channel = QWebChannel()
+        channel = QWebChannel(browser.page())
         channel.registerObject("pyObj", bridge)
         browser.page().setWebChannel(channel)
 
-        # Load the qwebchannel.js file
+        # Inject the web channel and the DOM watcher into every document the tab loads
         qwebchannel_js = QFile(":/qtwebchannel/qwebchannel.js")
         if qwebchannel_js.open(QIODevice.ReadOnly):
-            browser.page().runJavaScript(qwebchannel_js.readAll().data().decode())
+            script = QWebEngineScript()
+            script.setName("cpb-dom-watch")
+            script.setSourceCode(qwebchannel_js.readAll().data().decode() +
+                                 DOM_WATCH_JS % {'min_interval': DOM_REPORT_INTERVAL})
+            script.setInjectionPoint(QWebEngineScript.DocumentReady)
+            script.setWorldId(QWebEngineScript.MainWorld)
+            browser.page().scripts().insert(script)
             qwebchannel_js.close()
         else:
-            print("Failed to load qwebchannel.js")
-
-        # Inject JavaScript for mutation observer
-        browser.page().runJavaScript("""
-            (function() {
-                if (window.channelInjected) return;  // prevent duplicate injection
-                window.channelInjected = true;
-                new QWebChannel(qt.webChannelTransport, function(channel) {
-                    window.pyObj = channel.objects.pyObj;
-
-                    const observer = new MutationObserver(() => {
-                        if (window.pyObj && window.pyObj.notifyDomChanged) {
-                            window.pyObj.notifyDomChanged();
-                        }
-                    });
-
-                    observer.observe(document.body, { childList: true, subtree: true });
-                });
-            })();
-        """)
+            log.error("Failed to load qwebchannel.js")
 
         # Callbacks on DOM change
-        bridge.domChanged.connect(lambda: self.on_dom_change(browser))
+        bridge.mutationsReported.connect(lambda summary: self.on_dom_change(browser, summary))
 
         # Create overlay for this tab
         overlay = BrowserOverlay(browser)
         overlay.hide()
+        if not InferenceEngine.instance().is_ready:
+            overlay.set_initializing(True)
         
         # Create monitor for this tab
-        monitor = ContentMonitor(browser)
+        monitor = ContentMonitor(browser, bridge, pipeline=DETECTION_PIPELINE, prefetch=PREFETCH_SCAN)
         monitor.detection_signal.connect(
             lambda data, pixmap: self.handle_detections(browser, data, pixmap)  # Pass full dict
         )
+        overlay.stats = monitor.stats
+        overlay.set_hud(self.hud_enabled)
         
         # Store references
         tab_index = self.tabs.addTab(browser, label)
-        self.monitors[tab_index] = monitor
-        self.overlays[tab_index] = overlay
-        
-        # Start monitoring if this is the current tab
-        if tab_index == self.tabs.currentIndex():
-            monitor.start()
+        self.monitors[browser] = monitor
+        self.overlays[browser] = overlay
         
+        # The new tab becomes current; the others move down a tier
         self.tabs.setCurrentIndex(tab_index)
-        browser.loadFinished.connect(lambda: monitor.adaptive_check_content())  # New line
+        self.update_scan_tiers()
         return browser
 
     # Modify the handle_detections method
     def handle_detections(self, browser, detection_data, pixmap):
-        tab_index = self.tabs.indexOf(browser)
-        if tab_index == -1:
-            return
-            
-        overlay = self.overlays.get(tab_index)
+        overlay = self.overlays.get(browser)
         if not overlay:
             return
             
@@ -269,8 +321,28 @@ class MainWindow(QMainWindow):
             self.warning_label.setText(f"⚠️ Blocked {det_count} inappropriate regions")
         self.warning_label.setVisible(has_detections)
         
-        # Update overlay
-        overlay.set_detections(detection_data if has_detections else None)
+        # Update overlay; an empty result still tells its tracker what went away
+        overlay.set_detections(detection_data)
+
+    def toggle_hud(self, enabled):
+        """Show per-stage latencies over every tab"""
+        self.hud_enabled = enabled
+        for overlay in self.overlays.values():
+            overlay.set_hud(enabled)
+
+    def on_engine_ready(self):
+        """Lift the initializing shield from every tab"""
+        for overlay in self.overlays.values():
+            overlay.set_initializing(False)
+        log.info("Protection ready %.2fs after launch", time.perf_counter() - STARTUP_TIME)
+
+    def on_engine_result(self, source_id, frame_id, detections):
+        """Report time to the first analysed tab frame, once"""
+        if self.first_frame_reported:
+            return
+        if any(monitor.source_id == source_id for monitor in self.monitors.values()):
+            self.first_frame_reported = True
+            log.info("First protected frame %.2fs after launch", time.perf_counter() - STARTUP_TIME)
 
     # ADD NEW TAB ON DOUBLE CLICK ON TABS
     def tab_open_doubleclick(self, i):
@@ -283,18 +355,21 @@ class MainWindow(QMainWindow):
             return
 
         # Clean up monitor and overlay
-        monitor = self.monitors.get(i)
+        browser = self.tabs.widget(i)
+        monitor = self.monitors.pop(browser, None)
         if monitor:
-            monitor.stop_monitoring()   
-            monitor.thread.quit()
-            monitor.thread.wait()
-            del self.monitors[i]
+            monitor.close()
 
-        if i in self.overlays:
-            self.overlays[i].deleteLater()
-            del self.overlays[i]
+        overlay = self.overlays.pop(browser, None)
+        if overlay:
+            overlay.cleanup()
+            overlay.deleteLater()
 
+        if browser in self.tab_history:
+            self.tab_history.remove(browser)
+        self.last_text_extract_time.pop(browser, None)
         self.tabs.removeTab(i)
+        browser.deleteLater()
 
     # UPDATE URL TEXT WHEN ACTIVE TAB IS CHANGED
     def update_urlbar(self, q, browser=None):
@@ -326,13 +401,31 @@ class MainWindow(QMainWindow):
         # UPDATE WINDOWS TITTLE
         self.update_title(self.tabs.currentWidget())
         
-        # Start monitoring for current tab, stop others
-        for index, monitor in self.monitors.items():
-            if index == i:
-                if not monitor.isRunning():
-                    monitor.start()
+        self.update_scan_tiers()
+
+    def update_scan_tiers(self):
+        """Current tab at full rate, recent tabs at a low rate, the rest on events"""
+        current = self.tabs.currentWidget()
+        if current in self.tab_history:
+            self.tab_history.remove(current)
+        self.tab_history.insert(0, current)
+        recent = self.tab_history[1:1 + RECENT_TABS]
+
+        tiers = {}
+        for monitor in self.monitors.values():
+            if monitor.browser is current:
+                tiers[monitor] = FOREGROUND
+            elif monitor.browser in recent:
+                tiers[monitor] = RECENT
             else:
-                monitor.stop_monitoring()
+                tiers[monitor] = HIDDEN
+        for monitor, tier in tiers.items():
+            # Split the tier's budget between its tabs
+            share = sum(1 for t in tiers.values() if t == tier)
+            fps = TIER_FPS[tier] / share if tier in TIER_FPS else None
+            monitor.set_tier(tier, fps)
+            if tier == FOREGROUND:
+                InferenceEngine.instance().set_current_source(monitor.source_id)
 
 
     # UPDATE WINDOWS TITTLE
@@ -370,33 +463,48 @@ class MainWindow(QMainWindow):
         for overlay in self.overlays.values():
             overlay.update_position()
 
-    def on_dom_change(self, browser):
-        print("\n\n\n\n\n\nDOM changed, extracting text...")
-        tab_index = self.tabs.indexOf(browser)
+    def on_dom_change(self, browser, summary):
+        # The tab's ContentMonitor schedules its own capture from the same signal
+        if not summary.get('text'):
+            return
         now = time.time()
-        last_time = self.last_dom_change_time.get(tab_index, 0)
-
-        if now - last_time < 1.5:  # Only allow every 1.5s
+        if now - self.last_text_extract_time.get(browser, 0) < TEXT_EXTRACT_INTERVAL:
             return
 
-        self.last_dom_change_time[tab_index] = now
-
-        monitor = self.monitors.get(tab_index)
-        if monitor:
-            monitor.check_content()
+        self.last_text_extract_time[browser] = now
+        log.debug("New page text, extracting")
+        extract_text_from_page(browser)
 
     def handle_page_loaded(self, browser, ok):
         """Handle page load completion"""
         if ok:  # Only proceed if load was successful
-            print(f"Page loaded successfully: {browser.url().toString()}")
+            log.info("Page loaded", extra={'url': browser.url().toString()})
             extract_text_from_page(browser)
         else:
-            print(f"Page failed to load: {browser.url().toString()}")
+            log.warning("Page failed to load", extra={'url': browser.url().toString()})
 
 app = QApplication(sys.argv)
 app.setApplicationName("Child Protection Browser")  
 app.setOrganizationName("Child Protection")
 app.setOrganizationDomain("childprotection.org")
 
+# One detector for the whole application, shared by every tab
+engine = InferenceEngine.instance(backend=DETECTOR_BACKEND, tiled=TILED_INFERENCE)
+app.aboutToQuit.connect(engine.cleanup)
+app.aboutToQuit.connect(VerdictCache.instance().close)
+
+network_filter = None
+if NETWORK_PRESCAN:
+    network_filter = NetworkImageFilter(engine, VerdictCache.instance())
+    network_filter.install(QWebEngineProfile.defaultProfile())
+    app.aboutToQuit.connect(network_filter.cleanup)
+
+if METRICS_PORT is not None:
+    try:
+        metrics_server = MetricsServer(engine, METRICS_PORT, verdict_cache=VerdictCache.instance()).start()
+        app.aboutToQuit.connect(metrics_server.stop)
+    except OSError as e:
+        log.error("Metrics endpoint unavailable: %s", e)
+
 window = MainWindow()
 app.exec_()
\ No newline at end of file
@@ -0,0 +1,262 @@
+# metrics.py
+import json
+import os
+import sys
+import threading
+import time
+from collections import deque
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+
+from logs import get_logger
+
+log = get_logger("metrics")
+
+# Pipeline stages in the order a frame passes through them. "exposure" is
+# end to end: from the page event that put new pixels on screen to the
+# paint that masked them.
+STAGES = ("grab", "convert", "queue", "preprocess", "inference", "postprocess",
+          "signal", "paint", "exposure")
+
+
+class LatencyHistogram:
+    """Latency samples in ms over a sliding window, with percentiles.
+
+    The window keeps the percentiles current as conditions change, where a
+    cumulative mean would never move again after a few thousand frames.
+    """
+
+    def __init__(self, window=500):
+        self.samples = deque(maxlen=window)
+        self.count = 0
+
+    def add(self, ms):
+        self.samples.append(ms)
+        self.count += 1
+
+    def summary(self):
+        """Lifetime count plus mean and p50/p95/p99 over the window"""
+        if not self.samples:
+            return {'count': self.count}
+        values = np.fromiter(self.samples, np.float64, len(self.samples))
+        p50, p95, p99 = np.percentile(values, (50, 95, 99))
+        return {
+            'count': self.count,
+            'mean': round(float(values.mean()), 2),
+            'p50': round(float(p50), 2),
+            'p95': round(float(p95), 2),
+            'p99': round(float(p99), 2),
+        }
+
+
+class PerfStats:
+    """Per-tab stage timings and frame counters.
+
+    Stages are recorded from the GUI thread and the inference workers
+    alike, so every access goes through one lock.
+    """
+
+    def __init__(self, window=500):
+        self.window = window
+        self.stages = {}  # stage -> LatencyHistogram
+        self.counters = {}  # name -> count
+        self._emitted = {}  # frame id -> perf_counter() when the engine emitted it
+        self._lock = threading.Lock()
+
+    def record(self, stage, ms):
+        with self._lock:
+            histogram = self.stages.get(stage)
+            if histogram is None:
+                histogram = self.stages[stage] = LatencyHistogram(self.window)
+            histogram.add(ms)
+
+    def count(self, name, n=1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def mark_emitted(self, frame_id):
+        """Engine side of the signal delivery time"""
+        with self._lock:
+            self._emitted[frame_id] = time.perf_counter()
+            # Results that never arrive (closed tab, disconnect) mustn't pile up
+            if len(self._emitted) > 64:
+                del self._emitted[min(self._emitted)]
+
+    def mark_delivered(self, frame_id):
+        """Receiver side of the signal delivery time"""
+        with self._lock:
+            emitted = self._emitted.pop(frame_id, None)
+        if emitted is not None:
+            self.record("signal", 1000 * (time.perf_counter() - emitted))
+
+    def snapshot(self):
+        with self._lock:
+            return {
+                'stages': {stage: h.summary() for stage, h in self.stages.items()},
+                'counters': dict(self.counters),
+            }
+
+    def format_lines(self):
+        """Plain-text table for the HUD"""
+        snapshot = self.snapshot()
+        lines = [f"{'stage':<12}{'p50':>8}{'p95':>8}{'p99':>8}  ms"]
+        for stage in STAGES:
+            summary = snapshot['stages'].get(stage)
+            if summary and 'p50' in summary:
+                lines.append(f"{stage:<12}{summary['p50']:>8.1f}{summary['p95']:>8.1f}{summary['p99']:>8.1f}")
+        counters = snapshot['counters']
+        lines.append("  ".join(f"{name} {counters.get(name, 0)}"
+                               for name in ("frames", "skipped", "dropped", "cancelled")))
+        return lines
+
+
+def memory_usage():
+    """Resident set size of this process in bytes, or None if unknown"""
+    try:
+        import psutil
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        pass
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import resource
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        # Peak rather than current; kilobytes on Linux, bytes on macOS
+        return peak if sys.platform == "darwin" else peak * 1024
+    except ImportError:
+        return None
+
+
+def _label(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def prometheus_text(snapshot):
+    """Render a MetricsServer snapshot in the Prometheus text format"""
+    engine = snapshot['engine']
+    lines = []
+
+    def metric(name, kind, help_text, samples):
+        lines.append(f"# HELP browser_{name} {help_text}")
+        lines.append(f"# TYPE browser_{name} {kind}")
+        for labels, value in samples:
+            label_text = ",".join(f'{key}="{_label(v)}"' for key, v in labels.items())
+            lines.append(f"browser_{name}{{{label_text}}} {value}" if label_text else f"browser_{name} {value}")
+
+    metric("inference_fps", "gauge", "Frames analysed per second over the last report interval",
+           [({}, engine['throughput_fps'])])
+    metric("inference_batch_size", "gauge", "Mean frames per model call", [({}, engine['avg_batch_size'])])
+    metric("inference_workers", "gauge", "Loaded model replicas", [({}, engine['workers'])])
+    metric("queue_depth", "gauge", "Frames waiting for a worker",
+           [({}, engine['queue_depth'])] +
+           [({'source': source}, data['queue_depth']) for source, data in engine['sources'].items()])
+    metric("frames_dropped_total", "counter", "Frames replaced in their slot before analysis",
+           [({}, engine['dropped_frames'])])
+    metric("frames_cancelled_total", "counter", "Frames discarded as stale",
+           [({}, engine['cancelled_frames'])])
+    metric("detections_total", "counter", "Detections delivered to tabs, by class",
+           [({'class': name}, count) for name, count in sorted(engine['class_counts'].items())])
+    metric("tiles_total", "counter", "Tiles analysed by the model or reused from the tile cache",
+           [({'result': 'analysed'}, engine['tiles_analysed']), ({'result': 'reused'}, engine['tiles_reused'])])
+    hit_rates = [({'cache': 'tiles'}, engine['tile_hit_rate'])]
+    cache = snapshot.get('verdict_cache')
+    if cache is not None:
+        hit_rates.append(({'cache': 'verdicts'}, cache['hit_rate']))
+    metric("cache_hit_rate", "gauge", "Share of lookups served from cache", hit_rates)
+    if cache is not None:
+        metric("verdict_cache_lookups_total", "counter", "Verdict cache lookups",
+               [({'result': 'hit'}, cache['hits']), ({'result': 'miss'}, cache['misses'])])
+    if snapshot.get('memory_bytes') is not None:
+        metric("memory_bytes", "gauge", "Resident set size of the browser process",
+               [({}, snapshot['memory_bytes'])])
+
+    stage_samples = []
+    counter_samples = []
+    for source, data in engine['sources'].items():
+        for stage, summary in data['stages'].items():
+            for quantile in ("p50", "p95", "p99"):
+                if quantile in summary:
+                    stage_samples.append(({'source': source, 'stage': stage,
+                                           'quantile': "0." + quantile[1:]}, summary[quantile]))
+        for name, count in data['counters'].items():
+            counter_samples.append(({'source': source, 'counter': name}, count))
+    metric("stage_latency_ms", "gauge", "Per-stage latency percentiles over the recent window", stage_samples)
+    metric("source_frames_total", "counter", "Per-tab frame counters", counter_samples)
+    return "\n".join(lines) + "\n"
+
+
+class MetricsServer:
+    """Local HTTP endpoint exporting the engine's counters.
+
+    ``/metrics`` serves the Prometheus text format and ``/metrics.json`` the
+    same snapshot as JSON. Binds to localhost by default; it runs on a
+    daemon thread and only reads counters, so a scraper never slows frames.
+    """
+
+    def __init__(self, engine, port=9464, host="127.0.0.1", verdict_cache=None):
+        self.engine = engine
+        self.verdict_cache = verdict_cache
+        self.server = ThreadingHTTPServer((host, port), self._handler())
+        self.server.daemon_threads = True
+        self.thread = threading.Thread(target=self.server.serve_forever, name="MetricsServer", daemon=True)
+
+    @property
+    def address(self):
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self.thread.start()
+        log.info("Metrics endpoint at %s/metrics", self.address)
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+    def snapshot(self):
+        snapshot = {
+            'time': round(time.time(), 3),
+            'engine': self.engine.metrics(),
+            'memory_bytes': memory_usage(),
+        }
+        if self.verdict_cache is not None:
+            cache = self.verdict_cache
+            snapshot['verdict_cache'] = {
+                'hits': cache.hits,
+                'misses': cache.misses,
+                'hit_rate': round(cache.hit_rate, 4),
+                'entries': len(cache.entries),
+            }
+        return snapshot
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                path = self.path.split("?", 1)[0]
+                if path == "/metrics":
+                    body = prometheus_text(server.snapshot()).encode()
+                    content_type = "text/plain; version=0.0.4; charset=utf-8"
+                elif path == "/metrics.json":
+                    body = json.dumps(server.snapshot()).encode()
+                    content_type = "application/json"
+                else:
+                    self.send_error(404)
+                    return
+                self.send_response(200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, format, *args):
+                log.debug("metrics request: " + format, *args)
+
+        return Handler
@@ -0,0 +1,252 @@
+# network_filter.py
+import json
+import time
+from collections import deque
+
+import cv2
+import numpy as np
+from PyQt5.QtCore import QObject, QUrl, pyqtSignal
+from PyQt5.QtNetwork import QNetworkAccessManager, QNetworkRequest, QNetworkReply
+from PyQt5.QtWebEngineCore import QWebEngineUrlRequestInterceptor, QWebEngineUrlRequestInfo
+from PyQt5.QtWebEngineWidgets import QWebEngineScript
+
+from verdict_cache import content_hash
+
+# Injected at document creation: images stay hidden until Python posts a
+# verdict for their URL, blocked ones are blacked out, and anything without
+# a verdict after the timeout is revealed for the screen pipeline to handle.
+# data:/blob: images and ones served from the renderer's memory cache never
+# reach the interceptor, so they are let through: the former at once, the
+# latter once loaded without Python having announced a request for them.
+IMAGE_SHIELD_JS = """
+(function() {
+    if (window.__cpbShield) return;
+    window.__cpbShield = true;
+    const revealTimeout = %(reveal_timeout)d;
+    const requestGrace = %(request_grace)d;
+    const verdicts = new Map();
+    const requested = new Set();
+    const firstSeen = new WeakMap();
+
+    const style = document.createElement('style');
+    style.textContent =
+        'img:not([data-cpb]) { visibility: hidden !important; }' +
+        'img[data-cpb="blocked"] { filter: brightness(0) !important; }';
+    function attach() {
+        const root = document.head || document.documentElement;
+        if (!root) return false;
+        root.appendChild(style);
+        return true;
+    }
+    if (!attach()) {
+        const waiter = new MutationObserver(() => { if (attach()) waiter.disconnect(); });
+        waiter.observe(document, {childList: true, subtree: true});
+    }
+
+    function apply(img) {
+        const url = img.currentSrc || img.src;
+        const verdict = verdicts.get(url);
+        if (verdict) {
+            img.dataset.cpb = verdict;
+        } else if (!img.dataset.cpb) {
+            if (/^(data|blob):/.test(url)) {
+                img.dataset.cpb = 'exempt';
+                return;
+            }
+            const seen = firstSeen.get(img) || Date.now();
+            firstSeen.set(img, seen);
+            const waited = Date.now() - seen;
+            if (waited > revealTimeout) {
+                img.dataset.cpb = 'timeout';
+            } else if (waited > requestGrace && img.complete && !requested.has(url)) {
+                img.dataset.cpb = 'uncached';
+            }
+        }
+    }
+
+    window.__cpbRequested = function(url) {
+        requested.add(url);
+    };
+
+    window.__cpbVerdict = function(url, blocked) {
+        verdicts.set(url, blocked ? 'blocked' : 'ok');
+        for (const img of document.images) {
+            if ((img.currentSrc || img.src) === url) apply(img);
+        }
+    };
+    setInterval(() => { for (const img of document.images) apply(img); }, 250);
+})();
+"""
+
+
+class ImageRequestInterceptor(QWebEngineUrlRequestInterceptor):
+    """Reports image requests as the browser issues them.
+
+    interceptRequest runs on Chromium's IO thread, so it only emits a
+    signal and never blocks the request.
+    """
+    imageRequested = pyqtSignal(str)
+
+    def interceptRequest(self, info):
+        if info.resourceType() == QWebEngineUrlRequestInfo.ResourceTypeImage:
+            url = info.requestUrl()
+            if url.scheme() in ('http', 'https'):
+                self.imageRequested.emit(url.toString())
+
+
+class NetworkImageFilter(QObject):
+    """Classifies images while they download, ahead of the first paint.
+
+    Qt 5 doesn't expose response bodies to interceptors, so every image
+    request seen by ImageRequestInterceptor is fetched a second time in
+    parallel with the renderer's own request, decoded and classified on the
+    shared engine. That second fetch doubles image traffic, is visible to
+    the origin and carries none of the tab's cookies, so gated images come
+    back as whatever the origin serves anonymously; hence opt-in.
+
+    Verdicts go into the shared VerdictCache, under both the URL and the
+    pixel hash, and are posted to every attached page where the injected
+    shield holds the image hidden until then. runJavaScript only reaches a
+    page's main frame, so the shield isn't injected into iframes; their
+    images are left to the screen pipeline.
+    """
+    verdictReady = pyqtSignal(str, list)  # url, normalised detections
+
+    def __init__(self, engine, cache, reveal_timeout=3000, request_grace=500,
+                 max_bytes=8 * 1024 * 1024):
+        super().__init__()
+        self.engine = engine
+        self.cache = cache
+        self.reveal_timeout = reveal_timeout  # ms an image may stay hidden without a verdict
+        self.request_grace = request_grace  # ms a loaded image waits for its request to be announced
+        self.max_bytes = max_bytes
+
+        self.source_id = engine.register_source(depth=64)
+        self.interceptor = ImageRequestInterceptor()
+        self.interceptor.imageRequested.connect(self.on_image_requested)
+        self.network = QNetworkAccessManager(self)
+        self.engine.result_ready.connect(self.on_engine_result)
+
+        self.profiles = []
+        self.pages = []
+        self.replies = set()  # fetches still downloading
+        self.in_flight = set()  # urls being fetched or classified
+        self.pending = {}  # frame id -> (url, content hash, image size, request time)
+        self.verdict_latency = deque(maxlen=1000)  # seconds from request seen to verdict posted
+
+    def install(self, profile):
+        """Intercept the profile's requests and inject the image shield into its pages"""
+        profile.setUrlRequestInterceptor(self.interceptor)
+        self.profiles.append(profile)
+
+        script = QWebEngineScript()
+        script.setName("cpb-image-shield")
+        script.setSourceCode(IMAGE_SHIELD_JS % {'reveal_timeout': self.reveal_timeout,
+                                                'request_grace': self.request_grace})
+        script.setInjectionPoint(QWebEngineScript.DocumentCreation)
+        script.setWorldId(QWebEngineScript.MainWorld)
+        # Verdicts can only be posted to the main frame
+        script.setRunsOnSubFrames(False)
+        profile.scripts().insert(script)
+
+    def attach(self, page):
+        """Post verdicts to this page"""
+        self.pages.append(page)
+        page.destroyed.connect(lambda: self.pages.remove(page) if page in self.pages else None)
+
+    def _url_key(self, url):
+        return "url:" + url
+
+    def _expire_pending(self, now):
+        """Requests pushed out of a full engine queue never report back"""
+        for frame_id in [f for f, p in self.pending.items() if now - p[3] > 10.0]:
+            self.in_flight.discard(self.pending.pop(frame_id)[0])
+
+    def on_image_requested(self, url):
+        now = time.time()
+        self._expire_pending(now)
+        if url in self.in_flight:
+            return
+        verdict = self.cache.get(self._url_key(url))
+        if verdict is not None:
+            self.post_verdict(url, verdict)
+            return
+
+        self.in_flight.add(url)
+        self._run_on_pages(f"window.__cpbRequested && window.__cpbRequested({json.dumps(url)});")
+        reply = self.network.get(QNetworkRequest(QUrl(url)))
+        self.replies.add(reply)
+        reply.finished.connect(lambda: self.on_fetched(reply, url, now))
+
+    def on_fetched(self, reply, url, requested_at):
+        self.replies.discard(reply)
+        try:
+            if reply.error() != QNetworkReply.NoError:
+                self.in_flight.discard(url)
+                return
+            data = bytes(reply.read(self.max_bytes))
+        finally:
+            reply.deleteLater()
+
+        # Large payloads decode at half size; the model works at 640px anyway
+        flags = cv2.IMREAD_REDUCED_COLOR_2 if len(data) > 256 * 1024 else cv2.IMREAD_COLOR
+        img = cv2.imdecode(np.frombuffer(data, np.uint8), flags)
+        if img is None:  # SVG, animated formats, truncated downloads...
+            self.in_flight.discard(url)
+            return
+
+        key = content_hash(img)
+        verdict = self.cache.get(key)
+        if verdict is not None:
+            self.cache.put(self._url_key(url), verdict)
+            self.in_flight.discard(url)
+            self.post_verdict(url, verdict, requested_at)
+            return
+
+        h, w = img.shape[:2]
+        frame_id = self.engine.submit(self.source_id, img, w, h, 0, 0)
+        if frame_id is None:
+            self.in_flight.discard(url)
+            return
+        self.pending[frame_id] = (url, key, (w, h), requested_at)
+
+    def on_engine_result(self, source_id, frame_id, detections):
+        if source_id != self.source_id or frame_id not in self.pending:
+            return
+        url, key, (w, h), requested_at = self.pending.pop(frame_id)
+        verdict = [
+            {
+                'xyxy': [det['xyxy'][0] / w, det['xyxy'][1] / h,
+                         det['xyxy'][2] / w, det['xyxy'][3] / h],
+                'class': det['class'],
+                'conf': det['conf']
+            }
+            for det in detections
+        ]
+        self.cache.put(key, verdict)
+        self.cache.put(self._url_key(url), verdict)
+        self.in_flight.discard(url)
+        self.post_verdict(url, verdict, requested_at)
+
+    def post_verdict(self, url, verdict, requested_at=None):
+        if requested_at is not None:
+            self.verdict_latency.append(time.time() - requested_at)
+        self._run_on_pages(
+            f"window.__cpbVerdict && window.__cpbVerdict({json.dumps(url)}, {json.dumps(bool(verdict))});")
+        self.verdictReady.emit(url, verdict)
+
+    def _run_on_pages(self, script):
+        for page in self.pages:
+            page.runJavaScript(script)
+
+    def cleanup(self):
+        """Stop intercepting, abort the fetches in flight and leave the engine"""
+        for profile in self.profiles:
+            profile.setUrlRequestInterceptor(None)
+        self.profiles = []
+        self.pages = []
+        for reply in list(self.replies):
+            reply.abort()  # finishes the reply, which then deletes itself
+        self.network.deleteLater()
+        self.engine.result_ready.disconnect(self.on_engine_result)
+        self.engine.unregister_source(self.source_id)
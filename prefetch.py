@@ -0,0 +1,154 @@
+# prefetch.py
+from PyQt5.QtCore import QObject, Qt, QTimer, pyqtSignal
+from PyQt5.QtWebEngineWidgets import QWebEnginePage, QWebEngineView
+
+from capture import FrameCapture
+from detections import Detections
+
+
+class PrefetchScanner(QObject):
+    """Classifies the page just above and below the viewport ahead of scrolling.
+
+    The tab's URL is loaded a second time in an offscreen view of the same
+    size, sharing the tab's profile. While the tab is idle that view is
+    scrolled band by band, one viewport height at a time, grabbed and sent
+    to the shared engine on a source of its own. Detections are kept in
+    page coordinates per band, so the overlay can cover content before it
+    scrolls into view. Pages that lay out differently on a second load are
+    only as good as that second load; the on-screen scan still has the
+    final word for everything visible.
+    """
+    detections_ready = pyqtSignal()
+
+    def __init__(self, browser, engine, bands=1, idle_ms=400, settle_ms=250):
+        super().__init__()
+        self.browser = browser
+        self.engine = engine
+        self.bands = bands  # viewport heights to cover above and below
+        self.settle_ms = settle_ms  # time for the offscreen page to paint after scrolling
+
+        self.view = QWebEngineView()
+        self.view.setAttribute(Qt.WA_DontShowOnScreen, True)
+        self.view.setPage(QWebEnginePage(browser.page().profile(), self.view))
+        self.view.resize(browser.size())
+        self.view.show()
+        self.view.loadFinished.connect(self.on_loaded)
+
+        self.source_id = engine.register_source()
+        self.engine.result_ready.connect(self.on_engine_result)
+        # Native resolution when the engine tiles, as for the on-screen grabs
+        self.capture = FrameCapture(max_side=None if engine.tiled else 640)
+
+        self.url = None
+        self.loaded = False
+        self.band_detections = {}  # band top (page y) -> page-space detections
+        self.queue = []  # band tops still to scan, nearest first
+        self.pending = {}  # frame id -> (band top, FrameTransform)
+        self.current_band = None
+
+        self.idle_timer = QTimer(self)
+        self.idle_timer.setSingleShot(True)
+        self.idle_timer.setInterval(idle_ms)
+        self.idle_timer.timeout.connect(self.next_band)
+        self.settle_timer = QTimer(self)
+        self.settle_timer.setSingleShot(True)
+        self.settle_timer.timeout.connect(self.grab_band)
+
+        browser.loadStarted.connect(self.reset)
+        browser.loadFinished.connect(self.on_source_loaded)
+
+    def reset(self):
+        """Forget the current page, e.g. on navigation"""
+        self.engine.cancel(self.source_id)
+        self.band_detections.clear()
+        self.queue = []
+        self.pending.clear()
+        self.current_band = None
+        self.idle_timer.stop()
+        self.settle_timer.stop()
+
+    def close(self):
+        self.reset()
+        self.engine.result_ready.disconnect(self.on_engine_result)
+        self.engine.unregister_source(self.source_id)
+        self.view.deleteLater()
+
+    def on_source_loaded(self, ok):
+        url = self.browser.url()
+        if not ok or url == self.url:
+            return
+        self.url = url
+        self.loaded = False
+        self.view.page().setZoomFactor(self.browser.page().zoomFactor())
+        self.view.load(url)
+
+    def on_loaded(self, ok):
+        self.loaded = ok
+        if ok:
+            self.idle_timer.start()
+
+    def _band_height(self):
+        return max(1, int(self.browser.height() / self.browser.page().zoomFactor()))
+
+    def schedule(self):
+        """Queue the bands around the current scroll position and wait for idle.
+
+        Called after every on-screen capture, so scanning resumes only once
+        the tab has gone quiet.
+        """
+        height = self._band_height()
+        # Band tops snap to half a viewport so nearby positions share bands
+        step = max(1, height // 2)
+        top = int(self.browser.page().scrollPosition().y()) // step * step
+        wanted = []
+        for k in range(1, self.bands + 1):
+            wanted.append(top + k * height)
+            if top - k * height >= 0:
+                wanted.append(top - k * height)
+        self.queue = [t for t in wanted if t not in self.band_detections]
+        self.idle_timer.start()
+
+    def next_band(self):
+        if not self.loaded or self.pending or self.current_band is not None or not self.queue:
+            return
+        self.current_band = self.queue.pop(0)
+        self.view.resize(self.browser.size())
+        x = int(self.browser.page().scrollPosition().x())
+        self.view.page().runJavaScript(f"window.scrollTo({x}, {self.current_band});")
+        self.settle_timer.start(self.settle_ms)
+
+    def grab_band(self):
+        band = self.current_band
+        self.current_band = None
+        if band is None:
+            return
+        page = self.view.page()
+        scroll = page.scrollPosition()
+        if scroll.y() < band - 1:
+            # The offscreen page is shorter than the band asks for; nothing there
+            self.band_detections[band] = Detections()
+            self.idle_timer.start()
+            return
+        _, frame, transform = self.capture.grab(self.view, scroll.x(), scroll.y(), page.zoomFactor())
+        frame_id = self.engine.submit(self.source_id, frame, self.view.width(), self.view.height(), 0, 0)
+        if frame_id is None:
+            # Dropped by a full engine; retry once the engine is idle again
+            self.queue.insert(0, band)
+            self.idle_timer.start()
+            return
+        self.pending[frame_id] = (band, transform)
+
+    def on_engine_result(self, source_id, frame_id, detections):
+        if source_id != self.source_id or frame_id not in self.pending:
+            return
+        band, transform = self.pending.pop(frame_id)
+        self.band_detections[band] = detections.frame_to_page(transform)
+        self.detections_ready.emit()
+        self.idle_timer.start()
+
+    def detections(self, exclude=None):
+        """Prefetched page-space detections, leaving out those centred in ``exclude``"""
+        result = Detections.concat(list(self.band_detections.values()))
+        if exclude is not None:
+            result = result[~result.centred_in(exclude)]
+        return result
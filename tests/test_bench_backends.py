@@ -0,0 +1,15 @@
+from bench_backends import compare
+
+
+def test_conf_mismatch_counts_once():
+    reference = [([0, 0, 100, 100], 0.90, "adult"), ([200, 200, 300, 300], 0.80, "weapons")]
+    candidate = [([0, 0, 100, 100], 0.70, "adult"), ([200, 200, 300, 300], 0.81, "weapons")]
+    matched, conf_mismatched, missing, extra, worst = compare(reference, candidate, 0.9, 0.05)
+    assert (matched, conf_mismatched, missing, extra) == (1, 1, 0, 0)
+    assert abs(worst - 0.2) < 1e-9
+
+
+def test_missing_and_extra_boxes():
+    reference = [([0, 0, 100, 100], 0.9, "adult")]
+    candidate = [([0, 0, 100, 100], 0.9, "weapons")]
+    assert compare(reference, candidate, 0.9, 0.05)[:4] == (0, 0, 1, 1)
@@ -0,0 +1,71 @@
+import os
+
+import cv2
+import numpy as np
+import pytest
+
+from detector_backends import PAD_VALUE, Letterbox, create_backend, quantize_model
+
+
+def write_yolo_like_onnx(path, classes=2, imgsz=640):
+    """A tiny graph with a YOLOv8 export's input, output layout and node names"""
+    onnx = pytest.importorskip("onnx")
+    from onnx import TensorProto, helper, numpy_helper
+
+    channels = 4 + classes
+    rng = np.random.default_rng(0)
+    weight = numpy_helper.from_array(rng.normal(0, 0.01, (channels, 3, 32, 32)).astype(np.float32), "W")
+    shape = numpy_helper.from_array(np.array([0, channels, -1], np.int64), "shape")
+    graph = helper.make_graph(
+        [helper.make_node("Conv", ["images", "W"], ["features"], name="/model.0/conv/Conv", strides=[32, 32]),
+         helper.make_node("Reshape", ["features", "shape"], ["output0"], name="/model.1/Reshape")],
+        "yolo_like",
+        [helper.make_tensor_value_info("images", TensorProto.FLOAT, ["batch", 3, imgsz, imgsz])],
+        [helper.make_tensor_value_info("output0", TensorProto.FLOAT, ["batch", channels, None])],
+        initializer=[weight, shape])
+    model = helper.make_model(graph, opset_imports=[helper.make_opsetid("", 13)])
+    model.ir_version = 8
+    helper.set_model_props(model, {'names': repr({i: f"class{i}" for i in range(classes)})})
+    onnx.save(model, path)
+
+
+def write_images(directory, count=4):
+    os.makedirs(directory, exist_ok=True)
+    rng = np.random.default_rng(1)
+    for i in range(count):
+        img = rng.integers(0, 255, (360 + 40 * i, 640, 3), np.uint8)
+        cv2.imwrite(os.path.join(directory, f"page{i}.png"), img)
+
+
+def test_letterbox_centres_and_pads():
+    img = np.full((320, 640, 3), 200, np.uint8)
+    batch, geometry = Letterbox()([img], 640)
+    assert batch.shape == (1, 3, 640, 640)
+    assert geometry == [(1.0, 0, 160, 640, 320)]
+    assert batch[0, :, 0, 0] == pytest.approx(PAD_VALUE / 255.0)
+    assert batch[0, :, 320, 320] == pytest.approx(200 / 255.0)
+
+
+def test_quantize_without_calibration_images_raises(tmp_path):
+    # An existing export stands in for the checkpoint; no runtime needed
+    (tmp_path / "model.onnx").write_bytes(b"")
+    with pytest.raises(FileNotFoundError):
+        quantize_model(str(tmp_path / "model.pt"), str(tmp_path / "empty"))
+
+
+def test_builds_int8_backend(tmp_path):
+    pytest.importorskip("onnxruntime")
+    write_yolo_like_onnx(str(tmp_path / "model.onnx"))
+    write_images(str(tmp_path / "calibration"))
+
+    backend = create_backend("onnx-int8", str(tmp_path / "model.pt"),
+                             calibration_dir=str(tmp_path / "calibration"))
+    try:
+        assert backend.name == "onnx-int8"
+        assert os.path.exists(tmp_path / "model.int8.onnx")
+        frames = [np.zeros((480, 640, 3), np.uint8), np.zeros((720, 1280, 3), np.uint8)]
+        results = backend.detect(frames, conf=0.0)
+        assert len(results) == 2
+        assert all(d.xyxy.shape[1] == 4 for d in results)
+    finally:
+        backend.close()
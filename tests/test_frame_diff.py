@@ -0,0 +1,52 @@
+import cv2
+import numpy as np
+import pytest
+
+from capture import PAD_VALUE, FrameTransform
+from frame_diff import CHANGED, SCROLLED, UNCHANGED, FrameChangeDetector
+
+
+def page_texture(width=640, height=3000):
+    """Smooth structure at several scales, so thumbnails still differ row to row"""
+    rng = np.random.default_rng(0)
+    coarse = rng.integers(0, 255, (height // 20, width // 20, 3), np.uint8)
+    return cv2.resize(coarse, (width, height), interpolation=cv2.INTER_LINEAR)
+
+
+def letterboxed(page, top, size=(400, 640), padded=(416, 640)):
+    """A 1280x800 viewport grabbed at 640 px: 640x400 content padded to a stride of 32"""
+    h, w = size
+    frame = np.full(padded + (3,), PAD_VALUE, np.uint8)
+    pad_y, pad_x = (padded[0] - h) // 2, (padded[1] - w) // 2
+    frame[pad_y:pad_y + h, pad_x:pad_x + w] = page[top:top + h, :w]
+    return frame, pad_x, pad_y
+
+
+@pytest.mark.parametrize("scroll", [200, 400, 600])
+def test_scroll_of_padded_frame_is_scrolled(scroll):
+    page = page_texture()
+    detector = FrameChangeDetector()
+    frame, pad_x, pad_y = letterboxed(page, 0)
+    assert pad_y
+    first = FrameTransform(scale=0.5, pad_x=pad_x, pad_y=pad_y)
+    assert detector.compare(frame, first).kind == CHANGED
+    detector.accept(0, 0)
+
+    # Page pixels are CSS pixels at half scale
+    frame, _, _ = letterboxed(page, scroll // 2)
+    change = detector.compare(frame, first.with_scroll(0, scroll))
+    assert change.kind == SCROLLED
+    x1, y1, x2, y2 = change.exposed
+    # The strip lies in the content area, at the bottom of the frame
+    assert pad_y <= y1 < y2 <= frame.shape[0] - pad_y
+    assert y2 == frame.shape[0] - pad_y
+
+
+def test_unchanged_padded_frame():
+    page = page_texture()
+    detector = FrameChangeDetector()
+    frame, pad_x, pad_y = letterboxed(page, 100)
+    transform = FrameTransform(scale=0.5, pad_x=pad_x, pad_y=pad_y, scroll_y=200)
+    detector.compare(frame, transform)
+    detector.accept(0, 200)
+    assert detector.compare(frame.copy(), transform).kind == UNCHANGED
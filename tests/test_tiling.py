@@ -0,0 +1,41 @@
+import numpy as np
+
+from tiling import TileCache
+
+
+def frame_with(tile_values, size=(640, 1280)):
+    """Frame whose two side-by-side tiles are filled with the given greys"""
+    frame = np.zeros(size + (3,), np.uint8)
+    half = size[1] // 2
+    frame[:, :half] = tile_values[0]
+    frame[:, half:] = tile_values[1]
+    return frame
+
+
+def test_two_frames_of_one_source_in_a_batch():
+    cache = TileCache(tile_size=640, overlap=0)
+    first = frame_with((0, 0))
+    cache.update(cache.dirty_tiles(first), [[], []])
+    assert cache.dirty_tiles(first) == []
+
+    # Both frames are planned before either is committed, as in one engine batch
+    a, b = frame_with((100, 0)), frame_with((200, 0))
+    dirty_a, dirty_b = cache.dirty_tiles(a), cache.dirty_tiles(b)
+    assert [i for i, _, _ in dirty_a] == [0]
+    assert [i for i, _, _ in dirty_b] == [0]
+    cache.update(dirty_a, [[]])
+    cache.update(dirty_b, [[{'xyxy': [0, 0, 10, 10], 'class': 'adult', 'conf': 0.9}]])
+
+    # The last frame's signatures stick, so it isn't analysed again
+    assert cache.dirty_tiles(b) == []
+    assert [i for i, _, _ in cache.dirty_tiles(a)] == [0]
+
+
+def test_results_for_an_old_layout_are_dropped():
+    cache = TileCache(tile_size=640, overlap=0)
+    dirty_wide = cache.dirty_tiles(frame_with((0, 0)))
+    narrow = np.zeros((640, 640, 3), np.uint8)
+    dirty_narrow = cache.dirty_tiles(narrow)
+    cache.update(dirty_wide, [[], [{'xyxy': [700, 0, 710, 10], 'class': 'adult', 'conf': 0.9}]])
+    assert cache.update(dirty_narrow, [[]]) == []
+    assert cache.dirty_tiles(narrow) == []
@@ -0,0 +1,37 @@
+import numpy as np
+
+from detections import Detections
+from tracker import DetectionTracker
+
+
+def box(y, cls="adult", conf=0.9):
+    return {'xyxy': [100, y, 200, y + 100], 'class': cls, 'conf': conf}
+
+
+def moving_track():
+    """A track that learned a downward velocity of about 100 px/s"""
+    tracker = DetectionTracker()
+    for step in range(4):
+        tracker.update(Detections.from_dicts([box(100 + 10 * step)]), now=1.0 + 0.1 * step)
+    assert tracker.velocity[0, 1] > tracker.min_speed
+    return tracker
+
+
+def test_unmatched_track_outside_changed_regions_stays_put():
+    tracker = moving_track()
+    start = tracker.boxes[0].copy()
+    for step in range(1, 20):
+        tracker.update(Detections.from_dicts([]), regions=[], now=1.3 + 0.1 * step)
+    assert np.allclose(tracker.boxes[0], start)
+    assert not tracker.velocity.any()
+    assert len(tracker) == 1
+
+
+def test_unmatched_track_in_changed_region_coasts_then_drops():
+    tracker = moving_track()
+    start = tracker.boxes[0].copy()
+    tracker.update(Detections.from_dicts([]), regions=None, now=1.4)
+    assert tracker.boxes[0, 1] > start[1]
+    tracker.update(Detections.from_dicts([]), regions=None, now=1.5)
+    tracker.update(Detections.from_dicts([]), regions=None, now=1.6)
+    assert len(tracker) == 0
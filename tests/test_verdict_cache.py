@@ -0,0 +1,34 @@
+import sqlite3
+from itertools import count
+
+import verdict_cache
+from verdict_cache import VerdictCache
+
+
+def test_memory_hits_keep_entries_on_disk(tmp_path, monkeypatch):
+    clock = count(1)
+    monkeypatch.setattr(verdict_cache.time, "time", lambda: float(next(clock)))
+    path = str(tmp_path / "verdicts.sqlite")
+    cache = VerdictCache(path, max_disk_entries=2)
+    cache.put("hot", [])
+    cache.put("cold", [])
+    assert cache.get("hot") == []  # served from memory
+
+    cache._writes_since_trim = 255  # the next write trims
+    cache.put("new", [])
+    cache.close()
+
+    keys = {row[0] for row in sqlite3.connect(path).execute("SELECT key FROM verdicts")}
+    assert keys == {"hot", "new"}
+
+
+def test_close_flushes_memory_hits(tmp_path, monkeypatch):
+    clock = count(1)
+    monkeypatch.setattr(verdict_cache.time, "time", lambda: float(next(clock)))
+    path = str(tmp_path / "verdicts.sqlite")
+    cache = VerdictCache(path)
+    cache.put("key", [])
+    cache.get("key")
+    cache.close()
+    (last_used,) = sqlite3.connect(path).execute("SELECT last_used FROM verdicts").fetchone()
+    assert last_used == 2.0
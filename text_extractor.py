@@ -2,6 +2,10 @@ import os
 import pathlib
 from PyQt5.QtCore import QDateTime
 
+from logs import get_logger
+
+log = get_logger("text_extractor")
+
 def get_output_base_dir():
     """Get the absolute path to the project root directory"""
     project_root = pathlib.Path(__file__).parent.resolve()
@@ -14,7 +18,7 @@ def ensure_directory_exists(directory):
         directory.mkdir(parents=True, exist_ok=True)
         return True
     except Exception as e:
-        print(f"Directory creation failed: {str(e)}")
+        log.error("Directory creation failed: %s", e)
         return False
 
 def save_extracted_content(content_type, content):
@@ -32,10 +36,10 @@ def save_extracted_content(content_type, content):
         with open(filename, 'w', encoding='utf-8') as f:
             f.write(content)
         
-        print(f"Updated {content_type} file at: {filename}")
+        log.debug("Updated %s file at: %s", content_type, filename)
         return True
     except Exception as e:
-        print(f"Failed to update {content_type} file: {str(e)}")
+        log.error("Failed to update %s file: %s", content_type, e)
         return False
 
 def extract_text_from_page(page):
@@ -76,7 +80,7 @@ def extract_text_from_page(page):
 
     def handle_result(result):
         if not result:
-            print("No text content received from JavaScript")
+            log.debug("No text content received from JavaScript")
             return
             
         # Save/update HTML content
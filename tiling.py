@@ -0,0 +1,121 @@
+# tiling.py
+import math
+import threading
+
+import cv2
+import numpy as np
+
+
+def tile_positions(length, tile_size, overlap):
+    """Start offsets of overlapping tiles covering ``length`` pixels"""
+    if length <= tile_size:
+        return [0]
+    stride = tile_size - overlap
+    count = math.ceil((length - overlap) / stride)
+    return [round(i * (length - tile_size) / (count - 1)) for i in range(count)]
+
+
+def tile_grid(width, height, tile_size=640, overlap=96):
+    """(x1, y1, x2, y2) boxes of the overlapping tiles covering a frame"""
+    return [
+        (x, y, min(width, x + tile_size), min(height, y + tile_size))
+        for y in tile_positions(height, tile_size, overlap)
+        for x in tile_positions(width, tile_size, overlap)
+    ]
+
+
+def _box_overlap(a, b):
+    """IoU and intersection over the smaller box"""
+    ix = max(0.0, min(a[2], b[2]) - max(a[0], b[0]))
+    iy = max(0.0, min(a[3], b[3]) - max(a[1], b[1]))
+    inter = ix * iy
+    if inter <= 0:
+        return 0.0, 0.0
+    area_a = (a[2] - a[0]) * (a[3] - a[1])
+    area_b = (b[2] - b[0]) * (b[3] - b[1])
+    return inter / (area_a + area_b - inter), inter / max(1e-6, min(area_a, area_b))
+
+
+def stitch_detections(detections, iou_threshold=0.5, contain_threshold=0.7):
+    """Class-aware NMS that also joins boxes cut in two by a tile seam.
+
+    Detections are visited by descending confidence. One that overlaps a
+    kept box of the same class (by IoU, or by mostly lying inside it) is
+    folded into that box: the kept box grows to the union and keeps the
+    higher confidence.
+    """
+    kept = []
+    for det in sorted(detections, key=lambda d: d['conf'], reverse=True):
+        for other in kept:
+            if other['class'] != det['class']:
+                continue
+            iou, contained = _box_overlap(other['xyxy'], det['xyxy'])
+            if iou > iou_threshold or contained > contain_threshold:
+                a, b = other['xyxy'], det['xyxy']
+                other['xyxy'] = [min(a[0], b[0]), min(a[1], b[1]), max(a[2], b[2]), max(a[3], b[3])]
+                break
+        else:
+            kept.append({'xyxy': list(det['xyxy']), 'class': det['class'], 'conf': det['conf']})
+    return kept
+
+
+class TileCache:
+    """Per-source tile signatures and detections for dirty-region inference.
+
+    Each tile keeps a tiny grayscale signature of the pixels it was last
+    analysed on, plus the detections found there (in frame pixels). Only
+    tiles whose signature moved are sent to the model again. The new
+    signatures travel with the dirty tiles into update(), so several frames
+    of one source can be in flight at once.
+    """
+
+    def __init__(self, tile_size=640, overlap=96, signature_size=32, cells=4, threshold=6.0):
+        self.tile_size = tile_size
+        self.overlap = overlap
+        self.signature_size = signature_size
+        self.cells = cells  # signature is compared as cells x cells blocks
+        self.threshold = threshold  # mean abs difference of the worst block (0-255)
+
+        self.lock = threading.Lock()
+        self.shape = None
+        self.tiles = []
+        self.signatures = []
+        self.detections = []
+
+    def _signature(self, tile):
+        small = cv2.resize(tile, (self.signature_size, self.signature_size), interpolation=cv2.INTER_AREA)
+        return cv2.cvtColor(small, cv2.COLOR_BGR2GRAY)
+
+    def _changed(self, current, previous):
+        diff = cv2.absdiff(current, previous).astype(np.float32)
+        block = self.signature_size // self.cells
+        blocks = diff[:block * self.cells, :block * self.cells].reshape(self.cells, block, self.cells, block)
+        return blocks.mean(axis=(1, 3)).max() > self.threshold
+
+    def dirty_tiles(self, frame):
+        """Return [(index, (x1, y1, x2, y2), signature)] of tiles that need a model pass"""
+        h, w = frame.shape[:2]
+        if self.shape != (h, w):
+            # New layout: every tile is dirty
+            self.shape = (h, w)
+            self.tiles = tile_grid(w, h, self.tile_size, self.overlap)
+            self.signatures = [None] * len(self.tiles)
+            self.detections = [[] for _ in self.tiles]
+
+        dirty = []
+        for index, (x1, y1, x2, y2) in enumerate(self.tiles):
+            signature = self._signature(frame[y1:y2, x1:x2])
+            previous = self.signatures[index]
+            if previous is None or self._changed(signature, previous):
+                dirty.append((index, self.tiles[index], signature))
+        return dirty
+
+    def update(self, dirty, tile_detections):
+        """Store fresh results for the dirty tiles and return the stitched frame"""
+        for (index, box, signature), detections in zip(dirty, tile_detections):
+            # A later frame of another size may have replaced the layout meanwhile
+            if index < len(self.tiles) and self.tiles[index] == box:
+                self.signatures[index] = signature
+                self.detections[index] = detections
+        merged = [det for detections in self.detections for det in detections]
+        return stitch_detections(merged)
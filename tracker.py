@@ -0,0 +1,206 @@
+# tracker.py
+import time
+
+import numpy as np
+
+from detections import Detections
+
+
+def iou_matrix(a, b):
+    """Pairwise IoU of two (N, 4) and (M, 4) xyxy arrays"""
+    if not len(a) or not len(b):
+        return np.zeros((len(a), len(b)), np.float32)
+    ix1 = np.maximum(a[:, None, 0], b[None, :, 0])
+    iy1 = np.maximum(a[:, None, 1], b[None, :, 1])
+    ix2 = np.minimum(a[:, None, 2], b[None, :, 2])
+    iy2 = np.minimum(a[:, None, 3], b[None, :, 3])
+    inter = np.clip(ix2 - ix1, 0, None) * np.clip(iy2 - iy1, 0, None)
+    area_a = (a[:, 2] - a[:, 0]) * (a[:, 3] - a[:, 1])
+    area_b = (b[:, 2] - b[:, 0]) * (b[:, 3] - b[:, 1])
+    return inter / np.maximum(area_a[:, None] + area_b[None, :] - inter, 1e-6)
+
+
+class DetectionTracker:
+    """Keeps detections alive between model runs, in page coordinates.
+
+    Each analysed frame is associated with the existing tracks in one
+    vectorised step: IoU between constant-velocity predictions and the new
+    boxes, restricted to the same class, with a centroid-distance fallback
+    for small fast-moving boxes. Pairs are taken greedily, best first.
+    Matched tracks are smoothed towards the new box. Only the centre is
+    extrapolated, with a velocity that is zeroed below ``min_speed`` (box
+    jitter on static content), fades between observations and is followed
+    for at most ``max_extrapolation`` seconds, so a track keeps its last
+    observed size and can't drift off what it masks. Unmatched tracks
+    collect misses, and are dropped after ``max_misses``, only where the
+    page content changed; there they coast on their prediction. Elsewhere a
+    missing box is the model flickering on content that was already vetted,
+    so the track stays where it is and its velocity is dropped.
+    """
+
+    def __init__(self, iou_threshold=0.3, center_threshold=40.0, max_misses=2,
+                 smoothing=0.6, velocity_decay=0.5, min_speed=20.0, max_extrapolation=0.5):
+        self.iou_threshold = iou_threshold
+        self.center_threshold = center_threshold  # page pixels
+        self.max_misses = max_misses
+        self.smoothing = smoothing  # weight of the new box when a track is matched
+        self.velocity_decay = velocity_decay  # per second without a match
+        self.min_speed = min_speed  # page pixels per second; slower counts as still
+        self.max_extrapolation = max_extrapolation  # seconds of motion predicted past an observation
+
+        self.boxes = np.zeros((0, 4), np.float32)
+        self.velocity = np.zeros((0, 2), np.float32)  # centre, page pixels per second
+        self.hits = np.zeros(0, np.int32)
+        self.misses = np.zeros(0, np.int32)
+        self.confs = np.zeros(0, np.float32)
+        self.classes = []
+        self.ids = np.zeros(0, np.int64)
+        self._next_id = 1
+        self.last_update = None
+
+    def __len__(self):
+        return len(self.boxes)
+
+    def clear(self):
+        self.__init__(self.iou_threshold, self.center_threshold, self.max_misses,
+                      self.smoothing, self.velocity_decay, self.min_speed, self.max_extrapolation)
+
+    def _travel(self, dt):
+        """Distance factor for ``dt`` seconds of decaying velocity, capped in time"""
+        dt = min(max(0.0, dt), self.max_extrapolation)
+        if self.velocity_decay >= 1.0:
+            return dt
+        # Integral of velocity_decay ** t from 0 to dt
+        rate = -np.log(self.velocity_decay)
+        return (1.0 - self.velocity_decay ** dt) / rate
+
+    def predict(self, now=None):
+        """Boxes moved to ``now`` by each track's velocity, keeping their size"""
+        if self.last_update is None or not len(self.boxes):
+            return self.boxes
+        shift = self.velocity * self._travel((now or time.monotonic()) - self.last_update)
+        return self.boxes + np.hstack([shift, shift])
+
+    def is_moving(self, threshold=1.0, now=None):
+        """True if any track's prediction still changes, faster than ``threshold`` page pixels per second.
+
+        Predictions stop moving ``max_extrapolation`` seconds after the last observation.
+        """
+        if not len(self.velocity) or self.last_update is None:
+            return False
+        if (now or time.monotonic()) - self.last_update > self.max_extrapolation:
+            return False
+        return float(np.abs(self.velocity).max()) > threshold
+
+    def update(self, detections, regions=None, now=None):
+        """Fold one analysed frame's page-space detections into the tracks.
+
+        ``regions`` lists the page rects (x1, y1, x2, y2) whose content
+        changed since the tracks were last confirmed; None means anything
+        may have. Unmatched tracks in a changed region take a miss and coast
+        on their prediction; the others are frozen in place. Returns the
+        number of new tracks.
+        """
+        detections = Detections.from_dicts(detections)
+        now = now or time.monotonic()
+        dt = 0.0 if self.last_update is None else max(1e-3, now - self.last_update)
+        predicted = self.predict(now)
+
+        new_boxes = detections.xyxy
+        new_confs = detections.confs
+        new_classes = detections.classes
+
+        # Association cost: IoU, or centroid proximity for boxes that don't overlap yet
+        same_class = (np.array(self.classes, object)[:, None] ==
+                      np.array(new_classes, object)[None, :]).reshape(len(self.boxes), len(new_boxes))
+        iou = iou_matrix(predicted, new_boxes)
+        centers_a = (predicted[:, :2] + predicted[:, 2:]) / 2
+        centers_b = (new_boxes[:, :2] + new_boxes[:, 2:]) / 2
+        dist = np.linalg.norm(centers_a[:, None, :] - centers_b[None, :, :], axis=2)
+        score = np.where(iou >= self.iou_threshold, iou,
+                         np.where(dist <= self.center_threshold,
+                                  self.iou_threshold * (1 - dist / self.center_threshold), -1.0))
+        score = np.where(same_class, score, -1.0)
+
+        matched_tracks = np.full(len(self.boxes), -1)
+        matched_dets = np.zeros(len(new_boxes), bool)
+        if score.size:
+            order = np.argsort(-score, axis=None)
+            for flat in order:
+                t, d = divmod(int(flat), len(new_boxes))
+                if score[t, d] < 0:
+                    break
+                if matched_tracks[t] >= 0 or matched_dets[d]:
+                    continue
+                matched_tracks[t] = d
+                matched_dets[d] = True
+
+        # Matched tracks: smooth towards the detection and learn the velocity
+        hit = matched_tracks >= 0
+        if hit.any():
+            observed = new_boxes[matched_tracks[hit]]
+            previous = self.boxes[hit]
+            a = self.smoothing
+            self.boxes[hit] = a * observed + (1 - a) * predicted[hit]
+            if dt > 0:
+                moved = ((self.boxes[hit, :2] + self.boxes[hit, 2:]) - (previous[:, :2] + previous[:, 2:])) / 2
+                velocity = a * moved / dt + (1 - a) * self.velocity[hit]
+                # Jitter of boxes on still content must not turn into drift
+                still = np.linalg.norm(velocity, axis=1) < self.min_speed
+                velocity[still] = 0
+                self.velocity[hit] = velocity
+            self.confs[hit] = np.maximum(self.confs[hit] * 0.9, new_confs[matched_tracks[hit]])
+            self.hits[hit] += 1
+            self.misses[hit] = 0
+
+        # Unmatched tracks: a miss only counts where the content changed
+        miss = ~hit
+        if regions is not None and miss.any():
+            rects = np.array(regions, np.float32).reshape(-1, 4)
+            overlaps = ((self.boxes[:, None, 0] < rects[None, :, 2]) &
+                        (self.boxes[:, None, 2] > rects[None, :, 0]) &
+                        (self.boxes[:, None, 1] < rects[None, :, 3]) &
+                        (self.boxes[:, None, 3] > rects[None, :, 1]))
+            miss &= overlaps.any(axis=1)
+        self.misses[miss] += 1
+        # Missed tracks coast on their prediction while the velocity fades;
+        # unchanged content hasn't moved, so those tracks stay put
+        self.boxes[miss] = predicted[miss]
+        self.velocity[miss] *= self.velocity_decay ** dt
+        self.velocity[~hit & ~miss] = 0
+        self.velocity[np.linalg.norm(self.velocity, axis=1) < self.min_speed] = 0
+
+        keep = self.misses <= self.max_misses
+        self._select(keep)
+
+        # Unmatched detections start new tracks
+        fresh = ~matched_dets
+        count = int(fresh.sum())
+        if count:
+            self.boxes = np.vstack([self.boxes, new_boxes[fresh]])
+            self.velocity = np.vstack([self.velocity, np.zeros((count, 2), np.float32)])
+            self.hits = np.concatenate([self.hits, np.ones(count, np.int32)])
+            self.misses = np.concatenate([self.misses, np.zeros(count, np.int32)])
+            self.confs = np.concatenate([self.confs, new_confs[fresh]])
+            self.classes.extend(c for c, f in zip(new_classes, fresh) if f)
+            self.ids = np.concatenate([self.ids, np.arange(self._next_id, self._next_id + count)])
+            self._next_id += count
+        self.last_update = now
+        return count
+
+    def _select(self, keep):
+        self.boxes = self.boxes[keep]
+        self.velocity = self.velocity[keep]
+        self.hits = self.hits[keep]
+        self.misses = self.misses[keep]
+        self.confs = self.confs[keep]
+        self.classes = [c for c, k in zip(self.classes, keep) if k]
+        self.ids = self.ids[keep]
+
+    def detections(self, now=None):
+        """Current tracks as page-space detections"""
+        boxes = self.predict(now)
+        return [
+            {'xyxy': box.tolist(), 'class': cls, 'conf': float(conf), 'id': int(track_id)}
+            for box, cls, conf, track_id in zip(boxes, self.classes, self.confs, self.ids)
+        ]
@@ -0,0 +1,166 @@
+# verdict_cache.py
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+
+import cv2
+
+from logs import get_logger
+
+log = get_logger("verdict_cache")
+
+
+def content_hash(img):
+    """Hash of an image's pixels that survives small rescales.
+
+    The image is reduced to a fixed 64x64 thumbnail first, so the same
+    creative grabbed at a slightly different size still hashes the same.
+    """
+    thumb = cv2.resize(img, (64, 64), interpolation=cv2.INTER_AREA)
+    # Drop the low bits so resampling noise doesn't change the digest
+    return hashlib.blake2b((thumb >> 3).tobytes(), digest_size=16).hexdigest()
+
+
+class VerdictCache:
+    """Bounded LRU of per-image verdicts, persisted to disk with eviction.
+
+    A verdict is the list of detections found in an image, with boxes
+    normalised to the image size so they can be mapped onto any place the
+    image is shown. The hot set lives in memory; every verdict is also
+    written to a small SQLite file so revisiting a site is free after a
+    restart. The disk store is trimmed to ``max_disk_entries`` by last use;
+    hits served from memory are noted and written to disk in one go before
+    a trim or on close, so the hot set isn't what gets evicted.
+    """
+
+    _instance = None
+    _instance_lock = threading.Lock()
+
+    @classmethod
+    def instance(cls):
+        """Return the application-wide cache, creating it on first use"""
+        with cls._instance_lock:
+            if cls._instance is None:
+                cls._instance = cls()
+            return cls._instance
+
+    def __init__(self, path=os.path.join("cache", "verdicts.sqlite"),
+                 max_entries=4096, max_disk_entries=100000):
+        self.max_entries = max_entries
+        self.max_disk_entries = max_disk_entries
+        self.entries = OrderedDict()
+        self.lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self._writes_since_trim = 0
+        self._touched = {}  # key -> time of its last memory hit, not yet on disk
+
+        self.db = None
+        if path:
+            try:
+                os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+                self.db = sqlite3.connect(path, check_same_thread=False)
+                self.db.execute(
+                    "CREATE TABLE IF NOT EXISTS verdicts ("
+                    "key TEXT PRIMARY KEY, verdict TEXT NOT NULL, last_used REAL NOT NULL)"
+                )
+                self.db.commit()
+            except sqlite3.Error as e:
+                log.warning("Verdict cache unavailable on disk: %s", e)
+                self.db = None
+
+    @property
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def get(self, key):
+        """Return the cached verdict for an image hash, or None on a miss"""
+        with self.lock:
+            verdict = self.entries.get(key)
+            if verdict is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                if self.db is not None:
+                    self._touched[key] = time.time()
+                return verdict
+
+            verdict = self._load(key)
+            if verdict is None:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._remember(key, verdict)
+            return verdict
+
+    def put(self, key, verdict):
+        """Store a verdict in memory and on disk"""
+        with self.lock:
+            self._remember(key, verdict)
+            self._store(key, verdict)
+
+    def _remember(self, key, verdict):
+        self.entries[key] = verdict
+        self.entries.move_to_end(key)
+        while len(self.entries) > self.max_entries:
+            self.entries.popitem(last=False)
+
+    def _load(self, key):
+        if self.db is None:
+            return None
+        try:
+            row = self.db.execute("SELECT verdict FROM verdicts WHERE key = ?", (key,)).fetchone()
+            if row is None:
+                return None
+            self.db.execute("UPDATE verdicts SET last_used = ? WHERE key = ?", (time.time(), key))
+            return json.loads(row[0])
+        except (sqlite3.Error, ValueError) as e:
+            log.warning("Verdict cache read failed: %s", e)
+            return None
+
+    def _store(self, key, verdict):
+        if self.db is None:
+            return
+        try:
+            self.db.execute(
+                "INSERT OR REPLACE INTO verdicts (key, verdict, last_used) VALUES (?, ?, ?)",
+                (key, json.dumps(verdict), time.time())
+            )
+            self._writes_since_trim += 1
+            if self._writes_since_trim >= 256:
+                self._trim()
+            self.db.commit()
+        except sqlite3.Error as e:
+            log.warning("Verdict cache write failed: %s", e)
+
+    def _flush_touches(self):
+        """Write the last_used times of memory hits to disk"""
+        if self._touched:
+            self.db.executemany("UPDATE verdicts SET last_used = ? WHERE key = ?",
+                                [(used, key) for key, used in self._touched.items()])
+            self._touched = {}
+
+    def _trim(self):
+        """Evict the least recently used rows beyond the disk budget"""
+        self._writes_since_trim = 0
+        self._flush_touches()
+        self.db.execute(
+            "DELETE FROM verdicts WHERE key IN ("
+            "SELECT key FROM verdicts ORDER BY last_used DESC LIMIT -1 OFFSET ?)",
+            (self.max_disk_entries,)
+        )
+
+    def close(self):
+        with self.lock:
+            if self.db is not None:
+                try:
+                    self._flush_touches()
+                except sqlite3.Error as e:
+                    log.warning("Verdict cache write failed: %s", e)
+                self.db.commit()
+                self.db.close()
+                self.db = None